@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import AccessRequest, EmergencyAccess
+from users.identity import resolve_patient
 from users.serializers import PatientSearchSerializer
 
 
@@ -18,6 +19,22 @@ class AccessRequestSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'doctor', 'status', 'requested_at', 'responded_at']
 
+    # Columns read by the fields that aren't model fields (medivault.sparse_fields)
+    field_sources = {
+        'doctor_name': ('doctor__full_name',),
+        'patient_name': ('patient__full_name',),
+        'patient_id_code': ('patient__patient_id',),
+        'is_active': ('status', 'expires_at'),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('doctor', 'patient').only(
+            'id', 'doctor', 'patient', 'status', 'scope', 'reason', 'patient_note',
+            'requested_at', 'responded_at', 'expires_at',
+            'doctor__full_name', 'patient__full_name', 'patient__patient_id',
+        )
+
     def get_doctor_name(self, obj):
         return f"Dr. {obj.doctor.full_name}"
 
@@ -40,13 +57,10 @@ class AccessRequestCreateSerializer(serializers.ModelSerializer):
         fields = ['patient_id', 'scope', 'reason', 'duration_hours']
 
     def validate_patient_id(self, value):
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        try:
-            user = User.objects.get(patient_id=value, role='PATIENT')
-            return user
-        except User.DoesNotExist:
+        patient = resolve_patient(value)
+        if patient is None:
             raise serializers.ValidationError("No patient found with this ID.")
+        return patient
 
     def create(self, validated_data):
         from django.utils import timezone
@@ -84,6 +98,20 @@ class EmergencyAccessSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'doctor', 'granted_at', 'expires_at']
 
+    field_sources = {
+        'doctor_name': ('doctor__full_name',),
+        'patient_name': ('patient__full_name',),
+        'is_active': ('expires_at',),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('doctor', 'patient').only(
+            'id', 'doctor', 'patient', 'reason_code', 'reason_detail', 'patient_admit_id',
+            'granted_at', 'expires_at', 'is_reviewed_by_admin', 'is_flagged_misuse', 'admin_note',
+            'doctor__full_name', 'patient__full_name',
+        )
+
     def get_doctor_name(self, obj):
         return f"Dr. {obj.doctor.full_name}"
 
@@ -102,12 +130,10 @@ class EmergencyAccessCreateSerializer(serializers.ModelSerializer):
         fields = ['patient_id', 'reason_code', 'reason_detail', 'patient_admit_id']
 
     def validate_patient_id(self, value):
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        try:
-            return User.objects.get(patient_id=value, role='PATIENT')
-        except User.DoesNotExist:
+        patient = resolve_patient(value)
+        if patient is None:
             raise serializers.ValidationError("No patient found with this ID.")
+        return patient
 
     def create(self, validated_data):
         from django.utils import timezone
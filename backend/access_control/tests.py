@@ -1,3 +1,113 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from notifications.models import NotificationPreference, PendingEmail
+from .models import AccessRequest, EmergencyAccess
 
-# Create your tests here.
+User = get_user_model()
+
+
+class AccessListQueryTests(TestCase):
+    """List endpoints cost the same number of queries whatever the page holds."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        self.doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        self.admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        self.client = APIClient()
+
+    def _add_requests(self, count):
+        AccessRequest.objects.bulk_create(
+            AccessRequest(doctor=self.doctor, patient=self.patient, scope=['ALL'], reason='follow-up')
+            for _ in range(count)
+        )
+
+    def _add_emergencies(self, count):
+        EmergencyAccess.objects.bulk_create(
+            EmergencyAccess(doctor=self.doctor, patient=self.patient, reason_code='UNCONSCIOUS',
+                            reason_detail='RTA', patient_admit_id='ER-1',
+                            expires_at=timezone.now() + timedelta(hours=1))
+            for _ in range(count)
+        )
+
+    def _assert_constant(self, user, url, add_rows):
+        self.client.force_authenticate(user)
+        for count in (1, 24):
+            add_rows(count)
+            with self.assertNumQueries(2):  # count + page
+                response = self.client.get(url)
+        self.assertEqual(response.data['count'], 25)
+        return response.data['results'][0]
+
+    def test_incoming_requests(self):
+        row = self._assert_constant(self.patient, '/api/access/incoming/', self._add_requests)
+        self.assertEqual(
+            (row['doctor_name'], row['patient_name'], row['patient_id_code']),
+            ('Dr. Doc', 'Pat', self.patient.patient_id),
+        )
+
+    def test_doctor_requests(self):
+        self._assert_constant(self.doctor, '/api/access/my-requests/', self._add_requests)
+
+    def test_emergency_lists(self):
+        row = self._assert_constant(self.admin, '/api/access/emergency/all/', self._add_emergencies)
+        self.assertEqual((row['doctor_name'], row['patient_name']), ('Dr. Doc', 'Pat'))
+        EmergencyAccess.objects.all().delete()
+        self._assert_constant(self.doctor, '/api/access/emergency/my/', self._add_emergencies)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        self.doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        AccessRequest.objects.create(doctor=self.doctor, patient=self.patient, scope=['ALL'], reason='follow-up',
+                                     status='APPROVED', expires_at=timezone.now() + timedelta(hours=1))
+        EmergencyAccess.objects.create(doctor=self.doctor, patient=self.patient, reason_code='UNCONSCIOUS',
+                                       reason_detail='RTA', expires_at=timezone.now() + timedelta(hours=1))
+        self.client = APIClient()
+
+    def test_trims_fields_and_columns(self):
+        self.client.force_authenticate(self.patient)
+        full = self.client.get('/api/access/incoming/').data['results'][0]
+        with CaptureQueriesContext(connection) as queries:
+            row = self.client.get('/api/access/incoming/', {'fields': 'is_active,doctor_name,id,nope'}).data['results'][0]
+        self.assertEqual(dict(row), {'id': full['id'], 'doctor_name': 'Dr. Doc', 'is_active': True})
+        columns = queries.captured_queries[-1]['sql'].split(' FROM ')[0]
+        self.assertEqual(columns.count('"full_name"'), 1)  # the doctor's; the patient isn't joined
+        self.assertNotIn('reason', columns)
+        self.assertNotIn('patient_note', columns)
+
+    def test_unknown_fields_serve_everything(self):
+        self.client.force_authenticate(self.doctor)
+        full = self.client.get('/api/access/emergency/my/').content
+        self.assertEqual(self.client.get('/api/access/emergency/my/', {'fields': 'nope'}).content, full)
+        row = self.client.get('/api/access/emergency/my/', {'fields': 'is_active'}).data['results'][0]
+        self.assertEqual(dict(row), {'is_active': True})
+
+
+class EmergencyAccessEmailTests(TestCase):
+    def test_admin_emails_cost_the_same_queries_however_many_admins(self):
+        patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        client = APIClient()
+        client.force_authenticate(doctor)
+        counts = []
+        for n in range(12):
+            admin = User.objects.create_user(email=f'a{n}@example.com', password=None, full_name='A', role='ADMIN')
+            if n % 2:
+                NotificationPreference.objects.create(user=admin, email_delivery='DIGEST')
+            if n in (0, 1, 11):  # the first request seeds the notification counters
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.post('/api/access/emergency/', {
+                        'patient_id': patient.patient_id, 'reason_code': 'UNCONSCIOUS',
+                        'reason_detail': 'RTA', 'patient_admit_id': 'ER-1',
+                    }, format='json')
+                self.assertEqual(response.status_code, 201)
+                counts.append(len(queries))
+        self.assertEqual(counts[1], counts[2])
+        # one queued per digest admin per request: 1, then 6
+        self.assertEqual(PendingEmail.objects.count(), 7)
@@ -1,6 +1,7 @@
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth import get_user_model
@@ -11,6 +12,9 @@ from .serializers import (
     EmergencyAccessCreateSerializer,
 )
 from audit.models import AuditLog
+from medivault.sparse_fields import SparseFieldsMixin
+from monitoring.tracing import span
+from notifications.counters import increment_broadcasts, increment_unread
 from notifications.models import Notification
 from users.email_utils import (
     email_access_requested, email_access_approved,
@@ -21,15 +25,33 @@ from users.email_utils import (
 User = get_user_model()
 
 
-def notify(recipient, notif_type, title, message, actor_name='', reference_id=None):
-    Notification.objects.create(
-        recipient=recipient,
-        notification_type=notif_type,
-        title=title,
-        message=message,
-        actor_name=actor_name,
-        reference_id=reference_id,
-    )
+def notify(recipient, notif_type, template, params=None, actor_name='', reference_id=None):
+    """`template` is a key in notifications.message_templates; text is rendered on read."""
+    with span('notify', **{'notification.type': notif_type}), transaction.atomic():
+        Notification.objects.create(
+            recipient=recipient,
+            notification_type=notif_type,
+            template_key=template,
+            params=params or {},
+            actor_name=actor_name,
+            reference_id=reference_id,
+        )
+        increment_unread(recipient)
+
+
+def notify_role(role, notif_type, template, params=None, actor_name='', reference_id=None):
+    """One broadcast row for every user with `role`, instead of a row per user."""
+    with span('notify_role', **{'notification.type': notif_type, 'notification.audience': role}), \
+            transaction.atomic():
+        Notification.objects.create(
+            audience=role,
+            notification_type=notif_type,
+            template_key=template,
+            params=params or {},
+            actor_name=actor_name,
+            reference_id=reference_id,
+        )
+        increment_broadcasts(role)
 
 
 class IsDoctor(permissions.BasePermission):
@@ -51,6 +73,7 @@ class IsAdmin(permissions.BasePermission):
 class AccessRequestCreateView(generics.CreateAPIView):
     serializer_class = AccessRequestCreateSerializer
     permission_classes = [IsDoctor]
+    query_budget = 20
 
     def perform_create(self, serializer):
         req = serializer.save()
@@ -62,8 +85,8 @@ class AccessRequestCreateView(generics.CreateAPIView):
         notify(
             recipient=req.patient,
             notif_type='ACCESS_REQUEST',
-            title='Access Request from Doctor',
-            message=f"Dr. {req.doctor.full_name} has requested access to your medical records. Reason: {req.reason}",
+            template='access.requested',
+            params={'reason': req.reason},
             actor_name=req.doctor.full_name,
             reference_id=req.id,
         )
@@ -78,21 +101,23 @@ class AccessRequestCreateView(generics.CreateAPIView):
 
 
 # ---- Patient: View their incoming requests ----
-class PatientAccessRequestListView(generics.ListAPIView):
+class PatientAccessRequestListView(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = AccessRequestSerializer
     permission_classes = [IsPatient]
+    query_budget = 5
 
     def get_queryset(self):
         status_filter = self.request.query_params.get('status')
         qs = AccessRequest.objects.filter(patient=self.request.user)
         if status_filter:
             qs = qs.filter(status=status_filter.upper())
-        return qs
+        return AccessRequestSerializer.setup_eager_loading(qs)
 
 
 # ---- Patient: Approve/Reject/Revoke a request ----
 class AccessRequestResponseView(APIView):
     permission_classes = [IsPatient]
+    query_budget = 20
 
     def post(self, request, pk):
         try:
@@ -123,8 +148,8 @@ class AccessRequestResponseView(APIView):
             notify(
                 recipient=req.doctor,
                 notif_type='ACCESS_APPROVED',
-                title='Access Request Approved',
-                message=f"Patient {req.patient.full_name} approved your access to their records. Access expires in {duration} hours.",
+                template='access.approved',
+                params={'hours': duration},
                 actor_name=req.patient.full_name,
                 reference_id=req.id,
             )
@@ -148,8 +173,7 @@ class AccessRequestResponseView(APIView):
             )
             notify(
                 recipient=req.doctor, notif_type='ACCESS_REJECTED',
-                title='Access Request Rejected',
-                message=f"Patient {req.patient.full_name} rejected your access request.",
+                template='access.rejected',
                 actor_name=req.patient.full_name,
                 reference_id=req.id,
             )
@@ -172,8 +196,7 @@ class AccessRequestResponseView(APIView):
             )
             notify(
                 recipient=req.doctor, notif_type='ACCESS_REVOKED',
-                title='Access Revoked',
-                message=f"Patient {req.patient.full_name} has revoked your access to their records.",
+                template='access.revoked',
                 actor_name=req.patient.full_name,
                 reference_id=req.id,
             )
@@ -188,18 +211,22 @@ class AccessRequestResponseView(APIView):
 
 
 # ---- Doctor: See their own access requests ----
-class DoctorAccessListView(generics.ListAPIView):
+class DoctorAccessListView(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = AccessRequestSerializer
     permission_classes = [IsDoctor]
+    query_budget = 5
 
     def get_queryset(self):
-        return AccessRequest.objects.filter(doctor=self.request.user)
+        return AccessRequestSerializer.setup_eager_loading(
+            AccessRequest.objects.filter(doctor=self.request.user)
+        )
 
 
 # ---- Emergency Break-Glass ----
 class EmergencyAccessView(generics.CreateAPIView):
     serializer_class = EmergencyAccessCreateSerializer
     permission_classes = [IsDoctor]
+    query_budget = 26  # includes seeding the notification counter rows on first use
 
     def perform_create(self, serializer):
         access = serializer.save()
@@ -218,8 +245,8 @@ class EmergencyAccessView(generics.CreateAPIView):
         notify(
             recipient=access.patient,
             notif_type='EMERGENCY_ACCESS',
-            title='⚠️ Emergency Access Used',
-            message=f"Dr. {access.doctor.full_name} used emergency break-glass access to your records at {timezone.now().strftime('%I:%M %p')}. Reason: {access.reason_detail}. Access expires in 1 hour.",
+            template='emergency.patient',
+            params={'reason': access.reason_detail},
             actor_name=access.doctor.full_name,
             reference_id=access.id,
         )
@@ -230,39 +257,40 @@ class EmergencyAccessView(generics.CreateAPIView):
                 patient_email=access.patient.email,
                 patient_name=access.patient.full_name,
             )
-        # Notify all admins (in-app + email)
-        admins = User.objects.filter(role='ADMIN', is_active=True)
-        for admin in admins:
-            notify(
-                recipient=admin,
-                notif_type='EMERGENCY_ACCESS',
-                title='⚠️ Emergency Access Triggered',
-                message=f"Dr. {access.doctor.full_name} triggered emergency access on patient {access.patient.full_name} ({access.patient.patient_id}). Review required.",
-                actor_name=access.doctor.full_name,
-                reference_id=access.id,
-            )
-            if admin.email:
-                email_emergency_access_admin(
-                    doctor_name=access.doctor.full_name,
-                    patient_name=access.patient.full_name,
-                    patient_id=str(access.patient.patient_id),
-                    reason_detail=access.reason_detail,
-                    admin_email=admin.email,
-                )
+        # Notify all admins (in-app broadcast + email)
+        notify_role(
+            role='ADMIN',
+            notif_type='EMERGENCY_ACCESS',
+            template='emergency.admin',
+            params={'patient': access.patient.full_name, 'patient_id': access.patient.patient_id},
+            actor_name=access.doctor.full_name,
+            reference_id=access.id,
+        )
+        email_emergency_access_admin(
+            doctor_name=access.doctor.full_name,
+            patient_name=access.patient.full_name,
+            patient_id=str(access.patient.patient_id),
+            reason_detail=access.reason_detail,
+            admin_emails=list(
+                User.objects.filter(role='ADMIN', is_active=True).exclude(email='').values_list('email', flat=True)
+            ),
+        )
 
 
-class EmergencyAccessListView(generics.ListAPIView):
+class EmergencyAccessListView(SparseFieldsMixin, generics.ListAPIView):
     """Admin: see all emergency accesses"""
     serializer_class = EmergencyAccessSerializer
     permission_classes = [IsAdmin]
+    query_budget = 5
 
     def get_queryset(self):
-        return EmergencyAccess.objects.all()
+        return EmergencyAccessSerializer.setup_eager_loading(EmergencyAccess.objects.all())
 
 
 class EmergencyAccessReviewView(APIView):
     """Admin reviews and flags emergency access"""
     permission_classes = [IsAdmin]
+    query_budget = 7
 
     def post(self, request, pk):
         try:
@@ -278,10 +306,13 @@ class EmergencyAccessReviewView(APIView):
         return Response(EmergencyAccessSerializer(access).data)
 
 
-class DoctorEmergencyListView(generics.ListAPIView):
+class DoctorEmergencyListView(SparseFieldsMixin, generics.ListAPIView):
     """Doctor sees their own emergency access history"""
     serializer_class = EmergencyAccessSerializer
     permission_classes = [IsDoctor]
+    query_budget = 5
 
     def get_queryset(self):
-        return EmergencyAccess.objects.filter(doctor=self.request.user)
+        return EmergencyAccessSerializer.setup_eager_loading(
+            EmergencyAccess.objects.filter(doctor=self.request.user)
+        )
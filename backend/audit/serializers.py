@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import AuditLog
+from medivault.lean_lists import datetime_mapper
 
 
 class AuditLogSerializer(serializers.ModelSerializer):
@@ -14,8 +15,52 @@ class AuditLogSerializer(serializers.ModelSerializer):
             'ip_address', 'extra_data', 'created_at',
         ]
 
+    # Columns read by the fields that aren't model fields (medivault.sparse_fields)
+    field_sources = {
+        'actor_name': ('actor', 'actor__full_name'),
+        'patient_name': ('target_patient', 'target_patient__full_name'),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join in the actor's and patient's names instead of fetching each per row."""
+        return queryset.select_related('actor', 'target_patient').only(
+            'id', 'actor', 'target_patient', 'action', 'document_id', 'document_title',
+            'is_emergency', 'ip_address', 'extra_data', 'created_at',
+            'actor__full_name', 'target_patient__full_name',
+        )
+
     def get_actor_name(self, obj):
         return obj.actor.full_name if obj.actor else "System"
 
     def get_patient_name(self, obj):
         return obj.target_patient.full_name if obj.target_patient else None
+
+    # The same rows for the list endpoint, from .values_list() (medivault.lean_lists)
+    lean_columns = (
+        'id', 'actor', 'actor__full_name', 'target_patient', 'target_patient__full_name', 'action',
+        'document_id', 'document_title', 'is_emergency', 'ip_address', 'extra_data', 'created_at',
+    )
+    lean_json_fields = ('extra_data',)
+
+    @classmethod
+    def lean_rows(cls, rows, context):
+        to_datetime = datetime_mapper()
+        return [
+            {
+                'id': str(pk),
+                'actor': actor,
+                'actor_name': actor_name if actor is not None else 'System',
+                'target_patient': target_patient,
+                'patient_name': patient_name,
+                'action': action,
+                'document_id': str(document_id) if document_id is not None else None,
+                'document_title': document_title,
+                'is_emergency': is_emergency,
+                'ip_address': ip_address,
+                'extra_data': extra_data,
+                'created_at': to_datetime(created_at),
+            }
+            for (pk, actor, actor_name, target_patient, patient_name, action, document_id,
+                 document_title, is_emergency, ip_address, extra_data, created_at) in rows
+        ]
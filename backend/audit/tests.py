@@ -1,3 +1,78 @@
+from django.contrib.auth import get_user_model
+import uuid
+from unittest import mock
 from django.test import TestCase
+from rest_framework import generics
+from rest_framework.test import APIClient
+from medivault.lean_lists import LeanListMixin
+from .models import AuditLog
 
-# Create your tests here.
+User = get_user_model()
+
+
+class AuditLogListQueryTests(TestCase):
+    def test_query_count_does_not_grow_with_the_page(self):
+        patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        client = APIClient()
+        client.force_authenticate(admin)
+        for count in (1, 24):
+            AuditLog.objects.bulk_create(
+                AuditLog(actor=doctor, target_patient=patient, action='DOCUMENT_VIEW') for _ in range(count)
+            )
+            with self.assertNumQueries(2):
+                response = client.get('/api/audit/')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(
+            (response.data['results'][0]['actor_name'], response.data['results'][0]['patient_name']),
+            ('Doc', 'Pat'),
+        )
+
+
+class LeanAuditLogListTests(TestCase):
+    """The lean list path renders exactly the bytes the serializer did."""
+
+    def setUp(self):
+        patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat \u2028 Ünal')
+        doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc 🩺', role='DOCTOR')
+        admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        AuditLog.objects.bulk_create([
+            AuditLog(actor=doctor, target_patient=patient, action='DOCUMENT_VIEW', document_id=uuid.uuid4(),
+                     document_title='Lipid "panel"', ip_address='10.0.0.1',
+                     extra_data={'scope': ['REPORT'], 'nested': {'n': 2 ** 40, 'ok': True, 'none': None}}),
+            AuditLog(actor=None, target_patient=patient, action='ACCESS_EXPIRED', is_emergency=True),
+            AuditLog(actor=doctor, target_patient=None, action='LOGIN', ip_address='::1'),
+        ] + [AuditLog(actor=admin, target_patient=patient, action='DOCUMENT_VIEW') for _ in range(20)])
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def get_both(self, params=None):
+        lean = self.client.get('/api/audit/', params)
+        with mock.patch.object(LeanListMixin, 'list', generics.ListAPIView.list):
+            full = self.client.get('/api/audit/', params)
+        return lean, full
+
+    def test_matches_the_serializer(self):
+        for params in ({}, {'page': 2}):
+            lean, full = self.get_both(params)
+            self.assertTrue(lean.plain_data)
+            self.assertEqual(lean.content, full.content, params)
+        self.assertIn(b'\\u2028', lean.content)
+        self.assertIn(b'"actor_name":"System"', lean.content)
+
+    def test_floats_in_extra_data_take_the_stdlib_encoder(self):
+        AuditLog.objects.update(extra_data={'dose': 1e-05, 'ratio': 0.1})
+        lean, full = self.get_both()
+        self.assertFalse(lean.plain_data)
+        self.assertEqual(lean.content, full.content)
+        self.assertIn(b'"dose":1e-05', lean.content)
+        lean, full = self.get_both({'fields': 'actor_name,action'})
+        self.assertTrue(lean.plain_data)  # extra_data isn't in the response
+        self.assertEqual(lean.content, full.content)
+
+    def test_sparse_fields(self):
+        for fields in ('actor_name', 'patient_name,extra_data', 'created_at,document_id,id'):
+            lean, full = self.get_both({'fields': fields})
+            self.assertEqual(lean.content, full.content, fields)
+        self.assertEqual(list(lean.json()['results'][0]), ['id', 'document_id', 'created_at'])
@@ -1,18 +1,22 @@
 from rest_framework import generics, permissions
+from medivault.lean_lists import LeanListMixin
 from .models import AuditLog
 from .serializers import AuditLogSerializer
 
 
-class AuditLogListView(generics.ListAPIView):
+class AuditLogListView(LeanListMixin, generics.ListAPIView):
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'PATIENT':
-            return AuditLog.objects.filter(target_patient=user)
+            qs = AuditLog.objects.filter(target_patient=user)
         elif user.role == 'DOCTOR':
-            return AuditLog.objects.filter(actor=user)
+            qs = AuditLog.objects.filter(actor=user)
         elif user.role == 'ADMIN':
-            return AuditLog.objects.all()
-        return AuditLog.objects.none()
+            qs = AuditLog.objects.all()
+        else:
+            return AuditLog.objects.none()
+        return AuditLogSerializer.setup_eager_loading(qs)
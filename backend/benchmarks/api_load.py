@@ -0,0 +1,413 @@
+"""
+Load test: realistic traffic mixes against a seeded MediVault server.
+
+    python benchmarks/api_load.py --duration 60 --concurrency 16 --output before.json
+    python benchmarks/api_load.py --duration 60 --concurrency 16 --compare before.json
+
+Seeds a throwaway database (SQLite by default; pass --database-url for a
+scratch PostgreSQL) with manage.py generate_data, then starts the app
+(gunicorn when installed, otherwise runserver) with email and SMS pointed at
+the local fakes in benchmarks/fakes.py. Virtual users then run scenarios
+picked by weight (--mix) until --duration is up:
+
+  dashboard    patient opens the app: profile, documents, timeline, unread count, requests
+  doctor       doctor looks up a patient they have access to and opens their documents
+  upload       patient uploads a document
+  break_glass  a burst of doctors using emergency access at once (emails admins)
+  polling      a client polling for notifications
+  otp_login    patient logs in by SMS OTP (the OTP is read back from the fake)
+
+Per endpoint it reports p50/p95/p99 latency, throughput, status codes and the
+median number of DB queries (from the Server-Timing header). --output writes
+the results as JSON; --compare prints the change against an earlier file.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fakes import FakeSMSServer, FakeSMTPServer  # noqa: E402
+
+DEFAULT_MIX = 'dashboard=5,doctor=3,upload=1,break_glass=1,polling=8,otp_login=1'
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+# ---- Database ----
+
+def setup(database_url, media_root):
+    os.environ.update({
+        'DATABASE_URL': database_url,
+        'DEBUG': 'False',
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark-secret-key'),
+        'MEDIA_ROOT': media_root,
+        'ALLOWED_HOSTS': '127.0.0.1,localhost',
+    })
+    # Each virtual user sends its own X-Forwarded-For, standing in for the
+    # address a proxy would append
+    os.environ['NUM_PROXIES'] = '1'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medivault.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(patients, doctors, admins, audit_logs, seed):
+    """Fill the database with manage.py generate_data, unless it already holds patients."""
+    from django.core.management import call_command
+    from users.models import User
+
+    if User.objects.filter(role='PATIENT').exists():
+        return
+    started = time.perf_counter()
+    call_command('generate_data', patients=patients, doctors=doctors, admins=admins,
+                 audit_logs=audit_logs, seed=seed, password='benchmark-password', verbosity=0)
+    print(f'seeded {patients:,} patients, {doctors} doctors, {admins} admins '
+          f'({time.perf_counter() - started:.0f}s)')
+
+
+def load_actors(sample):
+    """Access tokens for a sample of each role, and the patients each doctor may see."""
+    from django.utils import timezone
+    from access_control.models import AccessRequest
+    from users.models import User
+    from users.serializers import CustomTokenObtainPairSerializer
+
+    def token(user):
+        return str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+    patients = [
+        {'token': token(user), 'patient_id': user.patient_id, 'phone': user.phone}
+        for user in User.objects.filter(role='PATIENT', is_active=True).order_by('?')[:sample]
+    ]
+    grants = defaultdict(list)
+    for doctor_id, patient_id in AccessRequest.objects.filter(
+            status='APPROVED', expires_at__gt=timezone.now()).values_list(
+            'doctor_id', 'patient__patient_id'):
+        grants[doctor_id].append(patient_id)
+    doctors = [
+        {'token': token(user), 'patients': grants[user.pk]}
+        for user in User.objects.filter(role='DOCTOR', is_active=True, is_approved=True,
+                                        pk__in=list(grants))[:sample]
+    ]
+    return patients, doctors
+
+
+# ---- Server ----
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers, log):
+    try:
+        import gunicorn  # noqa: F401
+        command = [sys.executable, '-m', 'gunicorn', 'medivault.wsgi:application',
+                   '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', '4',
+                   '--log-level', 'warning']
+    except ImportError:
+        command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=os.environ.copy(), stdout=log, stderr=log)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'server exited early; see {log.name}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/', headers={'X-Forwarded-Proto': 'https'}, timeout=1)
+            return process, ' '.join(command[1:4])
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'server did not start; see {log.name}')
+
+
+# ---- Traffic ----
+
+class Client:
+    """A virtual user's HTTP session; every call is timed and recorded."""
+
+    def __init__(self, base, samples, scenario, token=None):
+        self.base = base
+        self.samples = samples
+        self.scenario = scenario
+        self.session = requests.Session()
+        self.session.headers.update({
+            # DEBUG is off, so the app expects to be behind an HTTPS proxy
+            'X-Forwarded-Proto': 'https',
+            'X-Forwarded-For': f'198.18.{random.randrange(256)}.{random.randrange(1, 255)}',
+        })
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def call(self, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base + path, timeout=30, **kwargs)
+            status = response.status_code
+            timing = response.headers.get('Server-Timing', '')
+        except requests.RequestException:
+            response, status, timing = None, 'error', ''
+        elapsed = (time.perf_counter() - start) * 1000
+        queries = None
+        if 'desc="' in timing:
+            queries = int(timing.split('desc="', 1)[1].split(' ', 1)[0])
+        self.samples.append((self.scenario, f'{method} {endpoint}', status, elapsed, queries))
+        return response
+
+
+def dashboard(ctx, samples):
+    patient = random.choice(ctx.patients)
+    client = Client(ctx.base, samples, 'dashboard', patient['token'])
+    client.call('/api/auth/me/', 'GET', '/api/auth/me/')
+    client.call('/api/documents/', 'GET', '/api/documents/')
+    client.call('/api/documents/timeline/', 'GET', '/api/documents/timeline/')
+    client.call('/api/notifications/unread/', 'GET', '/api/notifications/unread/')
+    client.call('/api/access/incoming/', 'GET', '/api/access/incoming/?status=PENDING')
+
+
+def doctor(ctx, samples):
+    doc = random.choice(ctx.doctors)
+    patient_id = random.choice(doc['patients'])
+    client = Client(ctx.base, samples, 'doctor', doc['token'])
+    client.call('/api/auth/patients/search/', 'GET', f'/api/auth/patients/search/?q={patient_id}')
+    client.call('/api/documents/?patient_id', 'GET', f'/api/documents/?patient_id={patient_id}')
+    client.call('/api/documents/emergency-summary/<id>/', 'GET', f'/api/documents/emergency-summary/{patient_id}/')
+    client.call('/api/access/my-requests/', 'GET', '/api/access/my-requests/')
+
+
+def upload(ctx, samples):
+    patient = random.choice(ctx.patients)
+    client = Client(ctx.base, samples, 'upload', patient['token'])
+    client.call('/api/documents/upload/', 'POST', '/api/documents/upload/', data={
+        'document_type': 'REPORT', 'title': 'Blood test', 'document_date': date.today().isoformat(),
+        'hospital_name': 'City Hospital',
+    }, files={'file': ('report.pdf', ctx.upload_bytes, 'application/pdf')})
+
+
+def break_glass(ctx, samples):
+    def one():
+        doc = random.choice(ctx.doctors)
+        client = Client(ctx.base, samples, 'break_glass', doc['token'])
+        client.call('/api/access/emergency/', 'POST', '/api/access/emergency/', json={
+            'patient_id': random.choice(ctx.patients)['patient_id'], 'reason_code': 'UNCONSCIOUS',
+            'reason_detail': 'Brought in unconscious after a road accident', 'patient_admit_id': 'ER-1',
+        })
+    threads = [threading.Thread(target=one) for _ in range(ctx.burst)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def polling(ctx, samples):
+    patient = random.choice(ctx.patients)
+    client = Client(ctx.base, samples, 'polling', patient['token'])
+    client.call('/api/notifications/unread/', 'GET', '/api/notifications/unread/')
+    client.call('/api/notifications/', 'GET', '/api/notifications/')
+
+
+def otp_login(ctx, samples):
+    patient = random.choice(ctx.patients)
+    client = Client(ctx.base, samples, 'otp_login')
+    response = client.call('/api/auth/otp/request/', 'POST', '/api/auth/otp/request/',
+                           json={'phone': patient['phone']})
+    otp = ctx.sms.last_otp(patient['phone'])
+    if response is not None and response.ok and otp:
+        client.call('/api/auth/otp/verify/', 'POST', '/api/auth/otp/verify/',
+                    json={'phone': patient['phone'], 'otp': otp})
+
+
+SCENARIOS = {
+    'dashboard': dashboard,
+    'doctor': doctor,
+    'upload': upload,
+    'break_glass': break_glass,
+    'polling': polling,
+    'otp_login': otp_login,
+}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f'unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def virtual_user(ctx, mix, stop, samples, scenario_counts):
+    names, weights = list(mix), list(mix.values())
+    while not stop.is_set():
+        name = random.choices(names, weights)[0]
+        SCENARIOS[name](ctx, samples)
+        scenario_counts[name] += 1
+
+
+# ---- Reporting ----
+
+def summarize(samples, elapsed):
+    by_endpoint = defaultdict(list)
+    for scenario, endpoint, status, ms, queries in samples:
+        by_endpoint[endpoint].append((status, ms, queries))
+    endpoints = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = [ms for _, ms, _ in rows]
+        queries = [q for _, _, q in rows if q is not None]
+        statuses = Counter(status for status, _, _ in rows)
+        endpoints[endpoint] = {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'errors': sum(n for status, n in statuses.items() if status == 'error' or status >= 500),
+            'statuses': {str(status): n for status, n in statuses.items()},
+            'queries_p50': statistics.median(queries) if queries else None,
+        }
+    latencies = [ms for *_, ms, _ in samples]
+    total = {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 1) if latencies else None,
+    }
+    return endpoints, total
+
+
+def print_report(endpoints, total):
+    print(f'\n{"endpoint":<48} {"reqs":>6} {"rps":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>7} {"errors":>6}')
+    for name, row in endpoints.items():
+        queries = '' if row['queries_p50'] is None else f'{row["queries_p50"]:g}'
+        print(f'{name:<48} {row["requests"]:>6} {row["throughput_rps"]:>7.1f} {row["p50_ms"]:>8.1f} '
+              f'{row["p95_ms"]:>8.1f} {row["p99_ms"]:>8.1f} {queries:>7} {row["errors"]:>6}')
+    print(f'{"all":<48} {total["requests"]:>6} {total["throughput_rps"]:>7.1f} {total["p50_ms"]:>8.1f} '
+          f'{total["p95_ms"]:>8.1f} {total["p99_ms"]:>8.1f}')
+
+
+def print_comparison(endpoints, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['endpoints']
+
+    def change(old, new):
+        return f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+
+    print(f'\nagainst {baseline_path}')
+    print(f'{"endpoint":<48} {"p95 before":>10} {"p95 now":>9} {"change":>7} {"rps before":>10} {"rps now":>8}')
+    for name, row in endpoints.items():
+        old = baseline.get(name)
+        if old:
+            print(f'{name:<48} {old["p95_ms"]:>10.1f} {row["p95_ms"]:>9.1f} {change(old["p95_ms"], row["p95_ms"]):>7} '
+                  f'{old["throughput_rps"]:>10.1f} {row["throughput_rps"]:>8.1f}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/medivault_load_bench.sqlite3')
+    parser.add_argument('--reuse', action='store_true', help='Keep an existing benchmark database.')
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--admins', type=int, default=3)
+    parser.add_argument('--audit-logs', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42, help='generate_data seed.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of traffic.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Virtual users.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Scenario weights (default: {DEFAULT_MIX}).')
+    parser.add_argument('--burst', type=int, default=5, help='Concurrent requests per break-glass burst.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--smtp-delay', type=float, default=0.05, help='Seconds the fake SMTP server takes per message.')
+    parser.add_argument('--sms-delay', type=float, default=0.1, help='Seconds the fake SMS API takes per message.')
+    parser.add_argument('--output', help='Write results as JSON to this file.')
+    parser.add_argument('--compare', help='Earlier --output file to compare against.')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    path = args.database_url.removeprefix('sqlite:///')
+    if args.database_url.startswith('sqlite:') and not args.reuse and os.path.exists(path):
+        os.remove(path)
+    media_root = '/tmp/medivault_load_bench_media'
+    setup(args.database_url, media_root)
+    seed(args.patients, args.doctors, args.admins, args.audit_logs, args.seed)
+    patients, doctors = load_actors(sample=500)
+
+    with FakeSMTPServer(args.smtp_delay) as smtp, FakeSMSServer(args.sms_delay) as sms, \
+            open('/tmp/medivault_load_bench_server.log', 'w') as log:
+        os.environ.update({**smtp.settings(), **sms.settings()})
+        port = free_port()
+        server, server_command = start_server(port, args.workers, log)
+        ctx = argparse.Namespace(
+            base=f'http://127.0.0.1:{port}', patients=patients, doctors=doctors, sms=sms,
+            burst=args.burst, upload_bytes=os.urandom(50_000),
+        )
+        samples, scenario_counts, stop = [], Counter(), threading.Event()
+        users = [threading.Thread(target=virtual_user, args=(ctx, mix, stop, samples, scenario_counts))
+                 for _ in range(args.concurrency)]
+        try:
+            started = time.perf_counter()
+            for user in users:
+                user.start()
+            time.sleep(args.duration)
+            stop.set()
+            for user in users:
+                user.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+        endpoints, total = summarize(samples, elapsed)
+        print_report(endpoints, total)
+        print(f'\nscenarios {dict(scenario_counts)}   emails {smtp.messages}   sms {sms.messages}   '
+              f'server {server_command}')
+        if args.compare:
+            print_comparison(endpoints, args.compare)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'meta': {
+                        'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                        'revision': git_revision(),
+                        'server': server_command,
+                        'duration_s': round(elapsed, 1),
+                        'args': vars(args),
+                    },
+                    'total': total,
+                    'endpoints': endpoints,
+                    'scenarios': dict(scenario_counts),
+                    'fakes': {'emails': smtp.messages, 'sms': sms.messages},
+                }, f, indent=2)
+            print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Concurrent-connection capacity, ASGI against WSGI, at the same worker count.
+
+    python benchmarks/asgi_capacity.py --levels 8,32,128 --duration 20 --output capacity.json
+
+Seeds a throwaway database as api_load.py does, then starts the app once per
+--modes entry through start.sh (SERVER_MODE=asgi or wsgi, --workers
+processes each) with email pointed at a fake SMTP server that takes
+--smtp-delay per message. At each --levels concurrency, that many virtual
+users loop over the endpoints the async views serve, picked by weight:
+
+  email_otp      POST /api/auth/otp/email/request/, a fresh address each time (waits on SMTP)
+  notifications  GET /api/notifications/unread/ ("unread"), then GET /api/notifications/
+  download       GET /api/documents/<id>/download/ for one of the user's documents
+
+Each level reports throughput, p50/p95 latency per endpoint, errors and the
+peak resident memory of the server (gunicorn's master plus workers), so
+modes are compared at the same footprint. A mode's capacity is the highest
+level whose p95 stays under --slo-ms with under 1% errors; past it, users
+queue for a free worker rather than being served.
+
+Quote numbers from a PostgreSQL run (--database-url postgres://...), the
+production database. SQLite has no connection limit or connection setup
+cost, so it hides what ASGI's connection per request costs.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+import requests
+
+from api_load import BACKEND_DIR, free_port, git_revision, load_actors, percentile, seed, setup
+from fakes import FakeSMSServer, FakeSMTPServer
+
+DEFAULT_MIX = 'email_otp=1,notifications=2,download=1'
+
+
+# ---- Server ----
+
+def start(mode, port, workers, threads, log):
+    env = {
+        **os.environ, 'SERVER_MODE': mode, 'PORT': str(port), 'WEB_CONCURRENCY': str(workers),
+        'GUNICORN_CMD_ARGS': '--log-level warning' + (f' --threads {threads}' if mode == 'wsgi' else ''),
+        'SLOW_QUERY_MS': os.environ.get('SLOW_QUERY_MS', '100'),
+        'SLOW_QUERY_FILE': f'/tmp/medivault_capacity_{mode}_slow_queries.jsonl',
+    }
+    process = subprocess.Popen(['./start.sh'], cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'{mode} server exited early; see {log.name}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/', headers={'X-Forwarded-Proto': 'https'}, timeout=5)
+            return process
+        except (requests.ConnectionError, requests.Timeout):
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'{mode} server did not start; see {log.name}')
+
+
+def resident_bytes(pid):
+    """RSS of a process and all its descendants (Linux /proc)."""
+    total = 0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1]) * 1024
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = f.read().split()
+    except OSError:
+        return total
+    return total + sum(resident_bytes(int(child)) for child in children)
+
+
+# ---- Traffic ----
+
+def email_otp(ctx, session, record):
+    email = f'capacity-{uuid.uuid4().hex[:12]}@medivault.test'
+    record('email_otp', session.post, '/api/auth/otp/email/request/',
+           json={'email': email}, headers=_fresh_ip())
+
+
+def notifications(ctx, session, record):
+    headers = {'Authorization': f'Bearer {random.choice(ctx.patients)["token"]}'}
+    record('unread', session.get, '/api/notifications/unread/', headers=headers)
+    record('notifications', session.get, '/api/notifications/', headers=headers)
+
+
+def download(ctx, session, record):
+    patient = random.choice(ctx.owners)
+    headers = {'Authorization': f'Bearer {patient["token"]}'}
+    record('download', session.get,
+           f'/api/documents/{random.choice(patient["documents"])}/download/', headers=headers)
+
+
+SCENARIOS = {'email_otp': email_otp, 'notifications': notifications, 'download': download}
+
+
+def _fresh_ip():
+    # The email OTP endpoint is throttled per client address
+    return {'X-Forwarded-For': f'198.18.{random.randrange(256)}.{random.randrange(1, 255)}'}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f'unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def virtual_user(ctx, mix, stop, samples):
+    session = requests.Session()
+    session.headers['X-Forwarded-Proto'] = 'https'  # DEBUG is off, so the app expects an HTTPS proxy
+
+    def record(endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            status = method(ctx.base + path, timeout=30, **kwargs).status_code
+        except requests.RequestException:
+            status = 'error'
+        samples.append((endpoint, status, (time.perf_counter() - start) * 1000))
+
+    names, weights = list(mix), list(mix.values())
+    while not stop.is_set():
+        SCENARIOS[random.choices(names, weights)[0]](ctx, session, record)
+
+
+def run_level(ctx, mix, concurrency, duration, server):
+    samples, stop, peak = [], threading.Event(), [0]
+    users = [threading.Thread(target=virtual_user, args=(ctx, mix, stop, samples)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for user in users:
+        user.start()
+    while time.perf_counter() - started < duration:
+        peak[0] = max(peak[0], resident_bytes(server.pid))
+        time.sleep(0.5)
+    stop.set()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - started
+
+    by_endpoint = defaultdict(list)
+    for endpoint, status, ms in samples:
+        by_endpoint[endpoint].append((status, ms))
+    errors = sum(1 for _, status, _ in samples if status == 'error' or status >= 500)
+    latencies = [ms for _, _, ms in samples]
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'errors': errors,
+        'peak_rss_mb': round(peak[0] / 2**20, 1),
+        'endpoints': {
+            endpoint: {
+                'count': len(rows),
+                'p50_ms': round(percentile([ms for _, ms in rows], 50), 1),
+                'p95_ms': round(percentile([ms for _, ms in rows], 95), 1),
+                'statuses': {str(s): sum(1 for status, _ in rows if status == s) for s in {s for s, _ in rows}},
+            }
+            for endpoint, rows in sorted(by_endpoint.items())
+        },
+    }
+
+
+def capacity(levels, slo_ms):
+    ok = [level['concurrency'] for level in levels
+          if level['p95_ms'] is not None and level['p95_ms'] <= slo_ms
+          and level['errors'] <= 0.01 * level['requests']]
+    return max(ok, default=0)
+
+
+def print_levels(mode, levels, slo_ms):
+    print(f'\n{mode}   capacity at p95 <= {slo_ms:.0f}ms: {capacity(levels, slo_ms)} connections')
+    print(f'{"conns":>6} {"req/s":>8} {"p50":>8} {"p95":>8} {"errors":>7} {"rss MB":>8}   p95 by endpoint')
+    for level in levels:
+        per_endpoint = '  '.join(f'{endpoint}={row["p95_ms"]:.0f}' for endpoint, row in level['endpoints'].items())
+        print(f'{level["concurrency"]:>6} {level["rps"]:>8.1f} {level["p50_ms"]:>7.0f}ms {level["p95_ms"]:>7.0f}ms '
+              f'{level["errors"]:>7} {level["peak_rss_mb"]:>8.1f}   {per_endpoint}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/medivault_capacity_bench.sqlite3')
+    parser.add_argument('--reuse', action='store_true', help='Keep an existing benchmark database.')
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42, help='generate_data seed.')
+    parser.add_argument('--modes', default='asgi,wsgi', help='SERVER_MODE values to compare, in order.')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes for every mode.')
+    parser.add_argument('--wsgi-threads', type=int, default=1,
+                        help='Threads per sync worker (1, the default, is the old production setup).')
+    parser.add_argument('--levels', default='4,16,64,128', help='Concurrent connections to try, comma-separated.')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per level.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Scenario weights (default: {DEFAULT_MIX}).')
+    parser.add_argument('--smtp-delay', type=float, default=0.5, help='Seconds the fake SMTP server takes per message.')
+    parser.add_argument('--slo-ms', type=float, default=2000, help='p95 latency a level must stay under.')
+    parser.add_argument('--output', help='Write results as JSON to this file.')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.levels.split(',')]
+
+    path = args.database_url.removeprefix('sqlite:///')
+    if args.database_url.startswith('sqlite:') and not args.reuse and os.path.exists(path):
+        os.remove(path)
+    if args.database_url.startswith('sqlite:'):
+        print('Note: SQLite run; use --database-url postgres://... for numbers to compare with production')
+    setup(args.database_url, '/tmp/medivault_capacity_bench_media')
+    seed(args.patients, max(args.patients // 40, 1), 1, 0, args.seed)
+    patients, _ = load_actors(sample=200)
+
+    from documents.models import Document
+    documents = defaultdict(list)
+    for pk, patient_id in Document.objects.filter(
+            patient__patient_id__in=[p['patient_id'] for p in patients]).values_list('pk', 'patient__patient_id'):
+        documents[patient_id].append(str(pk))
+    owners = [{**p, 'documents': documents[p['patient_id']]} for p in patients if documents[p['patient_id']]]
+
+    results = {}
+    with FakeSMTPServer(args.smtp_delay) as smtp, FakeSMSServer() as sms:
+        os.environ.update({**smtp.settings(), **sms.settings()})
+        for mode in args.modes.split(','):
+            port = free_port()
+            with open(f'/tmp/medivault_capacity_{mode}.log', 'w') as log:
+                server = start(mode, port, args.workers, args.wsgi_threads, log)
+                ctx = argparse.Namespace(base=f'http://127.0.0.1:{port}', patients=patients, owners=owners)
+                try:
+                    results[mode] = [run_level(ctx, mix, level, args.duration, server) for level in levels]
+                finally:
+                    server.terminate()
+                    server.wait()
+            print_levels(mode, results[mode], args.slo_ms)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                    'revision': git_revision(),
+                    'cpus': os.cpu_count(),
+                    'python': sys.version.split()[0],
+                    'args': vars(args),
+                },
+                'capacity': {mode: capacity(levels, args.slo_ms) for mode, levels in results.items()},
+                'modes': results,
+            }, f, indent=2)
+        print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Local stand-ins for the outside services the API talks to, for load tests.
+
+FakeSMTPServer speaks just enough SMTP for Django's email backend (no TLS,
+no auth) and throws the messages away. FakeSMSServer answers like the
+Fast2SMS API and remembers the last OTP sent to each number, so a benchmark
+can complete the OTP login flow. Both can add a fixed delay per message to
+mimic a real provider's latency.
+
+    with FakeSMTPServer() as smtp, FakeSMSServer() as sms:
+        env = {**smtp.settings(), **sms.settings()}
+"""
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _BackgroundServer:
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost fake ESMTP')
+        for line in self.rfile:
+            command = line.strip().split(b' ', 1)[0].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                time.sleep(self.server.delay)
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command in (b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(_BackgroundServer, socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.delay = delay
+        self.messages = 0
+        self.lock = threading.Lock()
+
+    def settings(self):
+        """Environment for the Django server so its email goes here."""
+        return {
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': str(self.port),
+            'EMAIL_USE_TLS': 'False',
+            'EMAIL_HOST_USER': 'benchmark@medivault.test',
+            'EMAIL_HOST_PASSWORD': '',
+        }
+
+
+class _SMSHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.messages += 1
+            self.server.otps[str(body.get('numbers'))] = str(body.get('variables_values'))
+        payload = json.dumps({'return': True, 'request_id': 'fake'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSMSServer(_BackgroundServer, ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), _SMSHandler)
+        self.delay = delay
+        self.messages = 0
+        self.otps = {}
+        self.lock = threading.Lock()
+
+    def last_otp(self, phone):
+        with self.lock:
+            return self.otps.get(phone)
+
+    def settings(self):
+        return {
+            'FAST2SMS_API_KEY': 'benchmark',
+            'FAST2SMS_URL': f'http://127.0.0.1:{self.port}/dev/bulkV2',
+        }
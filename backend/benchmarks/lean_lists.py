@@ -0,0 +1,118 @@
+"""
+Benchmark: list endpoints through the serializer vs the lean .values() path.
+
+    python benchmarks/lean_lists.py --rows 2000 --page-size 20 100 500
+
+Seeds a throwaway SQLite database with --rows documents, audit entries and
+notifications for one patient, then requests /api/documents/, /api/audit/
+and /api/notifications/ in-process at each page size, once as the views
+now run (LeanListMixin + FastJSONRenderer) and once with LeanListMixin.list
+swapped for DRF's ListAPIView.list and the stock JSONRenderer. Both must
+return the same bytes; the script stops if they don't. Prints the median
+request time for each.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def setup(database_url):
+    os.environ.update({'DATABASE_URL': database_url, 'ALLOWED_HOSTS': 'testserver'})
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medivault.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(count):
+    from audit.models import AuditLog
+    from documents.models import Document
+    from notifications.models import Notification
+    from users.models import User
+
+    patient = User.objects.create_user(email='patient@bench.example', password=None, full_name='Priya Iyer')
+    doctor = User.objects.create_user(email='doctor@bench.example', password=None, full_name='Dr. Rao', role='DOCTOR')
+    Document.objects.bulk_create(
+        Document(patient=patient, uploaded_by=doctor if n % 3 else patient, document_type='REPORT',
+                 event_type='CHECKUP', title=f'Blood panel {n}', description='Fasting lipid profile',
+                 hospital_name='City Hospital', doctor_name='Dr. Rao', tags='lipids, fasting, annual',
+                 document_date=date(2024, 1, 1) - timedelta(days=n), file=f'documents/2024/01/panel_{n}.pdf',
+                 file_size=120_000 + n, is_critical=n % 10 == 0)
+        for n in range(count)
+    )
+    AuditLog.objects.bulk_create(
+        AuditLog(actor=doctor, target_patient=patient, action='DOCUMENT_VIEW', document_id=uuid.uuid4(),
+                 document_title=f'Blood panel {n}', ip_address='10.0.0.1', extra_data={'scope': ['REPORT']})
+        for n in range(count)
+    )
+    Notification.objects.bulk_create(
+        Notification(recipient=patient, notification_type='ACCESS_REQUEST', template_key='access.requested',
+                     params={'reason': 'Follow-up'}, actor_name='Dr. Rao', reference_id=uuid.uuid4())
+        for n in range(count)
+    )
+    admin = User.objects.create_user(email='admin@bench.example', password=None, full_name='Admin', role='ADMIN')
+    return patient, admin
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, nargs='+', default=[20, 100, 500])
+    parser.add_argument('--database-url', default='sqlite:////tmp/medivault_lean_bench.sqlite3')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    path = args.database_url.removeprefix('sqlite:///')
+    if args.database_url.startswith('sqlite:') and os.path.exists(path):
+        os.remove(path)
+    setup(args.database_url)
+    patient, admin = seed(args.rows)
+
+    from rest_framework import generics
+    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+    from medivault.lean_lists import LeanListMixin
+    from medivault.renderers import FastJSONRenderer
+
+    clients = {}
+    for url, user in (('/api/documents/', patient), ('/api/audit/', admin), ('/api/notifications/', patient)):
+        clients[url] = APIClient()
+        clients[url].force_authenticate(user)
+
+    print(f'\n{args.rows:,} rows each; median of {args.repeat} requests\n')
+    print(f'{"endpoint":<22} {"page":>5} {"serializer ms":>14} {"lean ms":>9} {"speedup":>8}')
+    for page_size in args.page_size:
+        with mock.patch.object(PageNumberPagination, 'page_size', page_size):
+            for url, client in clients.items():
+                lean = client.get(url).content
+                with mock.patch.object(LeanListMixin, 'list', generics.ListAPIView.list), \
+                        mock.patch.object(FastJSONRenderer, 'render', JSONRenderer.render):
+                    full = client.get(url).content
+                    if lean != full:
+                        sys.exit(f'{url}: lean and serializer responses differ')
+                    before = timed(lambda: client.get(url).content, args.repeat)
+                after = timed(lambda: client.get(url).content, args.repeat)
+                print(f'{url:<22} {page_size:>5} {before:>14.2f} {after:>9.2f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
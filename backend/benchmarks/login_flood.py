@@ -0,0 +1,110 @@
+"""
+Load test: legitimate logins while a bot floods the OTP and login endpoints.
+
+Runs against a live server:
+
+    NUM_PROXIES=1 python manage.py runserver    # or gunicorn medivault.wsgi
+    python benchmarks/login_flood.py --base-url http://127.0.0.1:8000
+
+It registers a few throwaway patient accounts, measures their login latency
+on an idle server, then again while flood threads hammer /otp/request/ and
+/login/ from one address (sent as X-Forwarded-For, so start the server with
+NUM_PROXIES=1, as if a proxy had appended it). With the throttles in
+users.throttling the flood is answered with 429s before any database work,
+and legitimate latency should stay close to the baseline.
+"""
+import argparse
+import itertools
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+
+import requests
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def register_accounts(base, n):
+    accounts = []
+    for _ in range(n):
+        email = f'bench-{uuid.uuid4().hex[:10]}@example.com'
+        password = uuid.uuid4().hex
+        response = requests.post(f'{base}/register/patient/', json={
+            'email': email, 'full_name': 'Load Test', 'password': password,
+            'phone': ''.join(random.choices('6789', k=1) + random.choices('0123456789', k=9)),
+        })
+        response.raise_for_status()
+        accounts.append((email, password))
+    return accounts
+
+
+def timed_logins(base, accounts, count):
+    latencies, statuses = [], Counter()
+    session = requests.Session()
+    for i, (email, password) in enumerate(itertools.islice(itertools.cycle(accounts), count)):
+        start = time.perf_counter()
+        # Every legitimate login comes from its own address, as real users would
+        response = session.post(f'{base}/login/', json={'email': email, 'password': password},
+                                headers={'X-Forwarded-For': f'198.51.100.{i % 250 + 1}'})
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] += 1
+    return latencies, statuses
+
+
+def flood(base, stop, statuses, lock):
+    session = requests.Session()
+    headers = {'X-Forwarded-For': '203.0.113.66'}
+    while not stop.is_set():
+        phone = '9' + ''.join(random.choices('0123456789', k=9))
+        for path, body in (
+            ('/otp/request/', {'phone': phone}),
+            ('/login/', {'email': f'{phone}@example.com', 'password': 'guess'}),
+        ):
+            try:
+                code = session.post(f'{base}{path}', json=body, headers=headers, timeout=10).status_code
+            except requests.RequestException:
+                code = 'error'
+            with lock:
+                statuses[code] += 1
+
+
+def report(label, latencies, statuses):
+    print(f'{label:<14} p50 {statistics.median(latencies):7.1f} ms   '
+          f'p95 {percentile(latencies, 95):7.1f} ms   statuses {dict(statuses)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--logins', type=int, default=20, help='Legitimate logins per phase.')
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--flood-threads', type=int, default=8)
+    args = parser.parse_args()
+    base = args.base_url.rstrip('/') + '/api/auth'
+
+    accounts = register_accounts(base, args.accounts)
+    report('baseline', *timed_logins(base, accounts, args.logins))
+
+    stop, lock, flood_statuses = threading.Event(), threading.Lock(), Counter()
+    threads = [threading.Thread(target=flood, args=(base, stop, flood_statuses, lock), daemon=True)
+               for _ in range(args.flood_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)  # let the flood get going
+    try:
+        report('under flood', *timed_logins(base, accounts, args.logins))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    print(f'flood requests {sum(flood_statuses.values())}   statuses {dict(flood_statuses)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: patient search latency at scale, old scan vs indexed search.
+
+    python benchmarks/patient_search.py --patients 1000000
+
+Seeds a throwaway SQLite database (or any DATABASE_URL given with --database-url,
+e.g. a scratch PostgreSQL) with synthetic patients, then times each kind of
+front-desk query through users.search.search_patients and through the old
+endpoint's `patient_id__icontains` filter. Seeding a million rows takes a few minutes;
+pass --reuse to keep an already seeded database between runs.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FIRST = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Meera',
+         'Ishaan', 'Diya', 'Karan', 'Nisha', 'Aditya', 'Pooja', 'Sanjay', 'Lakshmi', 'Farhan', 'Zoya']
+LAST = ['Sharma', 'Verma', 'Iyer', 'Reddy', 'Patel', 'Khan', 'Nair', 'Gupta', 'Das', 'Singh',
+        'Menon', 'Joshi', 'Mehta', 'Bose', 'Rao', 'Pillai', 'Chopra', 'Kapoor', 'Ahmed', 'Mishra']
+
+
+def setup(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medivault.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(count, batch_size=5000):
+    from django.db import transaction
+    from users.models import User
+    from users.patient_ids import format_patient_id, permute
+
+    have = User.objects.filter(role='PATIENT').count()
+    key = b'benchmark'
+    rng = random.Random(have)
+    started = time.perf_counter()
+    for start in range(have, count, batch_size):
+        rows = []
+        for n in range(start, min(start + batch_size, count)):
+            phone = f'{rng.choice("6789")}{rng.randrange(10 ** 9):09d}'
+            names = [rng.choice(FIRST), rng.choice(LAST)]
+            if rng.random() < 0.3:
+                names.insert(1, rng.choice(FIRST))
+            rows.append(User(
+                email=f'patient{n}@bench.example', password='!', role='PATIENT',
+                full_name=' '.join(names),
+                phone=phone, phone_normalized=phone, patient_id=format_patient_id(permute(n, key)),
+            ))
+        with transaction.atomic():
+            User.objects.bulk_create(rows)
+        print(f'\rseeded {min(start + batch_size, count):,}/{count:,}', end='', flush=True)
+    if count > have:
+        print(f'  ({time.perf_counter() - started:.0f}s)')
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--database-url', default='sqlite:////tmp/medivault_search_bench.sqlite3')
+    parser.add_argument('--reuse', action='store_true', help='Keep an existing benchmark database.')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = args.database_url.removeprefix('sqlite:///')
+    if args.database_url.startswith('sqlite:') and not args.reuse and os.path.exists(path):
+        os.remove(path)
+    setup(args.database_url)
+    seed(args.patients)
+
+    from users.models import User
+    from users.search import search_patients
+
+    sample = User.objects.filter(role='PATIENT').order_by('pk')[min(1234, args.patients - 1)]
+    queries = [
+        ('full patient id', sample.patient_id),
+        ('patient id prefix', sample.patient_id[:6]),
+        ('full phone', f'+91 {sample.phone[:5]} {sample.phone[5:]}'),
+        ('phone prefix', sample.phone[:6]),
+        ('name word', 'priya'),
+        ('first + last name', 'kavya menon'),
+        ('short name prefix', 'an'),
+        ('no match', 'zzyzx'),
+    ]
+    print(f'\n{User.objects.filter(role="PATIENT").count():,} patients\n')
+    print(f'{"query":<20} {"q":<18} {"hits":>4} {"p50 ms":>8} {"p95 ms":>8}   old endpoint p50')
+    for label, q in queries:
+        hits = len(search_patients(q))
+        p50, p95 = timed(lambda: search_patients(q), args.repeat)
+        old, _ = timed(
+            lambda: list(User.objects.filter(role='PATIENT', patient_id__icontains=q)[:10]),
+            max(args.repeat // 4, 3),
+        )
+        print(f'{label:<20} {q:<18} {hits:>4} {p50:>8.2f} {p95:>8.2f}   {old:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+Replay real traffic, rebuilt from the audit log, against a MediVault server.
+
+    python benchmarks/replay.py --database-url postgres://.../medivault_copy --minutes 60 --speed 1
+    python benchmarks/replay.py --since 2025-06-30T09:00 --minutes 30 --speed 10 --concurrency 32 \\
+        --output replay.json
+
+Point --database-url at a copy of the database the log came from (a
+restored backup, or one filled by manage.py generate_data): the replay
+writes to it. Each AuditLog entry in the window becomes the request
+sequence that produced it, sent as the entry's actor with a locally minted
+token (passwords and OTPs can't be replayed):
+
+  LOGIN                              GET /api/auth/me/, GET /api/notifications/unread/
+  DOCUMENT_VIEW, DOCUMENT_DOWNLOAD   GET /api/documents/<id>/
+  DOCUMENT_UPLOAD                    POST /api/documents/upload/
+  DOCUMENT_DELETE                    DELETE /api/documents/<id>/
+  ACCESS_REQUEST                     POST /api/access/request/
+  ACCESS_APPROVE/REJECT/REVOKE       GET /api/access/incoming/, then POST /api/access/<id>/respond/
+                                     on that doctor's request, if one is still open
+  EMERGENCY_ACCESS                   POST /api/access/emergency/
+  PROFILE_UPDATE                     PATCH /api/auth/me/
+
+LOGOUT has nothing to call with JWTs and is skipped; --read-only also skips
+everything but LOGIN and document views.
+
+Entries start at their recorded offset divided by --speed (0 sends them as
+fast as the workers go). All of one actor's entries go to the same worker,
+in order, so a user's requests never overlap; --concurrency is the number of
+workers. Besides per-endpoint latency (as in api_load.py) the report shows
+schedule lag, how late entries started against the recorded timeline: if it
+keeps growing, the server can't sustain that speed.
+
+The server is started as in api_load.py with email and SMS going to the
+fakes; --base-url targets one that is already running instead, which must
+share this process's SECRET_KEY for the tokens to be accepted and run with
+NUM_PROXIES=1 for the recorded addresses (sent as X-Forwarded-For) to count.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from api_load import (
+    Client, free_port, git_revision, percentile, print_comparison, print_report, setup, start_server, summarize,
+)
+from fakes import FakeSMSServer, FakeSMTPServer
+
+Entry = namedtuple('Entry', 'action actor patient_id document_id title extra ip created_at')
+READ_ONLY_ACTIONS = {'LOGIN', 'DOCUMENT_VIEW', 'DOCUMENT_DOWNLOAD'}
+
+
+def load_entries(since, minutes, limit, read_only):
+    """Audit entries in the window, oldest first, and a token for each actor."""
+    from audit.models import AuditLog
+    from users.models import User
+    from users.serializers import CustomTokenObtainPairSerializer
+
+    logs = AuditLog.objects.exclude(action='LOGOUT').exclude(actor=None)
+    if since is None:
+        latest = logs.order_by('-created_at').values_list('created_at', flat=True).first()
+        if latest is None:
+            raise SystemExit('the audit log is empty')
+        since = latest - timedelta(minutes=minutes) + timedelta(microseconds=1)
+    logs = logs.filter(created_at__gte=since, created_at__lt=since + timedelta(minutes=minutes))
+    if read_only:
+        logs = logs.filter(action__in=READ_ONLY_ACTIONS)
+    rows = logs.order_by('created_at').values_list(
+        'action', 'actor_id', 'target_patient__patient_id', 'document_id', 'document_title',
+        'extra_data', 'ip_address', 'created_at',
+    )
+    entries = [Entry(*row) for row in (rows[:limit] if limit else rows)]
+    actors = User.objects.filter(pk__in={entry.actor for entry in entries}, is_active=True)
+    tokens = {user.pk: str(CustomTokenObtainPairSerializer.get_token(user).access_token) for user in actors}
+    return entries, tokens
+
+
+# ---- Request sequences, one per audit action ----
+
+def login(client, entry, ctx):
+    client.call('/api/auth/me/', 'GET', '/api/auth/me/')
+    client.call('/api/notifications/unread/', 'GET', '/api/notifications/unread/')
+
+
+def document_view(client, entry, ctx):
+    client.call('/api/documents/<id>/', 'GET', f'/api/documents/{entry.document_id}/')
+
+
+def document_upload(client, entry, ctx):
+    client.call('/api/documents/upload/', 'POST', '/api/documents/upload/', data={
+        'document_type': 'REPORT', 'title': entry.title or 'Replayed upload',
+        'document_date': date.today().isoformat(),
+    }, files={'file': ('replay.pdf', ctx.upload_bytes, 'application/pdf')})
+
+
+def document_delete(client, entry, ctx):
+    client.call('/api/documents/<id>/', 'DELETE', f'/api/documents/{entry.document_id}/')
+
+
+def access_request(client, entry, ctx):
+    client.call('/api/access/request/', 'POST', '/api/access/request/', json={
+        'patient_id': entry.patient_id, 'scope': ['ALL'], 'reason': 'Replayed request',
+    })
+
+
+def access_response(client, entry, ctx):
+    status = 'APPROVED' if entry.action == 'ACCESS_REVOKE' else 'PENDING'
+    response = client.call('/api/access/incoming/', 'GET', f'/api/access/incoming/?status={status}')
+    if response is None or not response.ok:
+        return
+    body = response.json()
+    requests = body['results'] if isinstance(body, dict) else body
+    match = next((r for r in requests if r['doctor_name'] == entry.extra.get('doctor')), None)
+    if match is None:
+        ctx.unmatched[entry.action] += 1
+        return
+    action = {'ACCESS_APPROVE': 'approve', 'ACCESS_REJECT': 'reject', 'ACCESS_REVOKE': 'revoke'}[entry.action]
+    client.call('/api/access/<id>/respond/', 'POST', f'/api/access/{match["id"]}/respond/', json={'action': action})
+
+
+def emergency_access(client, entry, ctx):
+    client.call('/api/access/emergency/', 'POST', '/api/access/emergency/', json={
+        'patient_id': entry.patient_id,
+        'reason_code': entry.extra.get('reason_code', 'OTHER'),
+        'reason_detail': entry.extra.get('reason_detail') or 'Replayed emergency access',
+        'patient_admit_id': entry.extra.get('patient_admit_id') or 'REPLAY',
+    })
+
+
+def profile_update(client, entry, ctx):
+    client.call('/api/auth/me/', 'PATCH', '/api/auth/me/', json={})
+
+
+SEQUENCES = {
+    'LOGIN': login,
+    'DOCUMENT_VIEW': document_view,
+    'DOCUMENT_DOWNLOAD': document_view,
+    'DOCUMENT_UPLOAD': document_upload,
+    'DOCUMENT_DELETE': document_delete,
+    'ACCESS_REQUEST': access_request,
+    'ACCESS_APPROVE': access_response,
+    'ACCESS_REJECT': access_response,
+    'ACCESS_REVOKE': access_response,
+    'EMERGENCY_ACCESS': emergency_access,
+    'PROFILE_UPDATE': profile_update,
+}
+
+
+# ---- Replay ----
+
+def worker(ctx, inbox, samples, lags):
+    while (item := inbox.get()) is not None:
+        due, entry = item
+        lags.append(max(time.monotonic() - due, 0) * 1000)
+        client = Client(ctx.base, samples, entry.action, ctx.tokens[entry.actor])
+        if entry.ip:
+            # The recorded address, so per-IP throttles see the real spread
+            client.session.headers['X-Forwarded-For'] = entry.ip
+        SEQUENCES[entry.action](client, entry, ctx)
+
+
+def replay(ctx, entries, speed, concurrency):
+    """Feed entries to the workers on the recorded schedule; returns (samples, lags, elapsed)."""
+    samples, lags = [], []
+    inboxes = [queue.SimpleQueue() for _ in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(ctx, inbox, samples, lags)) for inbox in inboxes]
+    for thread in threads:
+        thread.start()
+    started = time.monotonic()
+    first = entries[0].created_at if entries else None
+    for entry in entries:
+        due = started + ((entry.created_at - first).total_seconds() / speed if speed else 0)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        inboxes[zlib.crc32(entry.actor.bytes) % concurrency].put((due, entry))
+    for inbox in inboxes:
+        inbox.put(None)
+    for thread in threads:
+        thread.join()
+    return samples, lags, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/medivault_load_bench.sqlite3')
+    parser.add_argument('--media-root', default='/tmp/medivault_load_bench_media')
+    parser.add_argument('--base-url', help='Replay against this running server instead of starting one.')
+    parser.add_argument('--since', type=datetime.fromisoformat,
+                        help='Start of the window, ISO 8601 in UTC (default: the last --minutes of the log).')
+    parser.add_argument('--minutes', type=float, default=60, help='Length of the window.')
+    parser.add_argument('--limit', type=int, help='Replay at most this many entries.')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Multiple of the recorded rate (default 1; 0 = as fast as possible).')
+    parser.add_argument('--concurrency', type=int, default=16, help='Worker threads.')
+    parser.add_argument('--read-only', action='store_true', help='Only replay logins and document views.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--smtp-delay', type=float, default=0.05, help='Seconds the fake SMTP server takes per message.')
+    parser.add_argument('--sms-delay', type=float, default=0.1, help='Seconds the fake SMS API takes per message.')
+    parser.add_argument('--output', help='Write results as JSON to this file.')
+    parser.add_argument('--compare', help='Earlier --output file (from here or api_load.py) to compare against.')
+    args = parser.parse_args()
+    since = args.since.replace(tzinfo=args.since.tzinfo or dt_timezone.utc) if args.since else None
+
+    setup(args.database_url, args.media_root)
+    entries, tokens = load_entries(since, args.minutes, args.limit, args.read_only)
+    skipped = sum(1 for entry in entries if entry.actor not in tokens)
+    entries = [entry for entry in entries if entry.actor in tokens]
+    if not entries:
+        raise SystemExit('no audit entries to replay in that window')
+    recorded = (entries[-1].created_at - entries[0].created_at).total_seconds()
+    print(f'replaying {len(entries):,} entries from {entries[0].created_at:%Y-%m-%d %H:%M:%S} '
+          f'({recorded:.0f}s recorded, {skipped} skipped for inactive or deleted actors)')
+
+    with FakeSMTPServer(args.smtp_delay) as smtp, FakeSMSServer(args.sms_delay) as sms, \
+            open('/tmp/medivault_replay_server.log', 'w') as log:
+        server, server_command = None, args.base_url
+        if not args.base_url:
+            os.environ.update({**smtp.settings(), **sms.settings()})
+            port = free_port()
+            server, server_command = start_server(port, args.workers, log)
+        ctx = argparse.Namespace(
+            base=(args.base_url or f'http://127.0.0.1:{port}').rstrip('/'), tokens=tokens,
+            upload_bytes=os.urandom(50_000), unmatched=Counter(),
+        )
+        try:
+            samples, lags, elapsed = replay(ctx, entries, args.speed, args.concurrency)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    endpoints, total = summarize(samples, elapsed)
+    lag = {
+        'p50_ms': round(percentile(lags, 50), 1),
+        'p95_ms': round(percentile(lags, 95), 1),
+        'max_ms': round(max(lags), 1),
+    }
+    actions = Counter(entry.action for entry in entries)
+    print_report(endpoints, total)
+    print(f'\nschedule lag p50 {lag["p50_ms"]:.0f}ms  p95 {lag["p95_ms"]:.0f}ms  max {lag["max_ms"]:.0f}ms   '
+          f'replayed {elapsed:.0f}s of {recorded:.0f}s recorded')
+    print(f'actions {dict(actions)}')
+    if ctx.unmatched:
+        print(f'no open request to respond to {dict(ctx.unmatched)}')
+    if args.compare:
+        print_comparison(endpoints, args.compare)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                    'revision': git_revision(),
+                    'server': server_command,
+                    'window_start': entries[0].created_at.isoformat(),
+                    'recorded_s': round(recorded, 1),
+                    'duration_s': round(elapsed, 1),
+                    'args': {**vars(args), 'since': since and since.isoformat()},
+                },
+                'total': total,
+                'endpoints': endpoints,
+                'lag': lag,
+                'actions': dict(actions),
+                'unmatched': dict(ctx.unmatched),
+                'fakes': {'emails': smtp.messages, 'sms': sms.messages},
+            }, f, indent=2)
+        print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Document
+from medivault.lean_lists import date_mapper, datetime_mapper, file_url_mapper
 from users.serializers import UserSerializer
 
 
@@ -19,6 +20,22 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'patient', 'uploaded_by', 'file_size', 'created_at', 'updated_at']
 
+    # Columns read by the fields that aren't model fields (medivault.sparse_fields)
+    field_sources = {
+        'uploaded_by_name': ('uploaded_by__full_name',),
+        'tags_list': ('tags',),
+        'file_url': ('file',),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """The list query for these fields: the uploader's name joined in, nothing else of theirs."""
+        return queryset.select_related('uploaded_by').only(
+            'id', 'patient', 'uploaded_by', 'document_type', 'event_type', 'title', 'description',
+            'hospital_name', 'doctor_name', 'tags', 'document_date', 'file', 'file_size',
+            'is_critical', 'created_at', 'updated_at', 'uploaded_by__full_name',
+        )
+
     def get_uploaded_by_name(self, obj):
         return obj.uploaded_by.full_name if obj.uploaded_by else None
 
@@ -28,6 +45,46 @@ class DocumentSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return None
 
+    # The same rows for the list endpoint, from .values_list() (medivault.lean_lists)
+    lean_columns = (
+        'id', 'patient', 'uploaded_by', 'uploaded_by__full_name', 'document_type', 'event_type', 'title',
+        'description', 'hospital_name', 'doctor_name', 'tags', 'document_date', 'file', 'file_size',
+        'is_critical', 'created_at', 'updated_at',
+    )
+
+    @classmethod
+    def lean_rows(cls, rows, context):
+        # `file` and `file_url` are the same absolute URL
+        to_url = file_url_mapper(context['request'], Document._meta.get_field('file').storage)
+        to_date, to_datetime = date_mapper(), datetime_mapper()
+        data = []
+        for (pk, patient, uploaded_by, uploaded_by_name, document_type, event_type, title, description,
+             hospital_name, doctor_name, tags, document_date, file, file_size, is_critical,
+             created_at, updated_at) in rows:
+            url = to_url(file)
+            data.append({
+                'id': str(pk),
+                'patient': patient,
+                'uploaded_by': uploaded_by,
+                'uploaded_by_name': uploaded_by_name,
+                'document_type': document_type,
+                'event_type': event_type,
+                'title': title,
+                'description': description,
+                'hospital_name': hospital_name,
+                'doctor_name': doctor_name,
+                'tags': tags,
+                'tags_list': [t.strip() for t in tags.split(',') if t.strip()] if tags else [],
+                'document_date': to_date(document_date),
+                'file': url,
+                'file_url': url,
+                'file_size': file_size,
+                'is_critical': is_critical,
+                'created_at': to_datetime(created_at),
+                'updated_at': to_datetime(updated_at),
+            })
+        return data
+
 
 class DocumentUploadSerializer(serializers.ModelSerializer):
     class Meta:
@@ -58,6 +115,15 @@ class TimelineSerializer(serializers.ModelSerializer):
             'month_year', 'tags', 'is_critical', 'file_url',
         ]
 
+    field_sources = {'month_year': ('document_date',), 'file_url': ('file',)}
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.only(
+            'id', 'document_type', 'event_type', 'title', 'hospital_name',
+            'doctor_name', 'document_date', 'tags', 'is_critical', 'file',
+        )
+
     def get_month_year(self, obj):
         return obj.document_date.strftime('%B %Y')
 
@@ -1,3 +1,189 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
+from asgiref.sync import sync_to_async
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import generics
+from rest_framework.test import APIClient
+from access_control.models import AccessRequest, EmergencyAccess
+from audit.models import AuditLog
+from medivault.lean_lists import LeanListMixin
+from users.serializers import CustomTokenObtainPairSerializer
+from .models import Document
 
-# Create your tests here.
+User = get_user_model()
+
+
+class DocumentListQueryTests(TestCase):
+    """List endpoints cost the same number of queries whatever the page holds."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        self.doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        self.client = APIClient()
+
+    def _add_documents(self, count):
+        # bulk_create: Document.save() reads the size of a real file
+        Document.objects.bulk_create(
+            Document(patient=self.patient, uploaded_by=self.doctor, document_type='REPORT',
+                     title=f'Report {n}', document_date=date(2024, 1, 1), file='documents/r.pdf')
+            for n in range(count)
+        )
+
+    def test_patient_document_list(self):
+        self.client.force_authenticate(self.patient)
+        for count in (1, 24):
+            self._add_documents(count)
+            with self.assertNumQueries(2):  # count + page
+                response = self.client.get('/api/documents/')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['results'][0]['uploaded_by_name'], 'Doc')
+
+    def test_doctor_document_list(self):
+        AccessRequest.objects.create(
+            doctor=self.doctor, patient=self.patient, status='APPROVED', scope=['ALL'],
+            reason='follow-up', expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.client.force_authenticate(self.doctor)
+        for count in (1, 24):
+            self._add_documents(count)
+            with self.assertNumQueries(4):  # patient_id lookup, access check, count, page
+                response = self.client.get('/api/documents/', {'patient_id': self.patient.patient_id})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_timeline(self):
+        self.client.force_authenticate(self.patient)
+        for count in (1, 24):
+            self._add_documents(count)
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/documents/timeline/')
+        self.assertEqual(response.data['results'][0]['month_year'], 'January 2024')
+
+
+class LeanDocumentListTests(TestCase):
+    """The lean list path renders exactly the bytes the serializer did."""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Dr. Ünal', role='DOCTOR')
+        Document.objects.bulk_create([
+            Document(patient=self.patient, uploaded_by=doctor, document_type='REPORT', event_type='CHECKUP',
+                     title='Lipid panel \u2028 🩸', description='Fasting\n"12h"', tags=' lipids, ,fasting ',
+                     document_date=date(2024, 1, 1), file='documents/2024/01/panel résumé (1).pdf',
+                     file_size=1234, is_critical=True),
+            Document(patient=self.patient, uploaded_by=None, document_type='SCAN', title='Chest X-ray',
+                     document_date=date(2023, 6, 30), file='documents/2023/06/xray#2?.png'),
+        ] + [
+            Document(patient=self.patient, uploaded_by=self.patient, document_type='PRESCRIPTION',
+                     title=f'Rx {n}', document_date=date(2022, 1, n + 1), file=f'documents/2022/01/rx{n}.pdf')
+            for n in range(25)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def get_both(self, params):
+        lean = self.client.get('/api/documents/', params)
+        with mock.patch.object(LeanListMixin, 'list', generics.ListAPIView.list):
+            full = self.client.get('/api/documents/', params)
+        return lean, full
+
+    def test_matches_the_serializer(self):
+        for params in ({}, {'page': 2}, {'search': 'lipid'}, {'ordering': 'created_at', 'is_critical': 'false'}):
+            lean, full = self.get_both(params)
+            self.assertEqual(lean.status_code, 200)
+            self.assertTrue(lean.plain_data)
+            self.assertEqual(lean.content, full.content, params)
+        first = self.client.get('/api/documents/').json()['results'][0]
+        self.assertEqual(first['file_url'], 'http://testserver/media/documents/2024/01/panel%20r%C3%A9sum%C3%A9%20(1).pdf')
+        self.assertEqual(first['tags_list'], ['lipids', 'fasting'])
+
+    def test_matches_the_serializer_for_a_doctor(self):
+        doctor = User.objects.get(email='d@example.com')
+        AccessRequest.objects.create(
+            doctor=doctor, patient=self.patient, status='APPROVED', scope=['REPORT', 'SCAN'],
+            reason='follow-up', expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.client.force_authenticate(doctor)
+        lean, full = self.get_both({'patient_id': self.patient.patient_id})
+        self.assertEqual(lean.json()['count'], 2)
+        self.assertEqual(lean.content, full.content)
+
+    def test_sparse_fields(self):
+        for fields in ('tags_list', 'uploaded_by_name,file_url', 'title,id,nope', 'created_at,tags'):
+            lean, full = self.get_both({'fields': fields})
+            self.assertEqual(lean.content, full.content, fields)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/documents/', {'fields': 'id,title,document_type,document_date'})
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'document_type', 'title', 'document_date'])
+        columns = queries.captured_queries[-1]['sql'].split(' FROM ')[0]
+        self.assertNotIn('description', columns)
+        self.assertNotIn('full_name', columns)
+
+    def test_sparse_timeline(self):
+        response = self.client.get('/api/documents/timeline/', {'fields': 'title,month_year'})
+        self.assertEqual(response.data['results'][0], {'title': 'Lipid panel \u2028 🩸', 'month_year': 'January 2024'})
+
+
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(MEDIA_ROOT=media.name)
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        self.doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        self.content = b'%PDF-1.4 ' + bytes(range(256)) * 1000
+        self.doc = Document(patient=self.patient, uploaded_by=self.patient, document_type='REPORT',
+                            title='Bloods', document_date=date(2024, 1, 1))
+        self.doc.file.save('bloods.pdf', ContentFile(self.content))
+        self.url = f'/api/documents/{self.doc.pk}/download/'
+        self.client = APIClient()
+
+    def test_patient_downloads_their_file(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bloods.pdf"')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        log = AuditLog.objects.get(action='DOCUMENT_DOWNLOAD')
+        self.assertEqual((log.actor, log.target_patient, log.document_id), (self.patient, self.patient, self.doc.pk))
+
+    def test_doctor_needs_access(self):
+        self.client.force_authenticate(self.doctor)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        grant = AccessRequest.objects.create(
+            doctor=self.doctor, patient=self.patient, status='APPROVED', scope=['PRESCRIPTION'],
+            reason='follow-up', expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 404)  # out of scope
+        grant.scope = ['REPORT']
+        grant.save()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_emergency_access_covers_critical_files(self):
+        EmergencyAccess.objects.create(doctor=self.doctor, patient=self.patient, reason_code='UNCONSCIOUS',
+                                       reason_detail='RTA', expires_at=timezone.now() + timedelta(hours=1))
+        self.client.force_authenticate(self.doctor)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        Document.objects.filter(pk=self.doc.pk).update(is_critical=True)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_other_patients_get_404(self):
+        other = User.objects.create_user(email='o@example.com', password=None, full_name='Other')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertFalse(AuditLog.objects.exists())
+
+    async def test_streams_under_asgi(self):
+        token = await sync_to_async(lambda: str(CustomTokenObtainPairSerializer.get_token(self.patient).access_token))()
+        response = await AsyncClient().get(self.url, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.content)
@@ -1,4 +1,12 @@
+import mimetypes
+import os
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
 from rest_framework import generics, permissions, status, filters
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -6,16 +14,23 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
 from .models import Document
 from .serializers import DocumentSerializer, DocumentUploadSerializer, TimelineSerializer
+from access_control.models import AccessRequest, EmergencyAccess
 from audit.models import AuditLog
+from medivault.async_views import AsyncAPIView, blocking_io
+from medivault.lean_lists import LeanListMixin
+from medivault.sparse_fields import SparseFieldsMixin
+from users.identity import resolve_patient_pk
 
 User = get_user_model()
 
 
+def _client_ip(request):
+    x_ff = request.META.get('HTTP_X_FORWARDED_FOR')
+    return x_ff.split(',')[0] if x_ff else request.META.get('REMOTE_ADDR')
+
+
 def log_action(actor, action, patient=None, document=None, is_emergency=False, request=None, extra=None):
-    ip = None
-    if request:
-        x_ff = request.META.get('HTTP_X_FORWARDED_FOR')
-        ip = x_ff.split(',')[0] if x_ff else request.META.get('REMOTE_ADDR')
+    ip = _client_ip(request) if request else None
     AuditLog.objects.create(
         actor=actor,
         target_patient=patient,
@@ -37,6 +52,7 @@ class DocumentUploadView(generics.CreateAPIView):
     serializer_class = DocumentUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    query_budget = 5
 
     def perform_create(self, serializer):
         doc = serializer.save()
@@ -49,7 +65,7 @@ class DocumentUploadView(generics.CreateAPIView):
         )
 
 
-class PatientDocumentListView(generics.ListAPIView):
+class PatientDocumentListView(LeanListMixin, generics.ListAPIView):
     """Patient views their own documents. Doctors see approved scope only."""
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -57,8 +73,12 @@ class PatientDocumentListView(generics.ListAPIView):
     filterset_fields = ['document_type', 'event_type', 'is_critical']
     search_fields = ['title', 'hospital_name', 'doctor_name', 'tags']
     ordering_fields = ['document_date', 'created_at']
+    query_budget = 7
 
     def get_queryset(self):
+        return DocumentSerializer.setup_eager_loading(self._visible_documents())
+
+    def _visible_documents(self):
         user = self.request.user
 
         if user.role == 'PATIENT':
@@ -69,9 +89,8 @@ class PatientDocumentListView(generics.ListAPIView):
             if not patient_id:
                 return Document.objects.none()
 
-            try:
-                patient = User.objects.get(patient_id=patient_id, role='PATIENT')
-            except User.DoesNotExist:
+            patient = resolve_patient_pk(patient_id)
+            if patient is None:
                 return Document.objects.none()
 
             # Check normal access
@@ -110,6 +129,7 @@ class PatientDocumentListView(generics.ListAPIView):
 class DocumentDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 8
 
     def get_queryset(self):
         user = self.request.user
@@ -141,29 +161,102 @@ class DocumentDetailView(generics.RetrieveDestroyAPIView):
         return super().destroy(request, *args, **kwargs)
 
 
-class HealthTimelineView(generics.ListAPIView):
+def can_download(user, doc):
+    """The same rules as the document list: own files, granted scope, critical files in an emergency."""
+    if user.role == 'ADMIN':
+        return True
+    if user.role == 'PATIENT':
+        return doc.patient_id == user.pk
+    if user.role != 'DOCTOR':
+        return False
+    now = timezone.now()
+    approved = AccessRequest.objects.filter(
+        doctor=user, patient_id=doc.patient_id, status='APPROVED', expires_at__gt=now
+    ).values_list('scope', flat=True).first()
+    if approved is not None and ('ALL' in approved or doc.document_type in approved):
+        return True
+    return doc.is_critical and EmergencyAccess.objects.filter(
+        doctor=user, patient_id=doc.patient_id, expires_at__gt=now
+    ).exists()
+
+
+async def _read_chunks(file, chunk_size):
+    read = blocking_io(file.read)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+class DocumentDownloadView(AsyncAPIView):
+    """
+    The document's file. Under ASGI it's streamed in chunks read off the
+    event loop, so a slow client holds no thread; under WSGI it goes out
+    through the server's file wrapper.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
+    chunk_size = 64 * 1024
+
+    async def get(self, request, pk):
+        doc, file = await sync_to_async(self.open_document)(request, pk)
+        filename = os.path.basename(doc.file.name)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if isinstance(request._request, ASGIRequest):
+            response = StreamingHttpResponse(_read_chunks(file, self.chunk_size), content_type=content_type)
+            response['Content-Length'] = file.size
+        else:
+            response = FileResponse(file, content_type=content_type)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+    def open_document(self, request, pk):
+        doc = Document.objects.filter(pk=pk).only(
+            'id', 'patient', 'document_type', 'is_critical', 'title', 'file'
+        ).first()
+        # 404 rather than 403, so ids can't be probed for existence
+        if doc is None or not doc.file or not can_download(request.user, doc):
+            raise NotFound()
+        try:
+            file = doc.file.storage.open(doc.file.name, 'rb')
+        except FileNotFoundError:
+            raise NotFound()
+        AuditLog.objects.create(
+            actor_id=request.user.pk,
+            target_patient_id=doc.patient_id,
+            action='DOCUMENT_DOWNLOAD',
+            document_id=doc.id,
+            document_title=doc.title,
+            ip_address=_client_ip(request),
+        )
+        return doc, file
+
+
+class HealthTimelineView(SparseFieldsMixin, generics.ListAPIView):
     """Patient gets their health timeline"""
     serializer_class = TimelineSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'PATIENT':
-            return Document.objects.filter(patient=user).order_by('-document_date')
+            return TimelineSerializer.setup_eager_loading(
+                Document.objects.filter(patient=user).order_by('-document_date')
+            )
         return Document.objects.none()
 
 
 class EmergencySummaryView(APIView):
     """Quick summary card for emergency situations"""
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 6
 
     def get(self, request, patient_id=None):
-        try:
-            if patient_id:
-                patient = User.objects.get(patient_id=patient_id, role='PATIENT')
-            else:
-                patient = request.user
-        except User.DoesNotExist:
+        pk = resolve_patient_pk(patient_id) if patient_id else request.user.pk
+        patient = User.objects.select_related('patient_profile').filter(pk=pk).first() if pk else None
+        if patient is None:
             return Response({'error': 'Patient not found'}, status=404)
 
         profile = getattr(patient, 'patient_profile', None)
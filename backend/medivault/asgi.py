@@ -3,6 +3,13 @@ ASGI config for medivault project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is what start.sh serves by default (SERVER_MODE=asgi, gunicorn with
+uvicorn workers). The OTP, notification and document download views are
+async here, so a worker keeps taking requests while they wait on the SMS
+and email providers or stream a file, and long-lived responses such as the
+notification stream (/api/notifications/stream/) need this entry point;
+under WSGI they fall back to one snapshot per reconnect.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -0,0 +1,70 @@
+"""
+DRF views with async handlers.
+
+APIView.dispatch is synchronous, so an `async def post()` on it returns an
+un-awaited coroutine. AsyncAPIView.dispatch runs the same steps, awaiting
+the handler: authentication, permissions and throttling first (in a
+thread, as they can touch the database), then the handler, then DRF's
+exception handling and content negotiation. Under ASGI such a view holds no
+thread while it waits on SMS, email or file I/O.
+
+Handlers can't use the ORM directly; put a handler's database work in one
+sync method and await it through sync_to_async, since every call is a
+thread hop:
+
+    class UnreadCountView(AsyncAPIView):
+        async def get(self, request):
+            return Response({'unread_count': await sync_to_async(get_unread)(request.user)})
+
+Generic views combine with it as `class V(AsyncAPIView, generics.ListAPIView)`,
+with `async def get` calling the generic `list` through sync_to_async.
+
+Blocking calls that don't touch the database (an SMS or SMTP send, a file
+read) go through blocking_io instead, which runs them on a pool of
+ASYNC_IO_THREADS threads rather than the one each request's ORM work is
+pinned to:
+
+    sent = await blocking_io(send_sms_otp)(phone, otp)
+"""
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.views import APIView
+
+_io_pool = None
+_io_pool_pid = None
+
+
+def blocking_io(func):
+    """func as a coroutine function, run on the blocking-I/O thread pool."""
+    global _io_pool, _io_pool_pid
+    if _io_pool_pid != os.getpid():  # first use in this (possibly forked) process
+        _io_pool_pid = os.getpid()
+        _io_pool = ThreadPoolExecutor(settings.ASYNC_IO_THREADS, thread_name_prefix='blocking-io')
+    return sync_to_async(func, thread_sensitive=False, executor=_io_pool)
+
+
+class AsyncAPIView(APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):  # OPTIONS and 405s stay sync
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
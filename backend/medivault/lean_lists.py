@@ -0,0 +1,111 @@
+"""
+List endpoints without the serializer.
+
+A ModelSerializer spends most of a list request's CPU building a model
+instance per row and walking its fields. LeanListMixin.list() reads the
+rows as .values_list() tuples instead and hands them to the serializer
+class's lean_rows(), which builds each row's dict with mappers worked out
+once per request:
+
+    class DocumentSerializer(serializers.ModelSerializer):
+        lean_columns = ('id', 'title', 'created_at')
+
+        @classmethod
+        def lean_rows(cls, rows, context):
+            to_datetime = datetime_mapper()
+            return [
+                {'id': str(pk), 'title': title, 'created_at': to_datetime(created_at)}
+                for pk, title, created_at in rows
+            ]
+
+lean_rows must give exactly what the serializer's `.data` would, keys in
+the same order, so the response bytes don't change; each app's tests
+compare the two. Filtering, ordering and pagination are the view's own.
+With ?fields= (medivault.sparse_fields) the columns no requested field
+reads come back as NULL, so lean_rows must take None in any of them, and
+the other keys are dropped from its rows.
+The response is marked for FastJSONRenderer's orjson path unless a field
+named in the serializer's lean_json_fields (free-form JSON) holds floats or
+other values orjson would write differently.
+"""
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+from .sparse_fields import SparseFieldsMixin, null_columns
+
+_INT64 = (-2 ** 63, 2 ** 64 - 1)  # the ints orjson accepts
+
+
+class LeanListMixin(SparseFieldsMixin):
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        fields = self.get_sparse_fields()
+        columns = serializer_class.lean_columns
+        if fields is not None:
+            columns = null_columns(columns, self.get_sparse_columns(fields))
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*columns)
+        page = self.paginate_queryset(queryset)
+        rows = serializer_class.lean_rows(queryset if page is None else page, self.get_serializer_context())
+        json_fields = getattr(serializer_class, 'lean_json_fields', ())
+        if fields is not None:
+            rows = [{name: row[name] for name in fields} for row in rows]
+            json_fields = [field for field in json_fields if field in fields]
+        response = Response(rows) if page is None else self.get_paginated_response(rows)
+        response.plain_data = all(is_plain(row[field]) for field in json_fields for row in rows)
+        return response
+
+
+def is_plain(value):
+    """True for JSON that orjson encodes exactly as DRF does: no floats, 64-bit ints, str keys."""
+    if value is None or isinstance(value, (str, bool)):
+        return True
+    if isinstance(value, int):
+        return _INT64[0] <= value <= _INT64[1]
+    if isinstance(value, (list, tuple)):
+        return all(is_plain(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and is_plain(item) for key, item in value.items())
+    return False
+
+
+def datetime_mapper():
+    """DateTimeField.to_representation, with its settings lookups done once."""
+    field = serializers.DateTimeField()
+    tz = field.default_timezone()
+    if tz is None or (api_settings.DATETIME_FORMAT or '').lower() != ISO_8601:
+        return field.to_representation
+
+    def to_representation(value):
+        if value is None:
+            return None
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
+
+
+def date_mapper():
+    """DateField.to_representation, with its settings lookups done once."""
+    if (api_settings.DATE_FORMAT or '').lower() != ISO_8601:
+        return serializers.DateField().to_representation
+    return lambda value: None if value is None else value.isoformat()
+
+
+def file_url_mapper(request, storage):
+    """
+    request.build_absolute_uri(storage.url(name)) for stored file names, or
+    None for an empty one. On the filesystem storage the absolute base URL
+    is built once and each name is just quoted onto it.
+    """
+    if not isinstance(storage, FileSystemStorage):
+        return lambda name: request.build_absolute_uri(storage.url(name)) if name else None
+    prefix = request.build_absolute_uri(storage.base_url)
+
+    def to_url(name):
+        if not name:
+            return None
+        if name.startswith('/') or '..' in name:  # let urljoin resolve it as storage.url() would
+            return request.build_absolute_uri(storage.url(name))
+        return prefix + filepath_to_uri(name)
+    return to_url
@@ -0,0 +1,40 @@
+"""
+JSON rendering with orjson.
+
+FastJSONRenderer is DRF's JSONRenderer, except that a response flagged with
+`plain_data = True` is encoded by orjson, several times faster. The lean
+list views (medivault.lean_lists) set the flag when their data holds only
+str, int, bool, None, UUID, lists and dicts with str keys. On those types
+orjson's compact output is byte-for-byte what DRF produces; on floats it is
+not (1e-05 comes out as 0.00001), so anything else, and any response with
+an indent requested, goes through DRF's encoder as before. orjson is
+optional: without it every response takes that path.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None
+            or data is None
+            or not getattr(renderer_context.get('response'), 'plain_data', False)
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            # e.g. an int past 64 bits or a lone surrogate; DRF's encoder
+            # handles the first and fails the same way on the second
+            return super().render(data, accepted_media_type, renderer_context)
+        # DRF escapes these two so the output is also valid JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -38,11 +38,18 @@ INSTALLED_APPS = [
     'access_control',
     'audit',
     'notifications',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files in production
+    # Outermost, so the root span covers all the other middleware
+    'monitoring.tracing.TracingMiddleware',
+    # First after security so the query count covers sessions and auth too
+    'monitoring.middleware.QueryBudgetMiddleware',
+    # Inside the query count, so profiled requests are still budgeted and measured
+    'monitoring.profiling.ProfilingMiddleware',
+    'medivault.middleware.AsyncWhiteNoiseMiddleware',  # Serve static files in production
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,18 +82,51 @@ WSGI_APPLICATION = 'medivault.wsgi.application'
 # Database
 # Database – SQLite by default; set DATABASE_URL in .env for PostgreSQL
 _db_url = config('DATABASE_URL', default='')
+# start.sh's server: 'asgi' (its default) or 'wsgi'
+SERVER_MODE = config('SERVER_MODE', default='asgi')
 if _db_url:
     DATABASES = {
-        'default': dj_database_url.config(default=_db_url, conn_max_age=600)
+        # Persistent connections under WSGI only. Under ASGI each request's sync
+        # work gets its own thread and so its own connection, which would be
+        # kept open per thread and pile up against PostgreSQL's connection limit
+        'default': dj_database_url.config(default=_db_url, conn_max_age=0 if SERVER_MODE == 'asgi' else 600)
     }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # A file (not shared-cache memory) so tests with concurrent writers
+            # wait on locks instead of failing with "table is locked"
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    # Take the write lock when a transaction starts: a transaction that reads
+    # and then writes can't wait for the lock, so under concurrent requests it
+    # would fail with "database is locked" instead of queueing
+    DATABASES['default'].setdefault('OPTIONS', {}).update(transaction_mode='IMMEDIATE', timeout=20)
+
+# Cache – Redis when REDIS_URL is set (shared by all workers), else per-process memory
+_redis_url = config('REDIS_URL', default='')
+if _redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _redis_url,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Whether every worker sees the same cache. Code that counts on the cache to
+# tell workers about each other's writes checks the database when it isn't.
+SHARED_CACHE = bool(_redis_url)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -102,9 +142,14 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+STORAGES = {
+    # Local files, with a tracing span per operation (monitoring.tracing)
+    'default': {'BACKEND': 'monitoring.tracing.TracedFileSystemStorage'},
+    # Compressed, hashed files for WhiteNoise to serve with far-future cache headers
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
 
 # Production Security Settings
 if not DEBUG:
@@ -129,11 +174,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token's claims; set AUTH_STATELESS_JWT=False
+        # to load the user row on every request instead.
+        'users.authentication.StatelessJWTAuthentication'
+        if config('AUTH_STATELESS_JWT', default=True, cast=bool)
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # DRF's JSON and browsable renderers; the JSON one hands the lean list
+    # endpoints' responses to orjson (medivault.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'medivault.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -141,6 +196,23 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Login/OTP throttles (users.throttling), '<view scope>.<ip|phone|email>'
+    'DEFAULT_THROTTLE_RATES': {
+        'login.ip': '30/min',
+        'login.email': '10/min',
+        'otp.ip': '20/hour',
+        'otp.phone': '5/hour',
+        'email_otp.ip': '20/hour',
+        'email_otp.email': '5/hour',
+        'otp_verify.ip': '60/hour',
+        'otp_verify.phone': '10/hour',
+        'otp_verify.email': '10/hour',
+    },
+    # Number of reverse proxies in front of Django (render.yaml sets 1). The
+    # per-IP throttles key on the address the outermost one saw, the last N-th
+    # entry of X-Forwarded-For; the rest of the header is the client's to
+    # spoof. 0, the default, ignores the header and uses REMOTE_ADDR.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 # JWT Settings
@@ -150,8 +222,15 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.CustomTokenRefreshSerializer',
 }
 
+# Blocked users are rejected by StatelessJWTAuthentication within this many seconds
+AUTH_REVOCATION_TTL_SECONDS = config('AUTH_REVOCATION_TTL_SECONDS', default=15, cast=int)
+# How often each worker tops up its Bloom filter of blacklisted refresh tokens
+# (users.tokens). Expired tokens are removed by `manage.py prune_tokens`.
+TOKEN_BLACKLIST_SYNC_SECONDS = config('TOKEN_BLACKLIST_SYNC_SECONDS', default=30, cast=int)
+
 # CORS
 CORS_ALLOWED_ORIGINS = [
     o.strip() for o in config(
@@ -168,17 +247,99 @@ if not DEBUG:
         r'^https://.*\.vercel\.app$',
     ]
 
+# Patient IDs (users.patient_ids). The key decides how sequence numbers map to
+# IDs — keep it stable; changing it is safe (existing IDs are skipped) but
+# makes new IDs guessable to anyone who knew the old one.
+PATIENT_ID_KEY = config('PATIENT_ID_KEY', default=SECRET_KEY)
+PATIENT_ID_BLOCK_SIZE = config('PATIENT_ID_BLOCK_SIZE', default=50, cast=int)
+# patient_id -> user lookups (users.identity); unknown IDs are cached briefly
+PATIENT_ID_CACHE_SECONDS = 7 * 24 * 3600
+PATIENT_ID_MISS_CACHE_SECONDS = 60
+
+# Per-view query budgets (monitoring.middleware). Going over is always logged;
+# with this on a read-only request fails instead, which turns N+1 regressions
+# into errors (requests that wrote are logged as errors and keep their response).
+QUERY_BUDGET_ENFORCE = config('QUERY_BUDGET_ENFORCE', default=False, cast=bool)
+
+# Prometheus metrics at /metrics (monitoring.metrics), for scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>"; without a token the endpoint is off.
+# Each worker process writes its totals to METRICS_DIR and a scrape sums them;
+# leave it empty for a single process (runserver).
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=1.0, cast=float)
+
+# Request profiling (monitoring.profiling): an admin's request sent with
+# "X-Profile: 1", and this fraction of all requests, runs under cProfile and
+# tracemalloc. The newest PROFILE_MAX_ARTIFACTS results are kept in PROFILE_DIR
+# and served to admins at /api/monitoring/profiles/.
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_DIR = config('PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILE_MAX_ARTIFACTS = config('PROFILE_MAX_ARTIFACTS', default=50, cast=int)
+
+# Request tracing (monitoring.tracing). Every response has an X-Trace-Id; with an
+# exporter set, each request's spans (queries, storage, email, SMS) are written
+# to TRACING_FILE ('jsonl') or sent to an OTLP/HTTP collector ('otlp').
+TRACING_EXPORTER = config('TRACING_EXPORTER', default='')
+TRACING_FILE = config('TRACING_FILE', default=str(BASE_DIR / 'traces.jsonl'))
+TRACING_OTLP_ENDPOINT = config('TRACING_OTLP_ENDPOINT', default='http://localhost:4318/v1/traces')
+TRACING_SERVICE_NAME = config('TRACING_SERVICE_NAME', default='medivault')
+
+# Slow-query log (monitoring.slow_queries): queries taking SLOW_QUERY_MS or more
+# are logged, then appended with their EXPLAIN plan to SLOW_QUERY_FILE, which
+# `manage.py slow_queries` ranks. A fingerprint is re-explained at most every
+# SLOW_QUERY_EXPLAIN_SECONDS. Off (None) unless SLOW_QUERY_MS is set, as
+# render.yaml does, so test runs and local servers don't write the file into
+# the source tree.
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=None, cast=lambda v: None if v in (None, '') else float(v))
+SLOW_QUERY_FILE = config('SLOW_QUERY_FILE', default=str(BASE_DIR / 'slow_queries.jsonl'))
+SLOW_QUERY_EXPLAIN_SECONDS = config('SLOW_QUERY_EXPLAIN_SECONDS', default=600, cast=int)
+
+# Async views (medivault.async_views) hand blocking email, SMS and file reads to
+# a pool of this many threads per worker process. They wait rather than
+# compute, so it's larger than asyncio's default of CPU count + 4.
+ASYNC_IO_THREADS = config('ASYNC_IO_THREADS', default=32, cast=int)
+
 # OTP Settings (in-memory for demo; use Redis/DB in prod)
 OTP_EXPIRY_MINUTES = 10
 
+# Notification stream (SSE). Streams re-check the DB this often so writes from
+# other workers are picked up, and close after MAX_SECONDS so clients reconnect.
+NOTIFICATION_STREAM_POLL_SECONDS = config('NOTIFICATION_STREAM_POLL_SECONDS', default=10, cast=float)
+NOTIFICATION_STREAM_MAX_SECONDS = config('NOTIFICATION_STREAM_MAX_SECONDS', default=300, cast=int)
+
+# Notification retention, in days, enforced by `manage.py prune_notifications`.
+# 'read': delete read notifications older than this; 'max': delete any
+# notification (read, unread or broadcast) older than this. Types not listed
+# are kept forever.
+NOTIFICATION_RETENTION = {
+    'SYSTEM': {'read': 30, 'max': 90},
+    'DOCUMENT_SHARED': {'read': 90, 'max': 365},
+    'ACCESS_REQUEST': {'read': 90, 'max': 365},
+    'ACCESS_APPROVED': {'read': 90, 'max': 180},
+    'ACCESS_REJECTED': {'read': 90, 'max': 180},
+    'ACCESS_REVOKED': {'read': 90, 'max': 180},
+    'ACCESS_EXPIRED': {'read': 30, 'max': 90},
+    'EMERGENCY_ACCESS': {'read': 365, 'max': 365},
+}
+
+# Warnings and errors (including 500 tracebacks) go to stderr, which the host collects
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+}
+
 # ── Email (Gmail SMTP) ────────────────────────────────────────────────────────
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
+EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='MediVault <noreply@medivault.app>')
 
 # ── SMS (Fast2SMS) ─────────────────────────────────────────────────────────────
 FAST2SMS_API_KEY = config('FAST2SMS_API_KEY', default='')
+FAST2SMS_URL = config('FAST2SMS_URL', default='https://www.fast2sms.com/dev/bulkV2')
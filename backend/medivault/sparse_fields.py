@@ -0,0 +1,65 @@
+"""
+Sparse fieldsets for list endpoints: ?fields=id,title,document_date.
+
+SparseFieldsMixin goes on a ListAPIView. With ?fields= it drops every other
+field from the serializer, so their SerializerMethodFields never run, and
+narrows the query to the columns the remaining fields read. Each serializer
+lists the columns a field reads in `field_sources`; a field not listed
+there reads the model field of the same name:
+
+    class DocumentSerializer(serializers.ModelSerializer):
+        field_sources = {'uploaded_by_name': ('uploaded_by__full_name',)}
+
+Fields keep the serializer's order. Unknown names are ignored, and a
+?fields= naming no known field serves every field.
+"""
+from django.db.models import Field, Value
+
+
+class SparseFieldsMixin:
+    def get_sparse_fields(self):
+        """The requested field names in serializer order, or None for all of them."""
+        param = self.request.query_params.get('fields')
+        if not param:
+            return None
+        wanted = {name.strip() for name in param.split(',')}
+        fields = [name for name in self.get_serializer_class().Meta.fields if name in wanted]
+        return fields or None
+
+    def get_sparse_columns(self, fields):
+        sources = getattr(self.get_serializer_class(), 'field_sources', {})
+        return {column for name in fields for column in sources.get(name, (name,))}
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        return only_columns(queryset, self.get_sparse_columns(fields))
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            child = getattr(serializer, 'child', serializer)
+            for name in set(child.fields) - set(fields):
+                child.fields.pop(name)
+        return serializer
+
+
+def only_columns(queryset, columns):
+    """
+    queryset.only(*columns), joining just the relations the columns reach
+    through. Annotations are left to the queryset.
+    """
+    columns = {column for column in columns if column not in queryset.query.annotations}
+    related = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns, *related)
+
+
+def null_columns(lookups, keep):
+    """The lookups for .values_list(), with a NULL in place of each one not in keep."""
+    return [lookup if lookup in keep else Value(None, output_field=Field()) for lookup in lookups]
@@ -6,6 +6,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import HttpResponse
+from monitoring.views import metrics
 
 
 def api_root(request):
@@ -85,6 +86,7 @@ def api_root(request):
                 <h2>Notifications</h2>
                 <a class="endpoint" href="/api/notifications/"><span class="method get">GET</span><span class="url">/api/notifications/</span><span class="desc">All notifications for current user</span></a>
                 <a class="endpoint" href="/api/notifications/unread/"><span class="method get">GET</span><span class="url">/api/notifications/unread/</span><span class="desc">Unread notification count</span></a>
+                <a class="endpoint" href="/api/notifications/stream/"><span class="method get">GET</span><span class="url">/api/notifications/stream/</span><span class="desc">Live notification stream (SSE)</span></a>
             </div>
 
             <div class="section">
@@ -109,5 +111,7 @@ urlpatterns = [
     path('api/access/', include('access_control.urls')),
     path('api/audit/', include('audit.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
+    path('metrics', metrics, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def install_query_wrappers(sender, connection, **kwargs):
+    """Slow-query logging, per-request query counts and query spans on every connection."""
+    from .middleware import count_queries
+    from .slow_queries import slow_query_log
+    from .tracing import trace_query
+
+    # In front: a connection opened inside `with connection.execute_wrapper(...)`
+    # must leave that wrapper last, for the block to pop on exit
+    for wrapper in (trace_query, count_queries, slow_query_log):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, wrapper)
+
+
+class MonitoringConfig(AppConfig):
+    name = 'monitoring'
+
+    def ready(self):
+        connection_created.connect(install_query_wrappers, dispatch_uid='monitoring.query_wrappers')
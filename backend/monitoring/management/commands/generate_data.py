@@ -0,0 +1,58 @@
+import json
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from monitoring.synthetic import DEFAULTS, SyntheticDataGenerator
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with deterministic synthetic users, documents, access requests, '
+        'emergency accesses, notifications and audit logs for benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--admins', type=int, default=5)
+        parser.add_argument('--audit-logs', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Same seed, counts and config give the same rows.')
+        parser.add_argument('--until', type=date.fromisoformat, default=None,
+                            help='Last day of the generated history, YYYY-MM-DD (default: today).')
+        parser.add_argument('--config', help=(
+            'JSON file overriding the distributions in monitoring.synthetic.DEFAULTS, '
+            'e.g. {"documents_per_patient": 10, "access_statuses": {"APPROVED": 1}}.'
+        ))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='synthetic-password',
+                            help='Password for every generated user.')
+
+    def handle(self, *args, **options):
+        config = {}
+        if options['config']:
+            with open(options['config']) as f:
+                config = json.load(f)
+            unknown = set(config) - set(DEFAULTS)
+            if unknown:
+                raise CommandError(f'Unknown config keys: {", ".join(sorted(unknown))}')
+        seed = options['seed']
+        self.verbosity = options['verbosity']
+        if User.objects.filter(email__endswith=f'.s{seed}@synthetic.medivault.test').exists():
+            raise CommandError(f'Seed {seed} has already been generated in this database; pick another --seed.')
+
+        generator = SyntheticDataGenerator(
+            seed=seed, config=config, until=options['until'], batch_size=options['batch_size'],
+            password=options['password'], progress=self.progress,
+        )
+        counts = generator.run(options['patients'], options['doctors'], options['admins'], options['audit_logs'])
+        for label, (rows, seconds) in counts.items():
+            if not self.verbosity:
+                break
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{label:>20}: {rows:>10} rows in {seconds:7.1f}s ({rate:,.0f}/s)')
+        self.stdout.write(self.style.SUCCESS(f'Generated synthetic data for seed {seed}.'))
+
+    def progress(self, label, done, total):
+        if self.verbosity > 1:
+            self.stdout.write(f'{label}: {done}/{total}')
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from monitoring.slow_queries import rank, read_entries
+
+
+def _top(counts):
+    value, count = max(counts.items(), key=lambda item: item[1])
+    return f'{value} ({count})' if len(counts) > 1 else str(value)
+
+
+class Command(BaseCommand):
+    help = 'Rank the query fingerprints in the slow-query log by total time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='Default: SLOW_QUERY_FILE.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--since', default=None,
+                            help='Only entries from this ISO time on, e.g. 2026-10-01T00:00.')
+        parser.add_argument('--plans', action='store_true', help='Show the latest EXPLAIN of each.')
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.SLOW_QUERY_FILE
+        try:
+            groups = rank(read_entries(path), since=options['since'])
+        except FileNotFoundError:
+            raise CommandError(f'No slow-query log at {path}.')
+        if not groups:
+            self.stdout.write('No slow queries logged.')
+            return
+
+        self.stdout.write(f'{"total ms":>12} {"count":>7} {"mean ms":>9} {"max ms":>9}  fingerprint')
+        for group in groups[:options['limit']]:
+            mean = group['total_ms'] / group['count']
+            self.stdout.write(
+                f'{group["total_ms"]:12.1f} {group["count"]:7d} {mean:9.1f} {group["max_ms"]:9.1f}  '
+                f'{group["fingerprint_id"]} {group["fingerprint"][:160]}'
+            )
+            self.stdout.write(f'{"":41}view: {_top(group["views"])}, at: {_top(group["locations"])}')
+            if options['plans'] and group['plan']:
+                for line in group['plan']:
+                    self.stdout.write(f'{"":43}{line}')
+        total = sum(group['count'] for group in groups)
+        self.stdout.write(self.style.SUCCESS(f'{total} slow queries in {len(groups)} fingerprints.'))
@@ -0,0 +1,227 @@
+"""
+Prometheus metrics, aggregated across worker processes.
+
+Each process keeps its counters and histograms in memory; a background
+thread writes them to METRICS_DIR/<pid>-<nonce>.json whenever they changed,
+at most every METRICS_FLUSH_SECONDS. A scrape of /metrics sums every file in
+the directory (using live values for its own process) and renders the
+Prometheus text format, so all gunicorn workers show up as one app. Files
+of exited workers are kept: their counts still belong in the totals. With
+METRICS_DIR unset nothing is written and a scrape only sees its own process,
+which is enough for runserver and tests.
+
+Recording is one dict update under a lock:
+
+    collector.observe('medivault_outbound_duration_seconds', {'service': 'sms', 'outcome': 'ok'}, 0.21)
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from .tracing import span
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERIES = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# name: (type, help, buckets)
+METRICS = {
+    'medivault_http_requests_total': (
+        'counter', 'HTTP requests by view, method and status code.', None),
+    'medivault_http_request_duration_seconds': (
+        'histogram', 'Time to build the response, by view and method.', SECONDS),
+    'medivault_http_request_size_bytes': (
+        'histogram', 'Request body size, by view and method.', BYTES),
+    'medivault_http_response_size_bytes': (
+        'histogram', 'Response body size, by view and method.', BYTES),
+    'medivault_db_queries_per_request': (
+        'histogram', 'Database queries run per request, by view.', QUERIES),
+    'medivault_db_duration_seconds': (
+        'histogram', 'Time spent in database queries per request, by view.', SECONDS),
+    'medivault_outbound_duration_seconds': (
+        'histogram', 'Email and SMS provider calls, by service and outcome.', SECONDS),
+}
+
+
+class Collector:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}  # (name, labels) -> float, or [bucket counts..., sum, count] for histograms
+        self.pid = None
+        self.path = None
+        self.dirty = False
+        self.flusher = None
+
+    def _owned(self):
+        """Start afresh after a fork: the parent's counts are the parent's."""
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.values = {}
+            self.path = None
+            self.flusher = None
+            if settings.METRICS_DIR:
+                self.path = os.path.join(settings.METRICS_DIR, f'{self.pid}-{uuid.uuid4().hex[:8]}.json')
+                self.flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+                self.flusher.start()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self._owned()
+            self.values[key] = self.values.get(key, 0) + amount
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self._owned()
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+            self.dirty = True
+
+    @contextmanager
+    def timed(self, name, labels):
+        """Observe the block's duration, with outcome 'error' if it raises."""
+        labels.setdefault('outcome', 'ok')
+        start = time.perf_counter()
+        try:
+            yield labels
+        except BaseException:
+            labels['outcome'] = 'error'
+            raise
+        finally:
+            self.observe(name, labels, time.perf_counter() - start)
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+            self.dirty = False
+
+    # ---- Sharing between processes ----
+
+    def _snapshot(self):
+        return [[name, list(labels), value] for (name, labels), value in self.values.items()]
+
+    def flush(self):
+        with self.lock:
+            if not (self.path and self.dirty):
+                return
+            data = json.dumps(self._snapshot())
+            self.dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.path)  # readers never see a half-written file
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_SECONDS)
+            if self.pid != os.getpid():
+                return
+            self.flush()
+
+    def collect(self):
+        """Every process's values summed: {(name, labels): value}."""
+        with self.lock:
+            self._owned()
+            snapshots = [self._snapshot()]
+            own = self.path
+        directory = settings.METRICS_DIR
+        if directory and os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                path = os.path.join(directory, filename)
+                if not filename.endswith('.json') or path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # removed or replaced while listing
+        totals = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot:
+                if name not in METRICS:
+                    continue  # from an older release
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    if len(current) == len(value):
+                        totals[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        """Prometheus text exposition format, version 0.0.4."""
+        by_name = {}
+        for (name, labels), value in sorted(self.collect().items()):
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for labels, value in by_name.get(name, []):
+                if kind == 'counter':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {value[-1]}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+collector = Collector()
+
+
+def record_request(request, response, view, queries, db_seconds, seconds):
+    """Called by QueryBudgetMiddleware once per request."""
+    labels = {'view': view, 'method': request.method}
+    collector.inc('medivault_http_requests_total', {**labels, 'status': str(response.status_code)})
+    collector.observe('medivault_http_request_duration_seconds', labels, seconds)
+    collector.observe('medivault_http_request_size_bytes', labels, int(request.META.get('CONTENT_LENGTH') or 0))
+    size = response.get('Content-Length')
+    if size is None and not response.streaming:
+        size = len(response.content)
+    if size is not None:
+        collector.observe('medivault_http_response_size_bytes', labels, int(size))
+    collector.observe('medivault_db_queries_per_request', {'view': view}, queries)
+    collector.observe('medivault_db_duration_seconds', {'view': view}, db_seconds)
+
+
+@contextmanager
+def outbound(service):
+    """Time and trace a call to an email or SMS provider; set ['outcome'] = 'error' for failures that don't raise."""
+    with span(f'outbound.{service}', kind='client') as current:
+        with collector.timed('medivault_outbound_duration_seconds', {'service': service}) as call:
+            yield call
+        if current is not None and call['outcome'] == 'error':
+            current.error = 'error'
@@ -0,0 +1,145 @@
+"""
+Per-request database accounting.
+
+QueryBudgetMiddleware counts every query a request runs and the time spent
+in them, and reports both in a Server-Timing header, e.g.
+
+    Server-Timing: db;dur=4.1;desc="6 queries", app;dur=12.9
+
+(visible in the browser's network panel). Views declare the most queries
+they should need as a class attribute:
+
+    class DocumentListView(generics.ListAPIView):
+        query_budget = 4
+
+A request that goes over is logged on the 'monitoring.queries' logger and
+flagged with an X-Query-Budget-Exceeded header. With QUERY_BUDGET_ENFORCE
+on, a request that only read fails with QueryBudgetExceeded instead, so an
+N+1 regression breaks the test that exercises it. One that wrote is logged
+as an error but keeps its response: by then its writes are committed, and a
+500 would tell the client they weren't.
+
+Queries are counted by count_queries, an execute_wrapper on every connection
+(see MonitoringConfig), against the request in the current context. That
+follows an async view's work into sync_to_async threads, which use their
+own connections.
+
+The same numbers, with latency and request/response sizes, are recorded per
+view for the /metrics endpoint (monitoring.metrics).
+"""
+import contextvars
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import metrics
+from .slow_queries import current_view
+
+logger = logging.getLogger('monitoring.queries')
+
+_current_stats = contextvars.ContextVar('monitoring_query_stats', default=None)
+# Statements that can't have written anything; anything else counts as a write
+_READ_ONLY = ('SELECT', 'SAVEPOI', 'RELEASE', 'ROLLBAC')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """Queries counted for one request, and their total duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.wrote = False
+        self.start = time.perf_counter()
+
+
+def count_queries(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    if not stats.wrote and not sql.lstrip()[:7].upper().startswith(_READ_ONLY):
+        stats.wrote = True
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.duration += time.perf_counter() - start
+        stats.count += 1
+
+
+class QueryBudgetMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django runs a sync process_view in a thread under ASGI; this
+            # one only sets attributes, so skip the hop
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, tokens = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _reset(tokens)
+        return self.end(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, tokens = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _reset(tokens)
+        return self.end(request, response, stats)
+
+    def begin(self, request):
+        request.query_budget = None
+        request.view_name = 'unmatched'  # 404s aren't labelled by path, which has no bound
+        stats = QueryStats()
+        return stats, ((_current_stats, _current_stats.set(stats)), (current_view, current_view.set(None)))
+
+    def end(self, request, response, stats):
+        elapsed = time.perf_counter() - stats.start
+        metrics.record_request(request, response, request.view_name, stats.count, stats.duration, elapsed)
+
+        response['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", app;dur={elapsed * 1000:.1f}'
+        )
+        budget = request.query_budget
+        if budget is not None and stats.count > budget:
+            message = (
+                f'{request.method} {request.path} ({request.view_name}) ran {stats.count} queries, '
+                f'over its budget of {budget}'
+            )
+            response['X-Query-Budget-Exceeded'] = f'{stats.count}/{budget}'
+            if not settings.QUERY_BUDGET_ENFORCE:
+                logger.warning(message)
+            elif stats.wrote:
+                logger.error('%s; not failing it, its writes are committed', message)
+            else:
+                logger.warning(message)
+                raise QueryBudgetExceeded(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Class-based views are found through as_view()'s view_class
+        view = getattr(view_func, 'view_class', view_func)
+        request.query_budget = getattr(view, 'query_budget', None)
+        request.view_name = view.__name__
+        current_view.set(view.__name__)  # for the slow-query log
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        QueryBudgetMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+
+def _reset(tokens):
+    for var, token in tokens:
+        var.reset(token)
@@ -0,0 +1,241 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware runs a request under cProfile and tracemalloc when an
+admin sends "X-Profile: 1", or at random for PROFILE_SAMPLE_RATE of all
+requests. Each run is saved to PROFILE_DIR as a pstats dump, <id>.prof, plus
+<id>.json with the request, the slowest functions by cumulative time and
+the largest allocation sites; the response carries its id in X-Profile-Id.
+Only the newest PROFILE_MAX_ARTIFACTS runs are kept. Admins list and
+download them under /api/monitoring/profiles/; a .prof opens with
+`python -m pstats` or snakeviz.
+
+Switched off, the cost per request is a header lookup and a settings read.
+The header is only honoured after its bearer token authenticates as an admin,
+so nobody else can make the server do the extra work.
+
+tracemalloc traces every thread, so with concurrent profiled requests in one
+process each report's memory figures include the others' allocations.
+Under ASGI the profile covers the event loop's thread: an async view's own
+work, but not what it hands to sync_to_async threads, plus whatever other
+requests run on the loop meanwhile. Only one request per process is
+profiled at a time there.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+ARTIFACT_ID = re.compile(r'^\d{8}T\d{9}-[0-9a-f]{8}$')  # UTC time to the millisecond, so ids sort by age
+
+_tracing_lock = threading.Lock()
+_loop_profiler = threading.Lock()
+_tracing_users = 0
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    """Snapshot and peak, then stop tracing if no other request still needs it."""
+    global _tracing_users
+    with _tracing_lock:
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracing_users -= 1
+        if not _tracing_users:
+            tracemalloc.stop()
+    return snapshot, peak
+
+
+def is_admin(request):
+    """Authenticate the request's credentials outside DRF; any failure just means no."""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException:
+            return False
+        if result is not None:
+            return getattr(result[0], 'role', None) == 'ADMIN'
+    return False
+
+
+class ProfilingMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if 'x-profile' in request.headers:
+            trigger = 'header' if is_admin(request) else None
+        else:
+            trigger = _sampled()
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        _start_tracing()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            duration = time.perf_counter() - start
+            snapshot, peak = _stop_tracing()
+        return self.finish(request, response, trigger, duration, profiler, snapshot, peak)
+
+    async def __acall__(self, request):
+        if 'x-profile' in request.headers:
+            trigger = 'header' if await sync_to_async(is_admin)(request) else None
+        else:
+            trigger = _sampled()
+        # cProfile follows one thread, and a second profiler on it would replace the first
+        if trigger is None or not _loop_profiler.acquire(blocking=False):
+            return await self.get_response(request)
+
+        try:
+            profiler = cProfile.Profile()
+            _start_tracing()
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+            finally:
+                duration = time.perf_counter() - start
+                snapshot, peak = _stop_tracing()
+        finally:
+            _loop_profiler.release()
+        return await sync_to_async(self.finish)(request, response, trigger, duration, profiler, snapshot, peak)
+
+    def finish(self, request, response, trigger, duration, profiler, snapshot, peak):
+        response['X-Profile-Id'] = save(request, response, trigger, duration, profiler, snapshot, peak)
+        return response
+
+
+def _sampled():
+    rate = settings.PROFILE_SAMPLE_RATE
+    return 'sample' if rate and random.random() < rate else None
+
+
+# ---- Artifacts ----
+
+def save(request, response, trigger, duration, profiler, snapshot, peak):
+    now = time.time()
+    artifact_id = f'{time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))}{int(now % 1 * 1000):03d}-{uuid.uuid4().hex[:8]}'
+    profiler.create_stats()
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    # Our own frames (tracemalloc, this module) are noise in the allocation list
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    meta = {
+        'id': artifact_id,
+        'created_at': timezone.now().isoformat(),
+        'trigger': trigger,
+        'method': request.method,
+        'path': request.path,
+        'view': getattr(request, 'view_name', None),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'functions': [
+            {
+                'function': pstats.func_std_string(func),
+                'calls': calls,
+                'total_ms': round(total * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3),
+            }
+            for func, (_, calls, total, cumulative, _) in functions[:TOP_FUNCTIONS]
+        ],
+        'memory': {
+            'peak_bytes': peak,
+            'allocations': [
+                {'where': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            ],
+        },
+    }
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    stats.dump_stats(os.path.join(directory, f'{artifact_id}.prof'))
+    # The .json goes last: an artifact is listed once it exists
+    _write_atomically(os.path.join(directory, f'{artifact_id}.json'), json.dumps(meta))
+    _trim(directory)
+    return artifact_id
+
+
+def _write_atomically(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _trim(directory):
+    """Drop the oldest artifacts past PROFILE_MAX_ARTIFACTS; ids sort by time."""
+    stale = artifact_ids(directory)[settings.PROFILE_MAX_ARTIFACTS:]
+    for artifact_id in stale:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, artifact_id + extension))
+            except FileNotFoundError:
+                pass  # another worker trimmed it first
+
+
+def artifact_ids(directory=None):
+    """Saved artifact ids, newest first."""
+    directory = directory or settings.PROFILE_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-5] for name in names if name.endswith('.json') and ARTIFACT_ID.match(name[:-5])]
+    return sorted(ids, reverse=True)
+
+
+def load(artifact_id):
+    """An artifact's metadata, or None if it is unknown or already trimmed."""
+    if not ARTIFACT_ID.match(artifact_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILE_DIR, f'{artifact_id}.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def profile_path(artifact_id):
+    return os.path.join(settings.PROFILE_DIR, f'{artifact_id}.prof')
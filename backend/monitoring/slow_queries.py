@@ -0,0 +1,204 @@
+"""
+Slow-query log.
+
+Every database connection gets an execute_wrapper (installed when the
+connection opens, so management commands and background jobs are covered as
+well as requests) that times each query. One that takes SLOW_QUERY_MS or
+longer is logged on the 'monitoring.slow_queries' logger (SLOW_QUERY_MS = None
+turns the log off) with:
+
+- its fingerprint: the SQL with literals and placeholders replaced by "?" and
+  IN/VALUES lists collapsed, so one ORM query is one fingerprint however
+  many ids it was given
+- the view that ran it (from QueryBudgetMiddleware), or None outside requests
+- the innermost line of our own code that led to it
+
+A background thread then runs EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on its
+own connection and appends the whole record, plan included, as a line of
+SLOW_QUERY_FILE. Each fingerprint is explained at most once per
+SLOW_QUERY_EXPLAIN_SECONDS; its later records reuse that plan.
+`manage.py slow_queries` ranks the fingerprints in the file by total time.
+
+Query parameters are never written anywhere. PostgreSQL plans do show the
+values in filter conditions, though, so the file should get the same care
+as the database.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUED = 1000
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+# Request plumbing that wraps every query; never the interesting caller
+_HERE = os.path.dirname(os.path.abspath(__file__))
+INFRASTRUCTURE = {
+    os.path.join(_HERE, name) for name in ('middleware.py', 'profiling.py', 'slow_queries.py', 'tracing.py')
+}
+
+# The view running on this thread or task; QueryBudgetMiddleware sets it
+current_view = contextvars.ContextVar('monitoring_slow_queries_view', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+
+
+def fingerprint(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _LIST.sub('(?+)', sql)
+    sql = _ROWS.sub('(?+)', sql)
+    return ' '.join(sql.split())
+
+
+def caller():
+    """'path/to/module.py:42 in function' for the innermost frame of our own code."""
+    base = str(settings.BASE_DIR) + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if filename.startswith(base) and filename not in INFRASTRUCTURE and 'site-packages' not in filename:
+            return f'{filename[len(base):]}:{frame.lineno} in {frame.name}'
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.queue = queue.Queue(MAX_QUEUED)
+        self.pid = None
+        self.plans = {}  # fingerprint id -> (explained at, plan)
+        self.explaining = threading.local()
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if settings.SLOW_QUERY_MS is None:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS and not getattr(self.explaining, 'active', False):
+                self.record(sql, params, many, context['connection'], elapsed)
+
+    def record(self, sql, params, many, connection, elapsed):
+        normalized = fingerprint(sql)
+        entry = {
+            'time': timezone.now().isoformat(),
+            'fingerprint_id': hashlib.sha1(normalized.encode()).hexdigest()[:12],
+            'fingerprint': normalized,
+            'duration_ms': round(elapsed * 1000, 3),
+            'alias': connection.alias,
+            'vendor': connection.vendor,
+            'view': current_view.get(),
+            'location': caller(),
+            'many': many,
+        }
+        logger.warning(
+            'Slow query (%.1f ms) in %s at %s: %s',
+            entry['duration_ms'], entry['view'], entry['location'], normalized[:300],
+        )
+        if self.pid != os.getpid():  # first slow query in this (possibly forked) process
+            self.pid = os.getpid()
+            threading.Thread(target=self._work, daemon=True).start()
+        # executemany has a list of parameter sets; one is enough to explain with
+        explain_params = params[0] if many and params else params
+        try:
+            self.queue.put_nowait((entry, sql, explain_params, settings.SLOW_QUERY_FILE))
+        except queue.Full:
+            self.dropped += 1
+
+    def _work(self):
+        pid = self.pid
+        while self.pid == pid:
+            entry, sql, params, path = self.queue.get()
+            try:
+                entry['plan'] = self.plan(entry, sql, params)
+                self.write(path, entry)
+            except Exception:
+                logger.exception('Could not record slow query %s', entry['fingerprint_id'])
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Wait until everything queued so far is explained and written."""
+        self.queue.join()
+
+    def plan(self, entry, sql, params):
+        key = entry['fingerprint_id']
+        cached = self.plans.get(key)
+        if cached and time.monotonic() - cached[0] < settings.SLOW_QUERY_EXPLAIN_SECONDS:
+            return cached[1]
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return None
+        connection = connections[entry['alias']]  # this thread's own connection
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        self.explaining.active = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+        except Exception as exc:
+            plan = [f'EXPLAIN failed: {exc}']
+        finally:
+            self.explaining.active = False
+            connection.close()
+        self.plans[key] = (time.monotonic(), plan)
+        return plan
+
+    def write(self, path, entry):
+        line = json.dumps(entry) + '\n'
+        with self.lock, open(path, 'a') as f:
+            f.write(line)
+
+
+slow_query_log = SlowQueryLog()
+
+
+def rank(entries, since=None):
+    """Per-fingerprint totals, the most total time first."""
+    groups = {}
+    for entry in entries:
+        if since and entry['time'] < since:
+            continue
+        group = groups.setdefault(entry['fingerprint_id'], {
+            'fingerprint_id': entry['fingerprint_id'],
+            'fingerprint': entry['fingerprint'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'views': {},
+            'locations': {},
+            'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        for field in ('view', 'location'):
+            counts = group[field + 's']
+            counts[entry[field]] = counts.get(entry[field], 0) + 1
+        group['plan'] = entry.get('plan') or group['plan']  # the latest
+    return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+
+
+def read_entries(path):
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
@@ -0,0 +1,476 @@
+"""
+Synthetic data for benchmarks and index tuning (manage.py generate_data).
+
+Every value — primary keys included — is drawn from one random.Random(seed),
+so the same seed, counts, config and --until date give the same rows on a
+fresh database. Rows are built lazily and written one transaction per
+batch. Users, profiles and documents go through bulk_create, with
+auto_now/auto_now_add switched off so timestamps spread over `history_days`
+instead of all being "now". The high-volume notification and audit tables
+are built as dicts and written with one executemany per batch, which skips
+model instantiation and per-row SQL compilation (about 4x faster). Event
+tables get timestamps that increase with insertion order, like real
+append-only data.
+
+Distributions live in DEFAULTS; a JSON file passed with --config replaces
+any of the keys.
+"""
+import bisect
+import hashlib
+import itertools
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from access_control.models import AccessRequest, EmergencyAccess
+from audit.models import AuditLog
+from documents.models import Document
+from notifications.models import BroadcastCounter, Notification
+from users.models import DoctorProfile, PatientProfile, User
+from users.patient_ids import allocator
+
+DEFAULTS = {
+    'history_days': 365,
+    # Means; totals are the mean times the number of owners, owners drawn at random
+    'documents_per_patient': 4.0,
+    'access_requests_per_doctor': 20.0,
+    'emergencies_per_doctor': 0.5,
+    'notifications_per_user': 8.0,
+    'admin_broadcasts': 50,
+    'document_files': 200,  # distinct small PDFs on storage, shared by all documents
+    'document_file_kb': [2, 200],
+    'critical_document_rate': 0.15,
+    'doctor_upload_rate': 0.2,
+    'notification_read_rate': 0.7,
+    'inactive_user_rate': 0.01,
+    'unapproved_doctor_rate': 0.05,
+    'emergency_reviewed_rate': 0.6,
+    'emergency_flagged_rate': 0.05,
+    'document_types': {'REPORT': 40, 'PRESCRIPTION': 30, 'SCAN': 12, 'DISCHARGE': 6, 'VACCINATION': 7, 'OTHER': 5},
+    'event_types': {'CHECKUP': 35, 'HOSPITAL_VISIT': 25, 'DIAGNOSIS': 20, 'PROCEDURE': 8, 'EMERGENCY': 4, 'OTHER': 8},
+    'access_statuses': {'PENDING': 15, 'APPROVED': 40, 'REJECTED': 15, 'REVOKED': 10, 'EXPIRED': 20},
+    'notification_templates': {
+        'access.requested': 35, 'access.approved': 25, 'access.rejected': 10,
+        'access.revoked': 5, 'emergency.patient': 5, 'system': 20,
+    },
+    'audit_actions': {
+        'LOGIN': 30, 'DOCUMENT_VIEW': 35, 'DOCUMENT_DOWNLOAD': 8, 'DOCUMENT_UPLOAD': 10,
+        'ACCESS_REQUEST': 6, 'ACCESS_APPROVE': 4, 'ACCESS_REJECT': 2, 'ACCESS_REVOKE': 1,
+        'EMERGENCY_ACCESS': 1, 'PROFILE_UPDATE': 3,
+    },
+    'blood_groups': {'O+': 37, 'B+': 32, 'A+': 22, 'AB+': 6, 'O-': 1, 'B-': 1, 'A-': 1, 'UNKNOWN': 0},
+}
+
+FIRST = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Meera',
+         'Ishaan', 'Diya', 'Karan', 'Nisha', 'Aditya', 'Pooja', 'Sanjay', 'Lakshmi', 'Farhan', 'Zoya']
+LAST = ['Sharma', 'Verma', 'Iyer', 'Reddy', 'Patel', 'Khan', 'Nair', 'Gupta', 'Das', 'Singh',
+        'Menon', 'Joshi', 'Mehta', 'Bose', 'Rao', 'Pillai', 'Chopra', 'Kapoor', 'Ahmed', 'Mishra']
+PLACES = [('Mumbai', 'Maharashtra'), ('Pune', 'Maharashtra'), ('Bengaluru', 'Karnataka'),
+          ('Chennai', 'Tamil Nadu'), ('Hyderabad', 'Telangana'), ('Kolkata', 'West Bengal'),
+          ('Delhi', 'Delhi'), ('Jaipur', 'Rajasthan'), ('Kochi', 'Kerala'), ('Ahmedabad', 'Gujarat')]
+HOSPITALS = ['City General Hospital', 'Apollo Clinic', 'Lifeline Multispeciality', 'St. Mary Hospital',
+             'Sunrise Medical Centre', 'Government District Hospital']
+SPECIALIZATIONS = ['General Medicine', 'Cardiology', 'Orthopaedics', 'Paediatrics', 'Dermatology',
+                   'Emergency Medicine', 'Neurology', 'Gynaecology', 'ENT', 'Oncology']
+ALLERGIES = ['Penicillin', 'Sulfa drugs', 'Peanuts', 'Dust', 'Latex', 'Aspirin']
+CONDITIONS = ['Type 2 diabetes', 'Hypertension', 'Asthma', 'Hypothyroidism', 'Migraine']
+TITLES = {
+    'REPORT': ['Complete blood count', 'Lipid profile', 'HbA1c', 'Thyroid panel', 'Liver function test'],
+    'PRESCRIPTION': ['Prescription', 'Follow-up prescription', 'Antibiotic course'],
+    'SCAN': ['Chest X-ray', 'MRI knee', 'CT head', 'Abdominal ultrasound'],
+    'DISCHARGE': ['Discharge summary'],
+    'VACCINATION': ['COVID-19 vaccination', 'Hepatitis B vaccination', 'Tetanus booster'],
+    'OTHER': ['Medical certificate', 'Insurance form'],
+}
+REASONS = ['Follow-up consultation', 'Second opinion', 'Pre-operative review', 'Chronic care review',
+           'Referral from GP']
+DOCUMENT_SAMPLE = 100_000
+GENERATED_MODELS = [User, PatientProfile, DoctorProfile, Document, AccessRequest, EmergencyAccess,
+                    Notification, AuditLog]
+
+
+@contextmanager
+def explicit_timestamps(models=GENERATED_MODELS):
+    """Let generated rows keep the created/updated times they were given."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def small_pdf(text, padding):
+    """A valid one-page PDF showing `text`, padded with `padding` bytes of comments."""
+    content = b'BT /F1 14 Tf 72 770 Td (' + text.encode('latin-1') + b') Tj ET'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    for start in range(0, padding, 72):
+        out += b'% ' + padding_line(start) + b'\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def padding_line(n):
+    return hashlib.sha256(str(n).encode()).hexdigest().encode()[:68]
+
+
+class WeightedChoice:
+    """rng-driven choice from a {value: weight} map, O(log n) per draw."""
+
+    def __init__(self, rng, weights):
+        self.rng = rng
+        self.values = [value for value, weight in weights.items() if weight > 0]
+        self.cumulative = list(itertools.accumulate(weights[value] for value in self.values))
+
+    def __call__(self):
+        return self.values[bisect.bisect(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+
+class SyntheticDataGenerator:
+    def __init__(self, seed=0, config=None, until=None, batch_size=5000, password='synthetic-password',
+                 progress=None):
+        self.seed = seed
+        self.config = {**DEFAULTS, **(config or {})}
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.until = datetime.combine(until or date.today(), dt_time(23, 59), tzinfo=dt_timezone.utc)
+        self.since = self.until - timedelta(days=self.config['history_days'])
+        self.password = password
+        self.progress = progress or (lambda label, done, total: None)
+        self.choose = {
+            key: WeightedChoice(self.rng, self.config[key])
+            for key in ('document_types', 'event_types', 'access_statuses', 'notification_templates',
+                        'audit_actions', 'blood_groups')
+        }
+        self.patients, self.doctors, self.admins = [], [], []  # (pk, full_name, patient_id)
+        self.documents = []  # (pk, patient, title) for the first DOCUMENT_SAMPLE, for audit entries to point at
+        self.counts = {}
+
+    # ---- helpers ----
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def moment(self):
+        return self.since + (self.until - self.since) * self.rng.random()
+
+    def timeline(self, count):
+        """`count` increasing timestamps across the history, lightly jittered."""
+        step = (self.until - self.since) / max(count, 1)
+        for n in range(count):
+            yield self.since + step * (n + self.rng.random())
+
+    def name(self):
+        return f'{self.rng.choice(FIRST)} {self.rng.choice(LAST)}'
+
+    def phone(self):
+        return f'{self.rng.choice("6789")}{self.rng.randrange(10 ** 9):09d}'
+
+    def email(self, role, n):
+        return f'{role.lower()}{n}.s{self.seed}@synthetic.medivault.test'
+
+    def write(self, label, model, rows, total, sql=None):
+        written = 0
+        started = time.perf_counter()
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                if sql:
+                    with connection.cursor() as cursor:
+                        cursor.executemany(sql, batch)
+                else:
+                    model.objects.bulk_create(batch)
+            written += len(batch)
+            self.progress(label, written, total)
+        self.counts[label] = (written, time.perf_counter() - started)
+        return written
+
+    def write_rows(self, label, model, rows, total):
+        """Like write(), for dicts of attname -> value; missing fields get their default."""
+        fields = model._meta.concrete_fields
+        db = connections[DEFAULT_DB_ALIAS]  # the wrapper itself; the `connection` proxy is slow per value
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        prepared = [(field.attname, field.get_db_prep_save, field.get_default()) for field in fields]
+        return self.write(label, model, (
+            [prep(row.get(name, default), db) for name, prep, default in prepared] for row in rows
+        ), total, sql=sql)
+
+    # ---- generation ----
+
+    def run(self, patients, doctors, admins, audit_logs):
+        with explicit_timestamps():
+            self.generate_users('PATIENT', patients, self.patients)
+            self.generate_users('DOCTOR', doctors, self.doctors)
+            self.generate_users('ADMIN', admins, self.admins)
+            if self.patients:
+                self.generate_documents()
+            if self.patients and self.doctors:
+                self.generate_access_requests()
+                self.generate_emergencies()
+            self.generate_notifications()
+            if self.patients or self.doctors:
+                self.write_rows('audit logs', AuditLog, self.audit_log_rows(audit_logs), audit_logs)
+        return self.counts
+
+    def generate_users(self, role, count, registry):
+        # A fixed salt keeps the hash, like everything else, a function of the seed
+        salt = hashlib.sha256(f'synthetic-{self.seed}'.encode()).hexdigest()[:22]
+        password = make_password(self.password, salt=salt)
+        group_id = Group.objects.get_or_create(name=role.title())[0].pk
+        membership = User.groups.through
+        started = time.perf_counter()
+        for offset in range(0, count, self.batch_size):
+            users, profiles = [], []
+            size = min(self.batch_size, count - offset)
+            patient_ids = allocator.next_ids(size) if role == 'PATIENT' else [None] * size
+            for n, patient_id in zip(range(offset, offset + size), patient_ids):
+                joined = self.moment()
+                phone = self.phone()
+                user = User(
+                    id=self.uuid(), email=self.email(role, n), full_name=self.name(), role=role,
+                    phone=phone, phone_normalized=phone, password=password, patient_id=patient_id,
+                    is_active=self.rng.random() >= self.config['inactive_user_rate'],
+                    is_approved=role != 'DOCTOR' or self.rng.random() >= self.config['unapproved_doctor_rate'],
+                    date_joined=joined, updated_at=joined,
+                )
+                users.append(user)
+                registry.append((user.pk, user.full_name, patient_id))
+                if role == 'PATIENT':
+                    profiles.append(self.patient_profile(user, joined))
+                elif role == 'DOCTOR':
+                    profiles.append(self.doctor_profile(user, n, joined))
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                if profiles:
+                    type(profiles[0]).objects.bulk_create(profiles)
+                membership.objects.bulk_create(
+                    [membership(user_id=user.pk, group_id=group_id) for user in users]
+                )
+            self.progress(f'{role.lower()}s', offset + size, count)
+        self.counts[f'{role.lower()}s'] = (count, time.perf_counter() - started)
+
+    def patient_profile(self, user, joined):
+        rng = self.rng
+        city, state = rng.choice(PLACES)
+        return PatientProfile(
+            user=user, city=city, state=state,
+            date_of_birth=date(1940, 1, 1) + timedelta(days=rng.randrange(80 * 365)),
+            gender=rng.choice(['Male', 'Female', 'Female', 'Male', 'Other']),
+            blood_group=self.choose['blood_groups'](),
+            allergies=', '.join(rng.sample(ALLERGIES, rng.choice([0, 0, 0, 1, 2]))),
+            chronic_conditions=', '.join(rng.sample(CONDITIONS, rng.choice([0, 0, 1, 1, 2]))),
+            emergency_contact_name=self.name(), emergency_contact_relation=rng.choice(['Spouse', 'Parent', 'Sibling']),
+            emergency_contact_phone=self.phone(),
+            created_at=joined, updated_at=joined,
+        )
+
+    def doctor_profile(self, user, n, joined):
+        city, state = self.rng.choice(PLACES)
+        return DoctorProfile(
+            user=user, specialization=self.rng.choice(SPECIALIZATIONS), hospital_name=self.rng.choice(HOSPITALS),
+            license_number=f'SYN-{self.seed}-{n:07d}', city=city, state=state,
+            is_verified=self.rng.random() < 0.9, created_at=joined,
+        )
+
+    def document_files(self):
+        """(name, size, sha256) for each shared file, written to storage if missing."""
+        low, high = self.config['document_file_kb']
+        files = []
+        for n in range(self.config['document_files']):
+            name = f'documents/synthetic/{self.seed}/{n:04d}.pdf'
+            content = small_pdf(f'Synthetic medical document {n}', self.rng.randint(low, high) * 1024)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+            files.append((name, len(content), hashlib.sha256(content).hexdigest()))
+        return files
+
+    def generate_documents(self):
+        rng = self.rng
+        files = self.document_files()
+        total = round(len(self.patients) * self.config['documents_per_patient'])
+
+        def rows():
+            for created in self.timeline(total):
+                patient = rng.choice(self.patients)
+                patient_pk = uploader = patient[0]
+                if self.doctors and rng.random() < self.config['doctor_upload_rate']:
+                    uploader = rng.choice(self.doctors)[0]
+                document_type = self.choose['document_types']()
+                name, size, checksum = rng.choice(files)
+                document = Document(
+                    id=self.uuid(), patient_id=patient_pk, uploaded_by_id=uploader,
+                    document_type=document_type, event_type=self.choose['event_types'](),
+                    title=rng.choice(TITLES[document_type]), hospital_name=rng.choice(HOSPITALS),
+                    doctor_name=f'Dr. {self.name()}', tags=rng.choice(['', 'routine', 'follow-up', 'urgent']),
+                    document_date=(created - timedelta(days=rng.randrange(30))).date(),
+                    file=name, file_size=size, checksum=checksum,
+                    is_critical=rng.random() < self.config['critical_document_rate'],
+                    created_at=created, updated_at=created,
+                )
+                if len(self.documents) < DOCUMENT_SAMPLE:
+                    self.documents.append((document.pk, patient, document.title))
+                yield document
+        self.write('documents', Document, rows(), total)
+
+    def generate_access_requests(self):
+        rng = self.rng
+        total = round(len(self.doctors) * self.config['access_requests_per_doctor'])
+        scopes = [['ALL'], ['ALL'], ['REPORT'], ['PRESCRIPTION', 'REPORT'], ['SCAN']]
+
+        def rows():
+            for requested in self.timeline(total):
+                status = self.choose['access_statuses']()
+                responded = expires = None
+                if status != 'PENDING':
+                    responded = requested + timedelta(hours=rng.uniform(0.1, 48))
+                if status == 'APPROVED':
+                    # Still active at the end of the history
+                    expires = max(responded, self.until) + timedelta(hours=rng.randint(1, 720))
+                elif status in ('EXPIRED', 'REVOKED'):
+                    expires = responded + timedelta(hours=rng.randint(1, 720))
+                yield AccessRequest(
+                    id=self.uuid(), doctor_id=rng.choice(self.doctors)[0], patient_id=rng.choice(self.patients)[0],
+                    status=status, scope=rng.choice(scopes), reason=rng.choice(REASONS),
+                    requested_at=requested, responded_at=responded, expires_at=expires,
+                )
+        self.write('access requests', AccessRequest, rows(), total)
+
+    def generate_emergencies(self):
+        rng = self.rng
+        total = round(len(self.doctors) * self.config['emergencies_per_doctor'])
+        reasons = [choice for choice, _ in EmergencyAccess.REASON_CHOICES]
+
+        def rows():
+            for granted in self.timeline(total):
+                reviewed = bool(self.admins) and rng.random() < self.config['emergency_reviewed_rate']
+                yield EmergencyAccess(
+                    id=self.uuid(), doctor_id=rng.choice(self.doctors)[0], patient_id=rng.choice(self.patients)[0],
+                    reason_code=rng.choice(reasons), reason_detail='Patient unable to consent',
+                    patient_admit_id=f'ER-{rng.randrange(10 ** 6):06d}',
+                    granted_at=granted, expires_at=granted + timedelta(hours=1),
+                    is_reviewed_by_admin=reviewed,
+                    is_flagged_misuse=reviewed and rng.random() < self.config['emergency_flagged_rate'],
+                    reviewed_by_id=rng.choice(self.admins)[0] if reviewed else None,
+                )
+        self.write('emergency accesses', EmergencyAccess, rows(), total)
+
+    def generate_notifications(self):
+        rng = self.rng
+        if not self.patients:
+            return
+        total = round((len(self.patients) + len(self.doctors)) * self.config['notifications_per_user'])
+        broadcasts = self.config['admin_broadcasts'] if self.admins else 0
+
+        def rows():
+            for created in self.timeline(total):
+                key = self.choose['notification_templates']()
+                to_doctor = key in ('access.approved', 'access.rejected', 'access.revoked') and self.doctors
+                recipient = rng.choice(self.doctors if to_doctor else self.patients)
+                actor = rng.choice(self.patients if to_doctor else (self.doctors or self.patients))[1]
+                params = {}
+                if key in ('access.requested', 'emergency.patient'):
+                    params = {'reason': rng.choice(REASONS)}
+                elif key == 'access.approved':
+                    params = {'hours': rng.choice([24, 48, 72, 168])}
+                elif key == 'system':
+                    params, actor = {'title': 'Welcome to MediVault', 'message': 'Your records are ready.'}, ''
+                yield {
+                    'id': self.uuid(), 'recipient_id': recipient[0], 'notification_type': TEMPLATE_TYPES[key],
+                    'template_key': key, 'params': params, 'actor_name': actor,
+                    'is_read': rng.random() < self.config['notification_read_rate'], 'created_at': created,
+                }
+            # Admin broadcasts, as sent for emergency accesses
+            for created in self.timeline(broadcasts):
+                doctor = rng.choice(self.doctors or self.patients)
+                patient = rng.choice(self.patients)
+                yield {
+                    'id': self.uuid(), 'audience': 'ADMIN', 'notification_type': 'EMERGENCY_ACCESS',
+                    'template_key': 'emergency.admin', 'params': {'patient': patient[1], 'patient_id': patient[2]},
+                    'actor_name': doctor[1], 'created_at': created,
+                }
+
+        self.write_rows('notifications', Notification, rows(), total + broadcasts)
+        if broadcasts:
+            # Unread counts subtract from this; personal counters are seeded on first read
+            BroadcastCounter.objects.update_or_create(
+                audience='ADMIN', defaults={'total': Notification.objects.filter(audience='ADMIN').count()}
+            )
+
+    def audit_log_rows(self, total):
+        rng = self.rng
+        patients, doctors = self.patients or self.doctors, self.doctors or self.patients
+        for created in self.timeline(total):
+            action = self.choose['audit_actions']()
+            patient = rng.choice(patients)
+            by_doctor = action in ('DOCUMENT_VIEW', 'DOCUMENT_DOWNLOAD', 'ACCESS_REQUEST', 'EMERGENCY_ACCESS')
+            actor = rng.choice(doctors) if by_doctor else patient
+            extra = {}
+            if action in ('ACCESS_APPROVE', 'ACCESS_REJECT', 'ACCESS_REVOKE'):
+                extra = {'doctor': rng.choice(doctors)[1]}
+            elif action == 'EMERGENCY_ACCESS':
+                extra = {'reason_code': 'UNCONSCIOUS', 'reason_detail': 'Patient unable to consent',
+                         'patient_admit_id': f'ER-{rng.randrange(10 ** 6):06d}'}
+            document_id, title = None, ''
+            if action == 'DOCUMENT_UPLOAD' or (action.startswith('DOCUMENT_') and not self.documents):
+                document_id, title = self.uuid(), rng.choice(TITLES['REPORT'])
+            elif action.startswith('DOCUMENT_'):
+                # An existing document, so replaying the log reads real rows
+                document_id, patient, title = rng.choice(self.documents)
+                if not by_doctor:
+                    actor = patient
+            yield {
+                'id': self.uuid(), 'actor_id': actor[0],
+                'target_patient_id': None if action == 'LOGIN' else patient[0],
+                'action': action, 'document_id': document_id, 'document_title': title,
+                'is_emergency': action == 'EMERGENCY_ACCESS',
+                'ip_address': f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+                'extra_data': extra, 'created_at': created,
+            }
+
+
+TEMPLATE_TYPES = {
+    'access.requested': 'ACCESS_REQUEST',
+    'access.approved': 'ACCESS_APPROVED',
+    'access.rejected': 'ACCESS_REJECTED',
+    'access.revoked': 'ACCESS_REVOKED',
+    'emergency.patient': 'EMERGENCY_ACCESS',
+    'emergency.admin': 'EMERGENCY_ACCESS',
+    'system': 'SYSTEM',
+}
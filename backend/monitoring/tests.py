@@ -0,0 +1,441 @@
+import json
+import marshal
+import os
+import tempfile
+import re
+from datetime import date
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from access_control.models import AccessRequest, EmergencyAccess
+from access_control.views import EmergencyAccessReviewView
+from audit.models import AuditLog
+from audit.views import AuditLogListView
+from documents.models import Document
+from notifications.models import BroadcastCounter, Notification
+from users.serializers import CustomTokenObtainPairSerializer
+from users.views import send_sms_otp
+from .metrics import Collector, collector
+from .slow_queries import fingerprint, slow_query_log
+from .middleware import QueryBudgetExceeded
+from .tracing import OtlpExporter, get_exporter
+
+User = get_user_model()
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        AuditLog.objects.create(actor=admin, action='LOGIN')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def test_reports_queries_in_server_timing(self):
+        response = self.client.get('/api/audit/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 queries", app;dur=[\d.]+$')
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False)
+    def test_going_over_budget_is_logged(self):
+        with mock.patch.object(AuditLogListView, 'query_budget', 1), \
+                self.assertLogs('monitoring.queries', 'WARNING') as logs:
+            response = self.client.get('/api/audit/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /api/audit/ (AuditLogListView) ran 2 queries, over its budget of 1', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_ENFORCE=True)
+    def test_going_over_budget_fails_when_enforced(self):
+        with mock.patch.object(AuditLogListView, 'query_budget', 1), self.assertLogs('monitoring.queries'):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/audit/')
+        self.assertEqual(self.client.get('/api/audit/').status_code, 200)
+
+    @override_settings(QUERY_BUDGET_ENFORCE=True)
+    def test_enforcement_keeps_the_response_of_a_request_that_wrote(self):
+        doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        access = EmergencyAccess.objects.create(doctor=doctor, patient=doctor, reason_code='UNCONSCIOUS',
+                                                reason_detail='RTA', expires_at=timezone.now())
+        with mock.patch.object(EmergencyAccessReviewView, 'query_budget', 1), \
+                self.assertLogs('monitoring.queries', 'ERROR') as logs:
+            response = self.client.post(f'/api/access/emergency/{access.pk}/review/', {'admin_note': 'ok'})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['X-Query-Budget-Exceeded'], r'^\d+/1$')
+        self.assertIn('its writes are committed', logs.output[0])
+        access.refresh_from_db()
+        self.assertTrue(access.is_reviewed_by_admin)
+
+    async def test_counts_queries_of_async_views_under_asgi(self):
+        # The view's queries run in sync_to_async threads, on their own connections
+        admin = await User.objects.aget(email='a@example.com')
+        token = await sync_to_async(lambda: str(CustomTokenObtainPairSerializer.get_token(admin).access_token))()
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+        await sync_to_async(client.get)('/api/notifications/')  # loads the revocation list
+        sync_timing = (await sync_to_async(client.get)('/api/notifications/'))['Server-Timing']
+        response = await AsyncClient().get('/api/notifications/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        count = re.search(r'desc="(\d+) queries"', response['Server-Timing'])[1]
+        self.assertNotEqual(count, '0')
+        self.assertEqual(count, re.search(r'desc="(\d+) queries"', sync_timing)[1])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GenerateDataTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        media = override_settings(MEDIA_ROOT=self.dir.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.config = os.path.join(self.dir.name, 'config.json')
+        with open(self.config, 'w') as f:
+            json.dump({'document_files': 3, 'emergencies_per_doctor': 2, 'admin_broadcasts': 5}, f)
+
+    def generate(self, seed=7, **counts):
+        options = {'patients': 20, 'doctors': 5, 'admins': 2, 'audit_logs': 300, **counts}
+        call_command('generate_data', seed=seed, until=date(2025, 6, 30), config=self.config,
+                     batch_size=64, stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return [
+            list(model.objects.order_by('pk').values_list())
+            for model in (User, Document, AccessRequest, EmergencyAccess, Notification, AuditLog)
+        ]
+
+    def test_generates_every_table_and_state(self):
+        self.generate()
+        self.assertEqual(User.objects.filter(role='PATIENT', patient_profile__isnull=False).count(), 20)
+        self.assertEqual(User.objects.filter(role='DOCTOR', doctor_profile__isnull=False).count(), 5)
+        self.assertEqual(User.objects.get(email='patient0.s7@synthetic.medivault.test').groups.get().name, 'Patient')
+        self.assertEqual(Document.objects.count(), 80)
+        self.assertEqual(AuditLog.objects.count(), 300)
+        self.assertEqual(
+            set(AccessRequest.objects.values_list('status', flat=True)),
+            {'PENDING', 'APPROVED', 'REJECTED', 'REVOKED', 'EXPIRED'},
+        )
+        self.assertEqual(EmergencyAccess.objects.count(), 10)
+        self.assertEqual(BroadcastCounter.objects.get(audience='ADMIN').total, 5)
+
+        document = Document.objects.first()
+        with document.file.open('rb') as f:
+            content = f.read()
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertEqual(document.file_size, len(content))
+
+        first, last = AuditLog.objects.order_by('created_at').values_list('created_at', flat=True)[::299]
+        self.assertEqual(last.date(), date(2025, 6, 30))
+        self.assertGreater((last - first).days, 360)
+        approved = AccessRequest.objects.filter(status='APPROVED')
+        self.assertFalse(approved.filter(expires_at__date__lte=date(2025, 6, 30)).exists())
+
+    def test_same_seed_gives_the_same_rows(self):
+        with transaction.atomic():
+            self.generate()
+            first = self.snapshot()
+            transaction.set_rollback(True)
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_refuses_to_reuse_a_seed(self):
+        self.generate(patients=2, doctors=0, admins=0, audit_logs=0)
+        with self.assertRaisesMessage(CommandError, 'Seed 7 has already been generated'):
+            self.generate(patients=2, doctors=0, admins=0, audit_logs=0)
+        self.generate(seed=8, patients=2, doctors=0, admins=0, audit_logs=0)
+
+
+@override_settings(METRICS_TOKEN='scrape-token', METRICS_DIR='')
+class MetricsTests(TestCase):
+    def setUp(self):
+        collector.reset()
+        self.addCleanup(collector.reset)
+        admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def scrape(self, token='scrape-token'):
+        return APIClient().get('/metrics', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_records_requests_per_view(self):
+        self.client.get('/api/audit/')
+        self.client.get('/api/audit/')
+        self.client.get('/no/such/page/')
+        response = self.scrape()
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('medivault_http_requests_total{view="AuditLogListView",method="GET",status="200"} 2', body)
+        self.assertIn('medivault_http_requests_total{view="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn(
+            'medivault_http_request_duration_seconds_bucket{view="AuditLogListView",method="GET",le="+Inf"} 2', body
+        )
+        self.assertIn('medivault_db_queries_per_request_sum{view="AuditLogListView"} 2', body)  # a count each
+        self.assertIn('medivault_db_queries_per_request_count{view="AuditLogListView"} 2', body)
+        self.assertRegex(body, r'medivault_http_response_size_bytes_sum\{view="AuditLogListView",method="GET"\} \d+')
+
+    def test_buckets_are_cumulative(self):
+        for seconds in (0.003, 0.2, 0.3, 30):
+            collector.observe('medivault_outbound_duration_seconds', {'service': 'email', 'outcome': 'ok'}, seconds)
+        body = collector.render()
+        buckets = re.findall(r'medivault_outbound_duration_seconds_bucket\{.*le="([^"]+)"\} (\d+)', body)
+        self.assertEqual(buckets[0], ('0.005', '1'))
+        self.assertEqual(dict(buckets)['0.25'], '2')
+        self.assertEqual(dict(buckets)['10'], '3')
+        self.assertEqual(dict(buckets)['+Inf'], '4')
+        self.assertIn('medivault_outbound_duration_seconds_sum{service="email",outcome="ok"} 30.503', body)
+
+    def test_needs_the_token(self):
+        self.assertEqual(self.scrape('wrong').status_code, 401)
+        self.assertEqual(APIClient().get('/metrics').status_code, 401)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.scrape().status_code, 404)
+
+    def test_sums_worker_processes(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = Collector()
+            other.pid = -1  # a worker that has exited
+            other.path = os.path.join(directory, 'worker.json')
+            other.inc('medivault_http_requests_total', {'view': 'MeView', 'method': 'GET', 'status': '200'}, 3)
+            other.observe('medivault_db_queries_per_request', {'view': 'MeView'}, 4)
+            other.flush()
+            collector.inc('medivault_http_requests_total', {'view': 'MeView', 'method': 'GET', 'status': '200'})
+            body = collector.render()
+        self.assertIn('medivault_http_requests_total{view="MeView",method="GET",status="200"} 4', body)
+        self.assertIn('medivault_db_queries_per_request_bucket{view="MeView",le="5"} 1', body)
+
+    @override_settings(FAST2SMS_API_KEY='key')
+    def test_times_outbound_sms(self):
+        with mock.patch('users.views.http_requests.post') as post:
+            post.return_value.json.return_value = {'return': True}
+            send_sms_otp('9876543210', '123456')
+            post.return_value.json.return_value = {'return': False}
+            with self.assertLogs('users.views', 'ERROR'):
+                send_sms_otp('9876543210', '123456')
+            post.side_effect = OSError('timed out')
+            with self.assertLogs('users.views', 'ERROR'):
+                send_sms_otp('9876543210', '123456')
+        body = collector.render()
+        self.assertIn('medivault_outbound_duration_seconds_count{service="sms",outcome="ok"} 1', body)
+        self.assertIn('medivault_outbound_duration_seconds_count{service="sms",outcome="error"} 2', body)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        profiles = override_settings(PROFILE_DIR=self.dir.name, PROFILE_SAMPLE_RATE=0.0)
+        profiles.enable()
+        self.addCleanup(profiles.disable)
+        self.admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat', role='PATIENT')
+
+    def client_for(self, user):
+        client = APIClient()
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_admin_header_saves_a_profile(self):
+        client = self.client_for(self.admin)
+        response = client.get('/api/audit/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        profile = client.get(f'/api/monitoring/profiles/{profile_id}/').json()
+        self.assertEqual(profile['trigger'], 'header')
+        self.assertEqual((profile['method'], profile['path'], profile['view']), ('GET', '/api/audit/', 'AuditLogListView'))
+        self.assertTrue(profile['functions'])
+        self.assertGreater(profile['memory']['peak_bytes'], 0)
+        self.assertEqual([p['id'] for p in client.get('/api/monitoring/profiles/').json()], [profile_id])
+
+        download = client.get(f'/api/monitoring/profiles/{profile_id}/download/')
+        self.assertEqual(download['Content-Disposition'], f'attachment; filename="{profile_id}.prof"')
+        self.assertIsInstance(marshal.loads(b''.join(download.streaming_content)), dict)
+
+    def test_header_is_ignored_for_others(self):
+        response = self.client_for(self.patient).get('/api/audit/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        response = APIClient().get('/api/audit/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Bearer junk')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_sampling(self):
+        client = self.client_for(self.patient)
+        with override_settings(PROFILE_SAMPLE_RATE=1.0):
+            response = client.get('/api/audit/')
+        self.assertIn('X-Profile-Id', response)
+        self.assertNotIn('X-Profile-Id', client.get('/api/audit/'))
+
+    @override_settings(PROFILE_MAX_ARTIFACTS=2)
+    def test_keeps_the_newest(self):
+        client = self.client_for(self.admin)
+        ids = [client.get('/api/audit/', HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+        listed = [p['id'] for p in client.get('/api/monitoring/profiles/').json()]
+        self.assertEqual(listed, ids[:0:-1])
+        self.assertEqual(len(os.listdir(self.dir.name)), 4)
+        self.assertEqual(client.get(f'/api/monitoring/profiles/{ids[0]}/').status_code, 404)
+
+    def test_admin_only(self):
+        response = self.client_for(self.admin).get('/api/audit/', HTTP_X_PROFILE='1')
+        client = self.client_for(self.patient)
+        self.assertEqual(client.get('/api/monitoring/profiles/').status_code, 403)
+        self.assertEqual(client.get(f'/api/monitoring/profiles/{response["X-Profile-Id"]}/download/').status_code, 403)
+
+
+@override_settings(EMAIL_HOST_USER='medivault@example.com')
+class TracingTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.file = os.path.join(self.dir.name, 'traces.jsonl')
+        tracing = override_settings(TRACING_EXPORTER='jsonl', TRACING_FILE=self.file, MEDIA_ROOT=self.dir.name)
+        tracing.enable()
+        self.addCleanup(tracing.disable)
+        self.patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        self.doctor = User.objects.create_user(email='d@example.com', password=None, full_name='Doc', role='DOCTOR')
+        User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        self.client = APIClient()
+
+    def spans(self):
+        with open(self.file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_emergency_access_span_tree(self):
+        self.client.force_authenticate(self.doctor)
+        response = self.client.post('/api/access/emergency/', {
+            'patient_id': self.patient.patient_id, 'reason_code': 'UNCONSCIOUS',
+            'reason_detail': 'RTA', 'patient_admit_id': 'ER-1',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        spans = self.spans()
+        root = spans[-1]
+        self.assertEqual(root['name'], 'POST EmergencyAccessView')
+        self.assertEqual(root['attributes']['http.status_code'], 201)
+        self.assertEqual({s['trace_id'] for s in spans}, {response['X-Trace-Id']})
+
+        by_id = {s['span_id']: s for s in spans}
+        names = [s['name'] for s in spans]
+        self.assertEqual(names.count('outbound.email'), 2)  # the patient and the admin
+        self.assertEqual(names.count('notify'), 1)
+        self.assertEqual(names.count('notify_role'), 1)
+        notify = next(s for s in spans if s['name'] == 'notify')
+        self.assertIn('db.query', [s['name'] for s in spans if s['parent_id'] == notify['span_id']])
+        for s in spans[:-1]:
+            self.assertIn(s['parent_id'], by_id)
+        self.assertNotIn('RTA', json.dumps([s for s in spans if s['name'] == 'db.query']))
+
+    def test_storage_spans(self):
+        self.client.force_authenticate(self.patient)
+        response = self.client.post('/api/documents/upload/', {
+            'title': 'Scan', 'document_type': 'SCAN', 'document_date': '2026-01-05',
+            'file': SimpleUploadedFile('scan.pdf', b'%PDF-1.4 scan', content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        save = next(s for s in self.spans() if s['name'] == 'storage.save')
+        self.assertEqual(save['attributes'], {'storage.bytes': 13})
+
+    def test_continues_an_incoming_trace(self):
+        trace_id, parent_id = 'ab' * 16, 'cd' * 8
+        response = self.client.get('/api/auth/me/', HTTP_TRACEPARENT=f'00-{trace_id}-{parent_id}-01')
+        self.assertEqual(response['X-Trace-Id'], trace_id)
+        self.assertEqual(self.spans()[-1]['parent_id'], parent_id)
+
+    def test_trace_id_without_exporter(self):
+        with override_settings(TRACING_EXPORTER=''):
+            response = self.client.get('/api/auth/me/')
+        self.assertRegex(response['X-Trace-Id'], r'^[0-9a-f]{32}$')
+        self.assertFalse(os.path.exists(self.file))
+
+    def test_otlp_payload(self):
+        with override_settings(TRACING_EXPORTER='otlp', TRACING_OTLP_ENDPOINT='http://collector:4318/v1/traces'):
+            exporter = get_exporter()
+            self.assertIsInstance(exporter, OtlpExporter)
+            with mock.patch.object(exporter, 'export', lambda spans: exporter.queue.put(spans)):
+                response = self.client.get('/api/auth/me/')
+            with mock.patch('monitoring.tracing.http_requests.post') as post:
+                exporter.flush()
+        (url,), kwargs = post.call_args
+        self.assertEqual(url, 'http://collector:4318/v1/traces')
+        spans = kwargs['json']['resourceSpans'][0]['scopeSpans'][0]['spans']
+        root = spans[-1]
+        self.assertEqual((root['traceId'], root['kind'], root['name']), (response['X-Trace-Id'], 2, 'GET MeView'))
+        self.assertNotIn('parentSpanId', root)
+        self.assertIn({'key': 'http.status_code', 'value': {'intValue': '401'}}, root['attributes'])
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.file = os.path.join(self.dir.name, 'slow.jsonl')
+        log = override_settings(SLOW_QUERY_FILE=self.file, SLOW_QUERY_MS=0)
+        log.enable()
+        self.addCleanup(log.disable)
+        self.addCleanup(slow_query_log.plans.clear)
+
+    def entries(self):
+        slow_query_log.join()
+        with open(self.file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT "a"."id", "t1"."x" FROM "a"  WHERE "a"."id" IN (%s, %s, %s) AND "b" = \'it\'\'s\' LIMIT 21'),
+            'SELECT "a"."id", "t1"."x" FROM "a" WHERE "a"."id" IN (?+) AND "b" = ? LIMIT ?',
+        )
+        self.assertEqual(fingerprint('INSERT INTO "n" ("x", "y") VALUES (%s, %s), (%s, %s)'),
+                         'INSERT INTO "n" ("x", "y") VALUES (?+)')
+
+    def test_logs_with_location_and_plan(self):
+        with self.assertLogs('monitoring.slow_queries', 'WARNING') as logs:
+            list(User.objects.filter(email='nobody@example.com'))
+        entry = self.entries()[-1]
+        self.assertIn('FROM "users_user" WHERE "users_user"."email" = ?', entry['fingerprint'])
+        self.assertIsNone(entry['view'])
+        self.assertRegex(entry['location'], r'^monitoring/tests\.py:\d+ in test_logs_with_location_and_plan$')
+        self.assertTrue(any('users_user' in line for line in entry['plan']), entry['plan'])
+        with open(self.file) as f:
+            self.assertNotIn('nobody@example.com', f.read())
+        self.assertIn(entry['location'], logs.output[0])
+
+    def test_records_the_view(self):
+        client = APIClient()
+        with self.assertLogs('monitoring.slow_queries', 'WARNING'):
+            client.force_authenticate(User.objects.create_user(
+                email='a@example.com', password=None, full_name='Admin', role='ADMIN'))
+            client.get('/api/audit/')
+        views = {entry['view'] for entry in self.entries() if 'audit_auditlog' in entry['fingerprint']}
+        self.assertEqual(views, {'AuditLogListView'})
+
+    @override_settings(SLOW_QUERY_MS=10_000)
+    def test_fast_queries_are_ignored(self):
+        list(User.objects.all())
+        slow_query_log.join()
+        self.assertFalse(os.path.exists(self.file))
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_none_turns_the_log_off(self):
+        with self.assertNoLogs('monitoring.slow_queries'):
+            list(User.objects.all())
+        slow_query_log.join()
+        self.assertFalse(os.path.exists(self.file))
+
+    def test_ranking_command(self):
+        with open(self.file, 'w') as f:
+            for fid, ms, view in [('aaa', 5, 'A'), ('bbb', 40, 'B'), ('aaa', 50, 'A'), ('aaa', 1, 'C')]:
+                f.write(json.dumps({
+                    'time': '2026-10-01T00:00:00+00:00', 'fingerprint_id': fid, 'fingerprint': f'SELECT {fid}',
+                    'duration_ms': ms, 'view': view, 'location': 'x.py:1 in f', 'plan': [f'SCAN {fid}'],
+                }) + '\n')
+        out = StringIO()
+        call_command('slow_queries', '--plans', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertRegex(lines[1], r'^\s+56\.0\s+3\s+18\.7\s+50\.0  aaa SELECT aaa$')
+        self.assertIn('view: A (2), at: x.py:1 in f', lines[2])
+        self.assertEqual(lines[3].strip(), 'SCAN aaa')
+        self.assertIn('bbb', lines[4])
+        self.assertIn('4 slow queries in 2 fingerprints.', lines[-1])
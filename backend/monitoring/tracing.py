@@ -0,0 +1,330 @@
+"""
+Request tracing.
+
+TracingMiddleware gives every request a trace id, echoed in the X-Trace-Id
+response header (or continued from an incoming W3C `traceparent` header).
+With TRACING_EXPORTER set, the request also becomes a tree of spans: the
+root span for the request, and children for each ORM query, file storage
+operation, email and SMS call and in-app notification, so a slow request
+shows where its time went. Finished traces go to
+
+    jsonl   one line per span, appended to TRACING_FILE
+    otlp    OTLP/HTTP JSON, posted from a background thread to
+            TRACING_OTLP_ENDPOINT (an OpenTelemetry collector, Jaeger, Tempo…)
+
+Code adds its own spans with
+
+    with span('notify', **{'notification.type': 'EMERGENCY_ACCESS'}):
+        ...
+
+which does nothing outside a traced request. Span attributes never carry
+query parameters, file names or message contents: they can hold patient data.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+import requests as http_requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENT = 2000  # characters of SQL kept per query span
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+_current = contextvars.ContextVar('monitoring_tracing_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'start', 'end', 'error')
+
+    def __init__(self, trace, name, parent_id=None, kind='internal', attributes=None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    def finish(self):
+        self.end = time.time_ns()
+        self.trace.spans.append(self)
+
+    def as_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_ns': self.start,
+            'duration_ms': round((self.end - self.start) / 1e6, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class Trace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []  # finished spans, children before their parents
+
+
+@contextmanager
+def span(name, kind='internal', **attributes):
+    """A child of the current span; yields None when nothing is being traced."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, kind, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        child.finish()
+
+
+def trace_query(execute, sql, params, many, context):
+    """execute_wrapper giving each query its own span; on every connection (see MonitoringConfig)."""
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    attributes = {
+        'db.system': context['connection'].vendor,
+        'db.operation': sql.split(None, 1)[0].upper() if sql else '',
+        'db.statement': sql[:MAX_STATEMENT],
+    }
+    with span('db.query', kind='client', **attributes):
+        return execute(sql, params, many, context)
+
+
+class TracedFileSystemStorage(FileSystemStorage):
+    """The default storage, with a span around every file operation."""
+
+    def _open(self, name, mode='rb'):
+        with span('storage.open', **{'storage.mode': mode}):
+            return super()._open(name, mode)
+
+    def _save(self, name, content):
+        with span('storage.save', **{'storage.bytes': content.size}):
+            return super()._save(name, content)
+
+    def delete(self, name):
+        with span('storage.delete'):
+            return super().delete(name)
+
+    def exists(self, name):
+        with span('storage.exists'):
+            return super().exists(name)
+
+    def size(self, name):
+        with span('storage.size'):
+            return super().size(name)
+
+
+# ---- Exporters ----
+
+class JsonLinesExporter:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        data = ''.join(json.dumps(s.as_dict()) + '\n' for s in spans)
+        with self.lock, open(self.path, 'a') as f:
+            f.write(data)  # one write per trace, so workers' traces don't interleave
+
+
+class OtlpExporter:
+    """OTLP/HTTP with JSON encoding; traces queue up for a background sender."""
+
+    KINDS = {'internal': 1, 'server': 2, 'client': 3}
+    MAX_QUEUED = 1000
+    BATCH = 100
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.queue = queue.Queue(self.MAX_QUEUED)
+        self.pid = None
+        self.dropped = 0
+
+    def export(self, spans):
+        if self.pid != os.getpid():  # first use in this (possibly forked) process
+            self.pid = os.getpid()
+            threading.Thread(target=self._send_forever, daemon=True).start()
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1  # the collector is down or slow; never block a request on it
+
+    def _send_forever(self):
+        pid = self.pid
+        while self.pid == pid:
+            self.flush(block=True)
+
+    def flush(self, block=False):
+        """Send whatever is queued, as one request per BATCH traces."""
+        batch = []
+        try:
+            batch.append(self.queue.get(block=block))
+            while len(batch) < self.BATCH:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not batch:
+            return
+        try:
+            response = http_requests.post(self.endpoint, json=self.payload(batch), timeout=5)
+            response.raise_for_status()
+        except Exception as exc:
+            logger.warning('Could not export %d traces to %s: %s', len(batch), self.endpoint, exc)
+
+    def payload(self, traces):
+        return {'resourceSpans': [{
+            'resource': {'attributes': _attributes({'service.name': settings.TRACING_SERVICE_NAME})},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [self._span(s) for spans in traces for s in spans],
+            }],
+        }]}
+
+    def _span(self, s):
+        data = {
+            'traceId': s.trace.trace_id,
+            'spanId': s.span_id,
+            'name': s.name,
+            'kind': self.KINDS[s.kind],
+            'startTimeUnixNano': str(s.start),
+            'endTimeUnixNano': str(s.end),
+            'attributes': _attributes(s.attributes),
+            'status': {'code': 2, 'message': s.error} if s.error else {},
+        }
+        if s.parent_id:
+            data['parentSpanId'] = s.parent_id
+        return data
+
+
+def _attributes(attributes):
+    def value(v):
+        if isinstance(v, bool):
+            return {'boolValue': v}
+        if isinstance(v, int):
+            return {'intValue': str(v)}
+        if isinstance(v, float):
+            return {'doubleValue': v}
+        return {'stringValue': str(v)}
+    return [{'key': key, 'value': value(v)} for key, v in attributes.items()]
+
+
+_exporters = {}
+
+
+def get_exporter():
+    """The exporter for the current settings, or None with tracing off."""
+    kind = settings.TRACING_EXPORTER
+    if not kind:
+        return None
+    if kind == 'jsonl':
+        key = (kind, settings.TRACING_FILE)
+    elif kind == 'otlp':
+        key = (kind, settings.TRACING_OTLP_ENDPOINT)
+    else:
+        raise ImproperlyConfigured(f"TRACING_EXPORTER must be 'jsonl', 'otlp' or empty, not {kind!r}")
+    exporter = _exporters.get(key)
+    if exporter is None:
+        exporter = _exporters[key] = (JsonLinesExporter if kind == 'jsonl' else OtlpExporter)(key[1])
+    return exporter
+
+
+# ---- Middleware ----
+
+class TracingMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        root, exporter = self.begin(request)
+        if root is None:
+            response = self.get_response(request)
+        else:
+            token = _current.set(root)
+            try:
+                response = self.get_response(request)
+            except BaseException as exc:
+                self.end(request, root, exporter, error=exc)
+                raise
+            finally:
+                _current.reset(token)
+            self.end(request, root, exporter, response)
+        response['X-Trace-Id'] = request.trace_id
+        return response
+
+    async def __acall__(self, request):
+        root, exporter = self.begin(request)
+        if root is None:
+            response = await self.get_response(request)
+        else:
+            token = _current.set(root)
+            try:
+                response = await self.get_response(request)
+            except BaseException as exc:
+                self.end(request, root, exporter, error=exc)
+                raise
+            finally:
+                _current.reset(token)
+            self.end(request, root, exporter, response)
+        response['X-Trace-Id'] = request.trace_id
+        return response
+
+    def begin(self, request):
+        """The root span, or None when only the trace id is wanted."""
+        match = TRACEPARENT.match(request.headers.get('traceparent', ''))
+        if match and match[1] != '0' * 32:
+            trace_id, parent_id = match[1], match[2]
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+        request.trace_id = trace_id
+        exporter = get_exporter()
+        if exporter is None:
+            return None, None
+        return Span(Trace(trace_id), 'http.request', parent_id, 'server', {
+            'http.method': request.method,
+            'http.target': request.path,
+        }), exporter
+
+    def end(self, request, root, exporter, response=None, error=None):
+        if error is not None:
+            root.error = type(error).__name__
+        else:
+            root.attributes['http.status_code'] = response.status_code
+            if response.status_code >= 500:
+                root.error = f'HTTP {response.status_code}'
+        # view_name is set by QueryBudgetMiddleware once the URL resolves
+        root.name = f'{request.method} {getattr(request, "view_name", "unmatched")}'
+        root.finish()
+        try:
+            exporter.export(root.trace.spans)
+        except Exception:
+            logger.exception('Could not export trace %s', root.trace.trace_id)
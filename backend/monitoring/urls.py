@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('profiles/', views.ProfileListView.as_view(), name='profile_list'),
+    path('profiles/<slug:profile_id>/', views.ProfileDetailView.as_view(), name='profile_detail'),
+    path('profiles/<slug:profile_id>/download/', views.ProfileDownloadView.as_view(), name='profile_download'),
+]
@@ -0,0 +1,69 @@
+import hmac
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import profiling
+from .metrics import collector
+
+
+def metrics(request):
+    """Prometheus scrape target; a plain view so scrapes skip DRF auth and throttling."""
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode(), settings.METRICS_TOKEN.encode()):
+        return HttpResponse('Unauthorized', status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(collector.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class IsAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == 'ADMIN'
+
+
+# ---- Request profiles (monitoring.profiling) ----
+
+SUMMARY_FIELDS = ('id', 'created_at', 'trigger', 'method', 'path', 'view', 'status', 'duration_ms')
+
+
+class ProfileListView(APIView):
+    permission_classes = [IsAdmin]
+    query_budget = 1
+
+    def get(self, request):
+        profiles = (profiling.load(artifact_id) for artifact_id in profiling.artifact_ids())
+        return Response([
+            {field: profile[field] for field in SUMMARY_FIELDS}
+            for profile in profiles if profile is not None
+        ])
+
+
+class ProfileDetailView(APIView):
+    permission_classes = [IsAdmin]
+    query_budget = 1
+
+    def get(self, request, profile_id):
+        profile = profiling.load(profile_id)
+        if profile is None:
+            raise Http404
+        return Response(profile)
+
+
+class ProfileDownloadView(APIView):
+    permission_classes = [IsAdmin]
+    query_budget = 1
+
+    def get(self, request, profile_id):
+        if profiling.load(profile_id) is None:
+            raise Http404
+        try:
+            return FileResponse(
+                open(profiling.profile_path(profile_id), 'rb'),
+                as_attachment=True,
+                filename=f'{profile_id}.prof',
+                content_type='application/octet-stream',
+            )
+        except FileNotFoundError:
+            raise Http404
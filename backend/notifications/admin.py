@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, NotificationPreference
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['recipient', 'notification_type', 'title', 'is_read', 'created_at']
-    list_filter = ['notification_type', 'is_read']
+    list_display = ['recipient', 'audience', 'notification_type', 'display_title', 'is_read', 'created_at']
+    list_filter = ['notification_type', 'audience', 'is_read']
+
+
+@admin.register(NotificationPreference)
+class NotificationPreferenceAdmin(admin.ModelAdmin):
+    list_display = ['user', 'email_delivery', 'digest_window_minutes', 'updated_at']
+    list_filter = ['email_delivery']
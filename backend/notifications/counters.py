@@ -0,0 +1,172 @@
+"""
+Per-user unread notification counters.
+
+Every write that changes how many unread notifications a user has must go
+through these helpers inside the same transaction as the write, so the counter
+moves atomically with the rows. `reconcile_counters` repairs any drift (e.g.
+rows edited through the Django admin).
+
+Broadcasts are counted per audience (BroadcastCounter.total); a user's unread
+broadcasts are that total minus their NotificationCounter.broadcast_seen.
+"""
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import BroadcastCounter, Notification, NotificationCounter, NotificationReceipt
+
+
+def _count_unread(user_id):
+    return Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+
+
+def _broadcast_total(audience):
+    total = BroadcastCounter.objects.filter(audience=audience).values_list('total', flat=True).first()
+    return total or 0
+
+
+def _create_counter(user):
+    """Seed a missing counter from the tables. Returns None if another request won the race."""
+    try:
+        with transaction.atomic():
+            unread_broadcasts = Notification.objects.unread_broadcasts_for(user).count()
+            return NotificationCounter.objects.create(
+                user_id=user.pk,
+                unread=_count_unread(user.pk),
+                broadcast_seen=max(_broadcast_total(user.role) - unread_broadcasts, 0),
+            )
+    except IntegrityError:
+        return None
+
+
+def _ensure_counter(user):
+    if not NotificationCounter.objects.filter(user_id=user.pk).exists():
+        _create_counter(user)
+
+
+def increment_unread(user, by=1):
+    if NotificationCounter.objects.filter(user_id=user.pk).update(unread=F('unread') + by):
+        return
+    # First notification for this user — the seeded count already includes the new row
+    if _create_counter(user) is None:
+        NotificationCounter.objects.filter(user_id=user.pk).update(unread=F('unread') + by)
+
+
+def decrement_unread(user, by):
+    if by:
+        NotificationCounter.objects.filter(user_id=user.pk).update(
+            unread=Greatest(F('unread') - by, 0)
+        )
+
+
+def increment_broadcasts(audience):
+    if BroadcastCounter.objects.filter(audience=audience).update(total=F('total') + 1):
+        return
+    try:
+        with transaction.atomic():
+            # The new broadcast row is already inserted, so the count includes it
+            BroadcastCounter.objects.create(
+                audience=audience, total=Notification.objects.filter(audience=audience).count()
+            )
+    except IntegrityError:
+        BroadcastCounter.objects.filter(audience=audience).update(total=F('total') + 1)
+
+
+def mark_broadcasts_read(user, ids=None):
+    """Add read receipts for the user's unread broadcasts (all, or only `ids`)."""
+    _ensure_counter(user)
+    # Serialise concurrent mark-read calls for this user so receipts aren't double-counted
+    NotificationCounter.objects.select_for_update().filter(user_id=user.pk).first()
+    unread = Notification.objects.unread_broadcasts_for(user)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    new_ids = list(unread.values_list('id', flat=True))
+    if new_ids:
+        NotificationReceipt.objects.bulk_create(
+            [NotificationReceipt(notification_id=pk, user_id=user.pk) for pk in new_ids],
+            ignore_conflicts=True,
+        )
+        NotificationCounter.objects.filter(user_id=user.pk).update(
+            broadcast_seen=F('broadcast_seen') + len(new_ids)
+        )
+    return len(new_ids)
+
+
+def forget_notifications(rows):
+    """
+    Adjust counters for notifications that are about to be deleted. `rows` are
+    dicts with id, recipient_id, audience, is_read and created_at.
+    """
+    unread_by_user = Counter(
+        row['recipient_id'] for row in rows if row['recipient_id'] and not row['is_read']
+    )
+    for user_id, n in unread_by_user.items():
+        NotificationCounter.objects.filter(user_id=user_id).update(unread=Greatest(F('unread') - n, 0))
+    for row in rows:
+        if not row['audience']:
+            continue
+        BroadcastCounter.objects.filter(audience=row['audience']).update(total=Greatest(F('total') - 1, 0))
+        # The broadcast was counted as seen by users who read it and by users
+        # who joined after it was sent (see _create_counter)
+        NotificationCounter.objects.filter(user__role=row['audience']).filter(
+            Q(user__date_joined__gt=row['created_at'])
+            | Q(user__notification_receipts__notification_id=row['id'])
+        ).update(broadcast_seen=Greatest(F('broadcast_seen') - 1, 0))
+
+
+def get_unread(user):
+    """Personal + broadcast unread count, read from a single counter row."""
+    broadcast_total = Subquery(
+        BroadcastCounter.objects.filter(audience=user.role).values('total')[:1]
+    )
+    row = (
+        NotificationCounter.objects.filter(user_id=user.pk)
+        .annotate(broadcast_total=Coalesce(broadcast_total, Value(0)))
+        .values_list('unread', 'broadcast_total', 'broadcast_seen')
+        .first()
+    )
+    if row is None:
+        _create_counter(user)
+        return get_unread(user)
+    unread, total, seen = row
+    return unread + max(total - seen, 0)
+
+
+def reconcile_counters(batch_size=1000):
+    """
+    Compare every stored counter with the real unread counts and fix mismatches.
+    Returns (checked, repaired).
+    """
+    checked = repaired = 0
+    totals = dict(
+        Notification.objects.exclude(audience='')
+        .values('audience').annotate(n=Count('id')).values_list('audience', 'n')
+    )
+    for audience, total in totals.items():
+        BroadcastCounter.objects.update_or_create(audience=audience, defaults={'total': total})
+    last_pk = None
+    while True:
+        qs = NotificationCounter.objects.select_related('user').order_by('user_id')
+        if last_pk is not None:
+            qs = qs.filter(user_id__gt=last_pk)
+        batch = list(qs[:batch_size])
+        if not batch:
+            return checked, repaired
+        actual = dict(
+            Notification.objects.filter(recipient_id__in=[c.user_id for c in batch], is_read=False)
+            .values('recipient_id').annotate(n=Count('id')).values_list('recipient_id', 'n')
+        )
+        for counter in batch:
+            real_unread = actual.get(counter.user_id, 0)
+            real_seen = counter.broadcast_seen
+            if totals.get(counter.user.role):
+                unread_broadcasts = Notification.objects.unread_broadcasts_for(counter.user).count()
+                real_seen = max(totals[counter.user.role] - unread_broadcasts, 0)
+            if (counter.unread, counter.broadcast_seen) != (real_unread, real_seen):
+                # Conditional update so a concurrent increment isn't overwritten
+                repaired += NotificationCounter.objects.filter(
+                    user_id=counter.user_id, unread=counter.unread,
+                    broadcast_seen=counter.broadcast_seen,
+                ).update(unread=real_unread, broadcast_seen=real_seen)
+        checked += len(batch)
+        last_pk = batch[-1].user_id
@@ -0,0 +1,46 @@
+"""
+Email digests: event emails queued by users.email_utils.deliver_event_email
+for recipients who chose digest delivery are collapsed into one message per
+recipient once the oldest queued item is older than their digest window.
+"""
+from datetime import timedelta
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from users.email_utils import send_digest_email
+from .models import PendingEmail
+
+
+def due_recipients(now=None):
+    now = now or timezone.now()
+    pending = (
+        PendingEmail.objects.values(
+            'user_id', 'user__email', 'user__notification_preference__digest_window_minutes'
+        )
+        .annotate(oldest=Min('created_at'))
+        .order_by('oldest')
+    )
+    for row in pending:
+        window = row['user__notification_preference__digest_window_minutes'] or 0
+        if row['oldest'] <= now - timedelta(minutes=window):
+            yield row['user_id'], row['user__email']
+
+
+def send_digests(now=None):
+    """Send every due digest over a single SMTP connection. Returns (digests, items)."""
+    now = now or timezone.now()
+    digests = items_sent = 0
+    with get_connection() as connection:
+        for user_id, email in due_recipients(now):
+            with transaction.atomic():
+                items = list(
+                    PendingEmail.objects.select_for_update(skip_locked=True)
+                    .filter(user_id=user_id, created_at__lte=now)
+                )
+                if not items or not send_digest_email(email, items, connection=connection):
+                    continue
+                PendingEmail.objects.filter(pk__in=[item.pk for item in items]).delete()
+            digests += 1
+            items_sent += len(items)
+    return digests, items_sent
@@ -0,0 +1,76 @@
+"""
+In-process broadcast hub for the notification stream.
+
+Each open SSE connection subscribes under its user's key and its role's
+broadcast key (see `audience_key`). Publishing only wakes the matching
+streams — they re-read the database themselves, so a notification created by
+another worker is still picked up by the stream's polling fallback.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+
+def audience_key(role):
+    return f'role:{role}'
+
+
+class Subscription:
+    def __init__(self, keys):
+        self.keys = keys
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # Loop already closed — the stream is going away anyway
+            pass
+
+    async def wait(self, timeout):
+        """Wait until woken or `timeout` seconds pass. Returns True if woken."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+        return True
+
+
+class NotificationHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, *keys):
+        subscription = Subscription(tuple(str(key) for key in keys))
+        with self._lock:
+            for key in subscription.keys:
+                self._subscribers[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for key in subscription.keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[key]
+
+    def publish(self, key):
+        """Wake every local stream subscribed under `key`. Safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(key), ()))
+        for subscription in subscribers:
+            subscription.wake()
+
+    def subscriber_count(self, key):
+        with self._lock:
+            return len(self._subscribers.get(str(key), ()))
+
+
+hub = NotificationHub()
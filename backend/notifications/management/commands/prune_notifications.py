@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from notifications.retention import prune_notifications
+
+
+def _fmt_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return f'{n:.1f} {unit}' if unit != 'B' else f'{n} B'
+        n /= 1024
+
+
+class Command(BaseCommand):
+    help = 'Delete notifications past their NOTIFICATION_RETENTION policy, in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        result = prune_notifications(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        for notif_type, count in sorted(result['deleted'].items()):
+            if count:
+                self.stdout.write(f'  {notif_type:<20} {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['total']} notifications "
+            f"(~{_fmt_bytes(result['payload_bytes'])} of text payload)."
+        ))
+        before, after = result['size_before'], result['size_after']
+        if before is not None and after is not None and not options['dry_run']:
+            line = f'Table size: {_fmt_bytes(before)} -> {_fmt_bytes(after)} ({_fmt_bytes(before - after)} reclaimed)'
+            if connection.vendor == 'postgresql':
+                line += '; dead rows are returned to the OS after VACUUM'
+            self.stdout.write(line)
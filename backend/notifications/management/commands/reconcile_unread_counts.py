@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from notifications.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Repair drift between per-user unread counters and the Notification table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        checked, repaired = reconcile_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} unread counters, repaired {repaired}.'
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from notifications.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Send collapsed digest emails to recipients whose digest window has elapsed.'
+
+    def handle(self, *args, **options):
+        digests, items = send_digests()
+        self.stdout.write(self.style.SUCCESS(f'Sent {digests} digests covering {items} events.'))
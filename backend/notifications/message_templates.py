@@ -0,0 +1,70 @@
+"""
+Notification text templates.
+
+Notifications store a template key plus a small `params` payload instead of
+fully rendered text; the title and message are rendered when serialised.
+`{actor}` comes from the row's actor_name and `{time}` from its created_at,
+so neither is repeated in params.
+"""
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from string import Formatter
+
+TEMPLATES = {
+    'access.requested': (
+        'Access Request from Doctor',
+        'Dr. {actor} has requested access to your medical records. Reason: {reason}',
+    ),
+    'access.approved': (
+        'Access Request Approved',
+        'Patient {actor} approved your access to their records. Access expires in {hours} hours.',
+    ),
+    'access.rejected': (
+        'Access Request Rejected',
+        'Patient {actor} rejected your access request.',
+    ),
+    'access.revoked': (
+        'Access Revoked',
+        'Patient {actor} has revoked your access to their records.',
+    ),
+    'emergency.patient': (
+        '⚠️ Emergency Access Used',
+        'Dr. {actor} used emergency break-glass access to your records at {time}. '
+        'Reason: {reason}. Access expires in 1 hour.',
+    ),
+    'emergency.admin': (
+        '⚠️ Emergency Access Triggered',
+        'Dr. {actor} triggered emergency access on patient {patient} ({patient_id}). Review required.',
+    ),
+    'system': ('{title}', '{message}'),
+}
+
+
+def _compile(fmt):
+    """Split a format string into (literal, field) pairs once."""
+    return tuple((literal, field) for literal, field, _, _ in Formatter().parse(fmt))
+
+
+@lru_cache(maxsize=None)
+def compiled(key):
+    title, message = TEMPLATES[key]
+    return _compile(title), _compile(message)
+
+
+def _render(parts, context):
+    out = []
+    for literal, field in parts:
+        out.append(literal)
+        if field is not None:
+            out.append(str(context.get(field, '')))
+    return ''.join(out)
+
+
+def render(key, params, actor_name='', created_at=None):
+    """Return (title, message) for a template key and its params."""
+    title_parts, message_parts = compiled(key)
+    context = dict(params, actor=actor_name)
+    if created_at is not None:
+        # Matches the UTC clock time the text was originally rendered with
+        context['time'] = created_at.astimezone(dt_timezone.utc).strftime('%I:%M %p')
+    return _render(title_parts, context), _render(message_parts, context)
@@ -0,0 +1,142 @@
+"""
+Data migration: compact legacy notifications into template key + params.
+
+A row is only compacted when re-rendering the template reproduces its stored
+title and message exactly; anything else keeps its text as-is. The templates
+are frozen here so later edits to notifications.message_templates don't change
+what this migration does.
+"""
+import re
+from datetime import timezone as dt_timezone
+from string import Formatter
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+LEGACY_TEMPLATES = {
+    'ACCESS_REQUEST': [(
+        'access.requested', 'Access Request from Doctor',
+        'Dr. {actor} has requested access to your medical records. Reason: {reason}',
+    )],
+    'ACCESS_APPROVED': [(
+        'access.approved', 'Access Request Approved',
+        'Patient {actor} approved your access to their records. Access expires in {hours} hours.',
+    )],
+    'ACCESS_REJECTED': [(
+        'access.rejected', 'Access Request Rejected',
+        'Patient {actor} rejected your access request.',
+    )],
+    'ACCESS_REVOKED': [(
+        'access.revoked', 'Access Revoked',
+        'Patient {actor} has revoked your access to their records.',
+    )],
+    'EMERGENCY_ACCESS': [
+        (
+            'emergency.patient', '⚠️ Emergency Access Used',
+            'Dr. {actor} used emergency break-glass access to your records at {time}. '
+            'Reason: {reason}. Access expires in 1 hour.',
+        ),
+        (
+            'emergency.admin', '⚠️ Emergency Access Triggered',
+            'Dr. {actor} triggered emergency access on patient {patient} ({patient_id}). Review required.',
+        ),
+    ],
+}
+TEMPLATES_BY_KEY = {
+    key: (title, message)
+    for options in LEGACY_TEMPLATES.values()
+    for key, title, message in options
+}
+TEMPLATES_BY_KEY['system'] = ('{title}', '{message}')
+
+
+def _pattern(fmt):
+    parts = []
+    for literal, field, _, _ in Formatter().parse(fmt):
+        parts.append(re.escape(literal))
+        if field is not None:
+            parts.append(f'(?P<{field}>.*)')
+    return re.compile(''.join(parts) + r'\Z', re.DOTALL)
+
+
+PATTERNS = {
+    notif_type: [(key, title, _pattern(message), message) for key, title, message in options]
+    for notif_type, options in LEGACY_TEMPLATES.items()
+}
+
+
+def _context(row, params):
+    return dict(
+        params,
+        actor=row.actor_name,
+        time=row.created_at.astimezone(dt_timezone.utc).strftime('%I:%M %p'),
+    )
+
+
+def _compact(row):
+    for key, title, pattern, message_fmt in PATTERNS.get(row.notification_type, ()):
+        if row.title != title:
+            continue
+        match = pattern.match(row.message)
+        if not match:
+            continue
+        params = {
+            name: value for name, value in match.groupdict().items()
+            if name not in ('actor', 'time')
+        }
+        if 'hours' in params and params['hours'].isdigit():
+            params['hours'] = int(params['hours'])
+        if message_fmt.format_map(_context(row, params)) != row.message:
+            continue
+        row.template_key = key
+        row.params = params
+        row.title = ''
+        row.message = ''
+        return True
+    return False
+
+
+def _batches(qs):
+    """Yield lists of rows in primary-key order, so rows can be updated while walking."""
+    last_pk = None
+    while True:
+        page = qs.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        batch = list(page[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def compact_notifications(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    for batch in _batches(Notification.objects.filter(template_key='')):
+        changed = [row for row in batch if _compact(row)]
+        Notification.objects.bulk_update(changed, ['template_key', 'params', 'title', 'message'])
+
+
+def expand_notifications(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    for batch in _batches(Notification.objects.exclude(template_key='')):
+        for row in batch:
+            title_fmt, message_fmt = TEMPLATES_BY_KEY[row.template_key]
+            context = _context(row, row.params)
+            row.title = title_fmt.format_map(context)
+            row.message = message_fmt.format_map(context)
+            row.template_key = ''
+            row.params = {}
+        Notification.objects.bulk_update(batch, ['template_key', 'params', 'title', 'message'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_templates'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_notifications, expand_notifications),
+    ]
@@ -1,10 +1,41 @@
 import uuid
 from django.db import models
+from django.db.models import Case, Exists, F, OuterRef, Q, When
 from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from .message_templates import render
 
 User = get_user_model()
 
 
+class NotificationQuerySet(models.QuerySet):
+    def broadcasts_for(self, user):
+        """Broadcasts addressed to the user's role since they joined."""
+        return self.filter(audience=user.role, created_at__gte=user.date_joined)
+
+    def unread_broadcasts_for(self, user):
+        return self.broadcasts_for(user).filter(
+            ~Exists(NotificationReceipt.objects.filter(notification=OuterRef('pk'), user=user))
+        )
+
+    def for_user(self, user):
+        """
+        Personal notifications merged with the user's role broadcasts.
+        Each row carries a `seen` flag: the row's own `is_read` for personal
+        notifications, the user's receipt for broadcasts.
+        """
+        receipt = NotificationReceipt.objects.filter(notification=OuterRef('pk'), user=user)
+        return self.filter(
+            Q(recipient=user) | Q(audience=user.role, created_at__gte=user.date_joined)
+        ).annotate(
+            seen=Case(
+                When(audience='', then=F('is_read')),
+                default=Exists(receipt),
+                output_field=models.BooleanField(),
+            )
+        )
+
+
 class Notification(models.Model):
     TYPE_CHOICES = [
         ('ACCESS_REQUEST', 'Access Request'),
@@ -18,17 +49,122 @@ class Notification(models.Model):
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Personal notifications have a recipient; broadcasts have an audience
+    # (a role, mirrored by the auth Group of the same name) and no recipient.
+    recipient = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications'
+    )
+    audience = models.CharField(max_length=10, choices=User.ROLE_CHOICES, blank=True, default='')
     notification_type = models.CharField(max_length=30, choices=TYPE_CHOICES)
-    title = models.CharField(max_length=255)
-    message = models.TextField()
-    is_read = models.BooleanField(default=False)
+    # Text is rendered from notifications.message_templates at read time;
+    # title/message are only filled for legacy rows that couldn't be compacted.
+    template_key = models.CharField(max_length=40, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    message = models.TextField(blank=True)
+    is_read = models.BooleanField(default=False)  # personal notifications only
     actor_name = models.CharField(max_length=255, blank=True)
     reference_id = models.UUIDField(null=True, blank=True)  # related object id
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = NotificationQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'created_at'], name='notif_recipient_created_idx'),
+            models.Index(fields=['audience', 'created_at'], name='notif_audience_created_idx'),
+            models.Index(fields=['notification_type', 'created_at'], name='notif_type_created_idx'),
+        ]
+
+    def __str__(self):
+        target = self.recipient.full_name if self.recipient_id else f"all {self.audience}"
+        return f"Notif → {target}: {self.rendered[0]}"
+
+    @cached_property
+    def rendered(self):
+        """(title, message) — rendered from the template, or the stored legacy text"""
+        if not self.template_key:
+            return self.title, self.message
+        return render(self.template_key, self.params, self.actor_name, self.created_at)
+
+    @property
+    def display_title(self):
+        return self.rendered[0]
+
+    @property
+    def display_message(self):
+        return self.rendered[1]
+
+
+class NotificationReceipt(models.Model):
+    """Per-user read marker for a broadcast notification"""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'user'], name='unique_notification_receipt'),
+        ]
+
+
+class BroadcastCounter(models.Model):
+    """Number of broadcasts ever sent to an audience — maintained by notifications.counters"""
+    audience = models.CharField(max_length=10, primary_key=True, choices=User.ROLE_CHOICES)
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.audience}: {self.total} broadcasts"
+
+
+class NotificationCounter(models.Model):
+    """
+    Denormalised unread count per user — maintained by notifications.counters.
+    Unread broadcasts are the audience's BroadcastCounter.total minus
+    `broadcast_seen`, so sending a broadcast touches one row, not one per user.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter'
+    )
+    unread = models.PositiveIntegerField(default=0)
+    broadcast_seen = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+
+class NotificationPreference(models.Model):
+    DELIVERY_CHOICES = [
+        ('IMMEDIATE', 'Immediately'),
+        ('DIGEST', 'Digest'),
+    ]
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_preference'
+    )
+    email_delivery = models.CharField(max_length=10, choices=DELIVERY_CHOICES, default='IMMEDIATE')
+    digest_window_minutes = models.PositiveIntegerField(default=30)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.email_delivery}"
+
+
+class PendingEmail(models.Model):
+    """Event email waiting to be collapsed into the recipient's next digest"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_emails')
+    subject = models.CharField(max_length=255)
+    plain_message = models.TextField()
+    title = models.CharField(max_length=255)
+    body_html = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='pending_email_user_idx'),
+        ]
 
     def __str__(self):
-        return f"Notif → {self.recipient.full_name}: {self.title}"
+        return f"Digest item → {self.user_id}: {self.subject}"
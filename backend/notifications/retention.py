@@ -0,0 +1,96 @@
+"""
+Notification retention, driven by settings.NOTIFICATION_RETENTION.
+
+Rows are deleted in small primary-key batches, each in its own short
+transaction, so the job never holds locks on more than one batch at a time
+and can run alongside live traffic.
+"""
+import operator
+import time
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Q, Sum, TextField
+from django.db.models.functions import Cast, Coalesce, Length
+from django.utils import timezone
+from .counters import forget_notifications
+from .models import Notification
+
+ROW_FIELDS = ['id', 'recipient_id', 'audience', 'is_read', 'created_at', 'notification_type']
+
+
+def expired_querysets(policies=None, now=None):
+    """Yield (notification_type, queryset of expired rows) for every policy."""
+    policies = settings.NOTIFICATION_RETENTION if policies is None else policies
+    now = now or timezone.now()
+    for notif_type, policy in policies.items():
+        rules = []
+        if policy.get('read') is not None:
+            rules.append(Q(
+                recipient__isnull=False, is_read=True,
+                created_at__lt=now - timedelta(days=policy['read']),
+            ))
+        if policy.get('max') is not None:
+            rules.append(Q(created_at__lt=now - timedelta(days=policy['max'])))
+        if rules:
+            expired = reduce(operator.or_, rules)
+            yield notif_type, Notification.objects.filter(expired, notification_type=notif_type)
+
+
+def table_size():
+    """Bytes used by the notification table, or None if the backend can't tell."""
+    table = Notification._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+            else:
+                return None
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+
+def prune_notifications(policies=None, batch_size=1000, pause=0.0, dry_run=False, now=None):
+    """
+    Delete expired notifications. Returns a dict with per-type row counts,
+    the text payload removed (characters of title/message/actor/params), and
+    the table size before and after.
+    """
+    payload = (
+        Length('title') + Length('message') + Length('actor_name')
+        + Coalesce(Length(Cast('params', TextField())), 0)
+    )
+    deleted = Counter()
+    payload_bytes = 0
+    size_before = table_size()
+
+    for notif_type, expired in expired_querysets(policies, now):
+        if dry_run:
+            rows = expired.aggregate(n=Count('id'), size=Sum(payload))
+            deleted[notif_type] += rows['n']
+            payload_bytes += rows['size'] or 0
+            continue
+        while True:
+            batch = list(expired.order_by('pk').values(*ROW_FIELDS, size=payload)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                forget_notifications(batch)
+                Notification.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+            deleted[notif_type] += len(batch)
+            payload_bytes += sum(row['size'] or 0 for row in batch)
+            if pause:
+                time.sleep(pause)  # Let other writers in between batches
+
+    return {
+        'deleted': dict(deleted),
+        'total': sum(deleted.values()),
+        'payload_bytes': payload_bytes,
+        'size_before': size_before,
+        'size_after': size_before if dry_run else table_size(),
+    }
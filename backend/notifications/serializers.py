@@ -1,8 +1,15 @@
 from rest_framework import serializers
-from .models import Notification
+from .message_templates import render
+from .models import Notification, NotificationPreference
+from medivault.lean_lists import datetime_mapper
 
 
 class NotificationSerializer(serializers.ModelSerializer):
+    # `seen` is annotated by Notification.objects.for_user(); it covers broadcast receipts
+    is_read = serializers.BooleanField(source='seen', read_only=True)
+    title = serializers.CharField(source='display_title', read_only=True)
+    message = serializers.CharField(source='display_message', read_only=True)
+
     class Meta:
         model = Notification
         fields = [
@@ -10,3 +17,45 @@ class NotificationSerializer(serializers.ModelSerializer):
             'is_read', 'actor_name', 'reference_id', 'created_at',
         ]
         read_only_fields = ['id', 'created_at']
+
+    # Columns read by each field that isn't a model field of its name (medivault.sparse_fields)
+    field_sources = {
+        'title': ('template_key', 'params', 'title', 'actor_name', 'created_at'),
+        'message': ('template_key', 'params', 'message', 'actor_name', 'created_at'),
+        'is_read': ('seen',),
+    }
+
+    # The same rows for the list endpoint, from .values_list() (medivault.lean_lists)
+    lean_columns = (
+        'id', 'notification_type', 'template_key', 'params', 'title', 'message', 'seen',
+        'actor_name', 'reference_id', 'created_at',
+    )
+
+    @classmethod
+    def lean_rows(cls, rows, context):
+        to_datetime = datetime_mapper()
+        data = []
+        for (pk, notification_type, template_key, params, title, message, seen,
+             actor_name, reference_id, created_at) in rows:
+            if template_key:  # as Notification.rendered
+                title, message = render(template_key, params, actor_name, created_at)
+            data.append({
+                'id': str(pk),
+                'notification_type': notification_type,
+                'title': title,
+                'message': message,
+                'is_read': bool(seen),
+                'actor_name': actor_name,
+                'reference_id': str(reference_id) if reference_id is not None else None,
+                'created_at': to_datetime(created_at),
+            })
+        return data
+
+
+class NotificationPreferenceSerializer(serializers.ModelSerializer):
+    digest_window_minutes = serializers.IntegerField(min_value=5, max_value=1440, required=False)
+
+    class Meta:
+        model = NotificationPreference
+        fields = ['email_delivery', 'digest_window_minutes', 'updated_at']
+        read_only_fields = ['updated_at']
@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .events import audience_key, hub
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def publish_new_notification(sender, instance, created, **kwargs):
+    """Wake the recipient's open streams once the row is committed."""
+    if created:
+        key = instance.recipient_id or audience_key(instance.audience)
+        transaction.on_commit(lambda: hub.publish(key))
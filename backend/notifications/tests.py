@@ -1,3 +1,419 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import generics
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .events import hub
+from .message_templates import compiled, render
+from .counters import decrement_unread, get_unread
+from .models import BroadcastCounter, Notification, NotificationCounter, NotificationPreference, PendingEmail
+from .retention import prune_notifications
+from medivault.lean_lists import LeanListMixin
+from users.email_utils import email_access_requested, email_emergency_access
 
-# Create your tests here.
+User = get_user_model()
+
+
+class NotificationHubTests(TestCase):
+    async def test_publish_wakes_only_matching_subscribers(self):
+        mine = hub.subscribe('user-a')
+        other = hub.subscribe('user-b')
+        try:
+            hub.publish('user-a')
+            self.assertTrue(await mine.wait(1))
+            self.assertFalse(await other.wait(0.01))
+        finally:
+            hub.unsubscribe(mine)
+            hub.unsubscribe(other)
+        self.assertEqual(hub.subscriber_count('user-a'), 0)
+
+
+@override_settings(NOTIFICATION_STREAM_POLL_SECONDS=0.05, NOTIFICATION_STREAM_MAX_SECONDS=5)
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='patient@example.com', password='pass12345', full_name='Pat', role='PATIENT'
+        )
+        self.token = str(AccessToken.for_user(self.user))
+
+    def _notify(self, title='Hello'):
+        from access_control.views import notify
+        notify(self.user, 'SYSTEM', 'system', {'title': title, 'message': 'msg'})
+
+    async def _read_events(self, response, count):
+        events = []
+        stream = response.streaming_content
+        while len(events) < count:
+            chunk = await asyncio.wait_for(stream.__anext__(), 2)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('event:') or chunk.startswith('id:'):
+                events.append(chunk)
+        await stream.aclose()
+        return events
+
+    async def test_requires_token(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_streams_unread_count_then_new_notifications(self):
+        response = await self.async_client.get(f'/api/notifications/stream/?token={self.token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+        self.assertTrue((await stream.__anext__()).startswith(b'retry:'))
+        first = (await stream.__anext__()).decode()
+        self.assertIn('event: unread', first)
+        self.assertIn('"unread_count": 0', first)
+
+        await sync_to_async(self._notify)('Access Request from Doctor')
+        events = await self._read_events(response, 2)
+        self.assertIn('event: notification', events[0])
+        self.assertIn('Access Request from Doctor', events[0])
+        self.assertIn('"unread_count": 1', events[1])
+
+    def test_mark_read_wakes_stream(self):
+        self._notify()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(hub, 'publish') as publish:
+            response = client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        publish.assert_called_once_with(self.user.pk)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='doctor@example.com', password='pass12345', full_name='Doc', role='DOCTOR'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _notify(self, n=1):
+        from access_control.views import notify
+        for _ in range(n):
+            notify(self.user, 'SYSTEM', 'system', {'title': 'Title', 'message': 'Message'})
+
+    def test_notify_increments_counter(self):
+        self._notify(3)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 3)
+
+    def test_unread_endpoint_reads_one_row(self):
+        self._notify(2)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/unread/')
+        self.assertEqual(response.data, {'unread_count': 2})
+
+    def test_counter_is_seeded_from_table_when_missing(self):
+        Notification.objects.create(recipient=self.user, notification_type='SYSTEM', title='t', message='m')
+        response = self.client.get('/api/notifications/unread/')
+        self.assertEqual(response.data, {'unread_count': 1})
+        self.assertTrue(NotificationCounter.objects.filter(user=self.user).exists())
+
+    def test_mark_read_decrements_only_changed_rows(self):
+        self._notify(3)
+        first = Notification.objects.filter(recipient=self.user).first()
+        self.client.post('/api/notifications/mark-read/', {'ids': [str(first.id)]}, format='json')
+        self.client.post('/api/notifications/mark-read/', {'ids': [str(first.id)]}, format='json')
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 2)
+        self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 0)
+
+    def test_reconcile_command_repairs_drift(self):
+        self._notify(2)
+        NotificationCounter.objects.filter(user=self.user).update(unread=40)
+        out = StringIO()
+        call_command('reconcile_unread_counts', stdout=out)
+        self.assertIn('repaired 1', out.getvalue())
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread, 2)
+
+
+class BroadcastNotificationTests(TestCase):
+    def setUp(self):
+        self.admins = [
+            User.objects.create_user(
+                email=f'admin{i}@example.com', password='pass12345', full_name=f'Admin {i}', role='ADMIN'
+            )
+            for i in range(3)
+        ]
+        self.doctor = User.objects.create_user(
+            email='doc@example.com', password='pass12345', full_name='Doc', role='DOCTOR'
+        )
+        self.patient = User.objects.create_user(
+            email='pat@example.com', password='pass12345', full_name='Pat', role='PATIENT'
+        )
+        self.client = APIClient()
+
+    def _emergency(self):
+        self.client.force_authenticate(self.doctor)
+        response = self.client.post('/api/access/emergency/', {
+            'patient_id': self.patient.patient_id,
+            'reason_code': 'UNCONSCIOUS',
+            'reason_detail': 'Brought in unresponsive',
+            'patient_admit_id': 'ER-1',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def _as(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def test_emergency_writes_one_row_for_all_admins(self):
+        self._emergency()
+        self.assertEqual(Notification.objects.filter(audience='ADMIN').count(), 1)
+        self.assertFalse(Notification.objects.filter(recipient__role='ADMIN').exists())
+        for admin in self.admins:
+            data = self._as(admin).get('/api/notifications/').data
+            self.assertEqual(data['count'], 1)
+            self.assertEqual(data['results'][0]['notification_type'], 'EMERGENCY_ACCESS')
+            self.assertFalse(data['results'][0]['is_read'])
+            self.assertEqual(self._as(admin).get('/api/notifications/unread/').data['unread_count'], 1)
+        # Patients only get their personal notification
+        self.assertEqual(self._as(self.patient).get('/api/notifications/').data['count'], 1)
+
+    def test_read_markers_are_per_user(self):
+        self._emergency()
+        first, second = self.admins[:2]
+        self._as(first).post('/api/notifications/mark-read/', {}, format='json')
+        self.assertTrue(self._as(first).get('/api/notifications/').data['results'][0]['is_read'])
+        self.assertEqual(self._as(first).get('/api/notifications/unread/').data['unread_count'], 0)
+        self.assertEqual(self._as(second).get('/api/notifications/unread/').data['unread_count'], 1)
+
+        self._emergency()
+        self.assertEqual(self._as(first).get('/api/notifications/unread/').data['unread_count'], 1)
+        self.assertEqual(self._as(second).get('/api/notifications/unread/').data['unread_count'], 2)
+
+    def test_broadcasts_before_joining_are_hidden(self):
+        self._emergency()
+        late = User.objects.create_user(
+            email='late@example.com', password='pass12345', full_name='Late', role='ADMIN'
+        )
+        self.assertEqual(self._as(late).get('/api/notifications/').data['count'], 0)
+        self.assertEqual(self._as(late).get('/api/notifications/unread/').data['unread_count'], 0)
+
+    def test_reconcile_recomputes_broadcast_seen(self):
+        self._emergency()
+        admin = self.admins[0]
+        self._as(admin).get('/api/notifications/unread/')
+        NotificationCounter.objects.filter(user=admin).update(broadcast_seen=1)
+        call_command('reconcile_unread_counts', stdout=StringIO())
+        self.assertEqual(self._as(admin).get('/api/notifications/unread/').data['unread_count'], 1)
+
+
+class NotificationTemplateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='doc2@example.com', password='pass12345', full_name='Doc', role='DOCTOR'
+        )
+
+    def test_renders_text_at_serialization(self):
+        from access_control.views import notify
+        notify(self.user, 'ACCESS_APPROVED', 'access.approved', {'hours': 24}, actor_name='Asha Rao')
+        row = Notification.objects.get()
+        self.assertEqual((row.title, row.message), ('', ''))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        item = client.get('/api/notifications/').data['results'][0]
+        self.assertEqual(item['title'], 'Access Request Approved')
+        self.assertEqual(
+            item['message'],
+            'Patient Asha Rao approved your access to their records. Access expires in 24 hours.',
+        )
+
+    def test_compiled_templates_are_cached(self):
+        compiled.cache_clear()
+        render('access.revoked', {}, 'A')
+        render('access.revoked', {}, 'B')
+        self.assertEqual(compiled.cache_info().hits, 1)
+
+    def test_migration_compacts_only_exact_matches(self):
+        migration = importlib.import_module('notifications.migrations.0007_compact_notifications')
+        created_at = timezone.now()
+        legacy = Notification(
+            recipient=self.user, notification_type='EMERGENCY_ACCESS', actor_name='Ravi Kumar',
+            title='⚠️ Emergency Access Used', created_at=created_at,
+            message=(
+                'Dr. Ravi Kumar used emergency break-glass access to your records at '
+                f"{created_at.astimezone(dt_timezone.utc).strftime('%I:%M %p')}. "
+                'Reason: Unconscious. Fall. Access expires in 1 hour.'
+            ),
+        )
+        original = legacy.rendered
+        del legacy.rendered
+        self.assertTrue(migration._compact(legacy))
+        self.assertEqual(legacy.template_key, 'emergency.patient')
+        self.assertEqual(legacy.params, {'reason': 'Unconscious. Fall'})
+        self.assertEqual(legacy.rendered, original)
+
+        edited = Notification(
+            recipient=self.user, notification_type='ACCESS_REVOKED', actor_name='Someone Else',
+            title='Access Revoked', message='Patient Asha Rao has revoked your access to their records.',
+            created_at=created_at,
+        )
+        self.assertFalse(migration._compact(edited))
+        self.assertEqual(edited.template_key, '')
+
+
+@override_settings(NOTIFICATION_RETENTION={
+    'SYSTEM': {'read': 30, 'max': 90},
+    'EMERGENCY_ACCESS': {'read': 365, 'max': 365},
+})
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='pat3@example.com', password='pass12345', full_name='Pat', role='PATIENT'
+        )
+        self.admin = User.objects.create_user(
+            email='adm3@example.com', password='pass12345', full_name='Adm', role='ADMIN'
+        )
+        User.objects.filter(pk=self.admin.pk).update(date_joined=timezone.now() - timedelta(days=800))
+        self.admin.refresh_from_db()
+
+    def _make(self, notif_type, age_days, read=False, broadcast=False):
+        from access_control.views import notify, notify_role
+        params = {'title': 't', 'message': 'm' * 50}
+        if broadcast:
+            notify_role('ADMIN', notif_type, 'system', params)
+        else:
+            notify(self.user, notif_type, 'system', params)
+        row = Notification.objects.order_by('-created_at').first()
+        Notification.objects.filter(pk=row.pk).update(
+            created_at=timezone.now() - timedelta(days=age_days), is_read=read
+        )
+        if read:
+            decrement_unread(self.user, 1)
+        return row.pk
+
+    def test_deletes_by_type_age_and_read_state(self):
+        keep = [
+            self._make('SYSTEM', 10, read=True),
+            self._make('SYSTEM', 40, read=False),
+            self._make('EMERGENCY_ACCESS', 200, read=True),
+            self._make('ACCESS_REQUEST', 2000, read=True),  # no policy
+        ]
+        self._make('SYSTEM', 40, read=True)
+        self._make('SYSTEM', 100, read=False)
+        self._make('EMERGENCY_ACCESS', 400, read=False)
+
+        result = prune_notifications(batch_size=1)
+        self.assertEqual(result['deleted'], {'SYSTEM': 2, 'EMERGENCY_ACCESS': 1})
+        self.assertGreater(result['payload_bytes'], 150)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), set(keep))
+        self.assertEqual(get_unread(self.user), 1)
+
+    def test_pruning_broadcasts_keeps_counters_consistent(self):
+        self._make('EMERGENCY_ACCESS', 400, broadcast=True)
+        self._make('EMERGENCY_ACCESS', 1, broadcast=True)
+        self.assertEqual(get_unread(self.admin), 2)
+        prune_notifications()
+        self.assertEqual(get_unread(self.admin), 1)
+        self.assertEqual(BroadcastCounter.objects.get(audience='ADMIN').total, 1)
+
+    def test_dry_run_deletes_nothing(self):
+        self._make('SYSTEM', 100)
+        out = StringIO()
+        call_command('prune_notifications', '--dry-run', stdout=out)
+        self.assertIn('Would remove 1 notifications', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_HOST_USER='medivault@example.com',
+)
+class EmailDigestTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            email='pat@example.com', password='x', full_name='Pat', role='PATIENT'
+        )
+        NotificationPreference.objects.create(user=self.patient, email_delivery='DIGEST')
+
+    def test_digest_recipients_are_queued_not_sent(self):
+        email_access_requested('Who', 'Checkup', self.patient.email, 'Pat')
+        email_access_requested('House', 'Follow-up', self.patient.email, 'Pat')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(PendingEmail.objects.filter(user=self.patient).count(), 2)
+
+    def test_urgent_events_bypass_the_digest(self):
+        email_emergency_access('Who', 'Unconscious', self.patient.email, 'Pat')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(PendingEmail.objects.exists())
+
+    def test_command_sends_one_email_per_recipient_once_window_elapses(self):
+        email_access_requested('Who', 'Checkup', self.patient.email, 'Pat')
+        email_access_requested('House', 'Follow-up', self.patient.email, 'Pat')
+        call_command('send_email_digests', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)  # window not over yet
+
+        PendingEmail.objects.update(created_at=timezone.now() - timedelta(minutes=31))
+        call_command('send_email_digests', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.patient.email])
+        self.assertIn('Dr. House', mail.outbox[0].body)
+        self.assertFalse(PendingEmail.objects.exists())
+
+    def test_preferences_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        response = client.patch(
+            '/api/notifications/preferences/', {'digest_window_minutes': 60}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email_delivery'], 'DIGEST')
+        self.assertEqual(response.data['digest_window_minutes'], 60)
+
+
+class LeanNotificationListTests(TestCase):
+    """The lean list path renders exactly the bytes the serializer did."""
+
+    def setUp(self):
+        from access_control.views import notify
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='pass12345', full_name='Admin', role='ADMIN'
+        )
+        notify(self.admin, 'ACCESS_APPROVED', 'access.approved', {'hours': 24}, actor_name='Åsha \u2029 Rao')
+        Notification.objects.create(
+            recipient=self.admin, notification_type='ACCESS_REVOKED', title='Legacy 🔔',
+            message='Written "before" templates', is_read=True, reference_id=uuid.uuid4(),
+        )
+        for n in range(2):
+            Notification.objects.create(audience='ADMIN', notification_type='EMERGENCY_ACCESS',
+                                        title=f'Broadcast {n}', message='ER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.client.post('/api/notifications/mark-read/', {'ids': [
+            str(Notification.objects.get(title='Broadcast 0').pk),
+        ]}, format='json')
+
+    def test_matches_the_serializer(self):
+        lean = self.client.get('/api/notifications/')
+        with mock.patch.object(LeanListMixin, 'list', generics.ListAPIView.list):
+            full = self.client.get('/api/notifications/')
+        self.assertTrue(lean.plain_data)
+        self.assertEqual(lean.content, full.content)
+        self.assertEqual(
+            [(item['title'], item['is_read']) for item in lean.json()['results']],
+            [('Broadcast 1', False), ('Broadcast 0', True), ('Legacy 🔔', True), ('Access Request Approved', False)],
+        )
+
+    def test_sparse_fields(self):
+        for fields in ('title', 'message,is_read', 'id,reference_id,created_at'):
+            lean = self.client.get('/api/notifications/', {'fields': fields})
+            with mock.patch.object(LeanListMixin, 'list', generics.ListAPIView.list):
+                full = self.client.get('/api/notifications/', {'fields': fields})
+            self.assertEqual(lean.content, full.content, fields)
+        self.assertEqual(
+            [item['title'] for item in self.client.get('/api/notifications/', {'fields': 'title'}).json()['results']],
+            ['Broadcast 1', 'Broadcast 0', 'Legacy 🔔', 'Access Request Approved'],
+        )
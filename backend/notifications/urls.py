@@ -5,4 +5,6 @@ urlpatterns = [
     path('', views.NotificationListView.as_view(), name='notification_list'),
     path('unread/', views.UnreadCountView.as_view(), name='unread_count'),
     path('mark-read/', views.MarkReadView.as_view(), name='mark_read'),
+    path('preferences/', views.NotificationPreferenceView.as_view(), name='notification_preferences'),
+    path('stream/', views.notification_stream, name='notification_stream'),
 ]
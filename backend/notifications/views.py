@@ -1,36 +1,173 @@
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import generics, permissions
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Notification
-from .serializers import NotificationSerializer
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.exceptions import InvalidToken
+from medivault.async_views import AsyncAPIView
+from medivault.lean_lists import LeanListMixin
+from .counters import decrement_unread, get_unread, mark_broadcasts_read
+from .events import audience_key, hub
+from .models import Notification, NotificationPreference
+from .serializers import NotificationPreferenceSerializer, NotificationSerializer
 
 
-class NotificationListView(generics.ListAPIView):
+# Async, like the stream below: the unread badge and the list are polled by
+# every open tab, and under ASGI they then don't hold a thread each.
+
+class NotificationListView(AsyncAPIView, LeanListMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 6
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.for_user(self.request.user)
+
+    async def get(self, request, *args, **kwargs):
+        return await sync_to_async(self.list)(request, *args, **kwargs)
 
 
-class UnreadCountView(APIView):
+class UnreadCountView(AsyncAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 10  # 2 once the user's counter row exists; the first call seeds it
 
-    def get(self, request):
-        count = Notification.objects.filter(recipient=request.user, is_read=False).count()
-        return Response({'unread_count': count})
+    async def get(self, request):
+        return Response({'unread_count': await sync_to_async(get_unread)(request.user)})
 
 
-class MarkReadView(APIView):
+class NotificationPreferenceView(AsyncAPIView, generics.RetrieveUpdateAPIView):
+    """Email delivery preference: immediate, or collapsed into a digest"""
+    serializer_class = NotificationPreferenceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 7
 
-    def post(self, request):
-        notification_ids = request.data.get('ids', [])
-        if notification_ids:
-            Notification.objects.filter(
-                recipient=request.user, id__in=notification_ids
-            ).update(is_read=True)
-        else:
-            # Mark all as read
-            Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    def get_object(self):
+        preference, _ = NotificationPreference.objects.get_or_create(user=self.request.user)
+        return preference
+
+    async def get(self, request, *args, **kwargs):
+        return await sync_to_async(self.retrieve)(request, *args, **kwargs)
+
+    async def put(self, request, *args, **kwargs):
+        return await sync_to_async(self.update)(request, *args, **kwargs)
+
+    async def patch(self, request, *args, **kwargs):
+        return await sync_to_async(self.partial_update)(request, *args, **kwargs)
+
+
+class MarkReadView(AsyncAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 16  # includes seeding the counter row on first use
+
+    async def post(self, request):
+        notification_ids = request.data.get('ids', []) or None  # None: mark all as read
+        await sync_to_async(self.mark_read)(request.user, notification_ids)
+        hub.publish(request.user.pk)
         return Response({'status': 'ok'})
+
+    def mark_read(self, user, notification_ids):
+        unread = Notification.objects.filter(recipient=user, is_read=False)
+        if notification_ids:
+            unread = unread.filter(id__in=notification_ids)
+        with transaction.atomic():
+            decrement_unread(user, unread.update(is_read=True))
+            mark_broadcasts_read(user, notification_ids)
+
+
+# ---- Server-Sent Events stream ----
+
+def _authenticate_stream(request):
+    """
+    EventSource can't send an Authorization header, so the access token may
+    also be passed as `?token=`. Returns the user or None.
+    """
+    auth = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if raw_token is None:
+        raw_token = request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _fetch_changes(user, cursor):
+    """Notifications created after `cursor` (oldest first) and the unread count."""
+    qs = Notification.objects.for_user(user).filter(created_at__gt=cursor).order_by('created_at')
+    new = NotificationSerializer(qs[:50], many=True).data
+    return new, get_unread(user)
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, cls=JSONEncoder, ensure_ascii=False))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _event_stream(user, cursor, lifetime):
+    """
+    Push new notifications and unread-count changes for `user`.
+
+    Local writes wake the stream immediately through the hub; writes made by
+    other workers are picked up by re-checking the database every
+    NOTIFICATION_STREAM_POLL_SECONDS.
+    """
+    poll_seconds = settings.NOTIFICATION_STREAM_POLL_SECONDS
+    subscription = hub.subscribe(user.pk, audience_key(user.role))
+    loop_time = subscription.loop.time
+    deadline = loop_time() + lifetime
+    last_unread = None
+    try:
+        # Tell the browser how long to wait before reconnecting
+        yield f'retry: {int(poll_seconds * 1000)}\n\n'
+        while True:
+            new, unread = await sync_to_async(_fetch_changes)(user, cursor)
+            for item in new:
+                cursor = item['created_at']
+                yield _sse('notification', item, event_id=cursor)
+            if unread != last_unread:
+                last_unread = unread
+                yield _sse('unread', {'unread_count': unread}, event_id=cursor)
+            if loop_time() >= deadline:
+                return
+            woke = await subscription.wait(min(poll_seconds, max(deadline - loop_time(), 0)))
+            if not woke:
+                yield ': keep-alive\n\n'
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def notification_stream(request):
+    """
+    GET /api/notifications/stream/ — text/event-stream of the user's notifications.
+
+    Only ASGI servers can hold the connection open; under WSGI a single
+    snapshot is sent and the browser reconnects after the retry interval.
+    """
+    user = await sync_to_async(_authenticate_stream)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    cursor = parse_datetime(request.headers.get('Last-Event-ID', '')) or timezone.now()
+    lifetime = settings.NOTIFICATION_STREAM_MAX_SECONDS if isinstance(request, ASGIRequest) else 0
+    response = StreamingHttpResponse(
+        _event_stream(user, cursor, lifetime), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    return response
@@ -0,0 +1,25 @@
+#!/usr/bin/env bash
+# Start script for Render deployment
+#
+# SERVER_MODE=asgi (the default) runs the app through medivault/asgi.py on
+# uvicorn workers, where the OTP, notification and download views are async:
+# a worker keeps serving other requests while they wait on the SMS or email
+# provider or stream a file. SERVER_MODE=wsgi is the previous setup, one
+# request at a time per sync worker. Either way gunicorn takes the worker
+# count from WEB_CONCURRENCY and extra flags from GUNICORN_CMD_ARGS.
+
+set -o errexit  # Exit on error
+
+case "${SERVER_MODE:-asgi}" in
+    asgi)
+        exec gunicorn medivault.asgi:application --worker-class uvicorn_worker.UvicornWorker \
+            --bind "0.0.0.0:${PORT:-8000}"
+        ;;
+    wsgi)
+        exec gunicorn medivault.wsgi:application --bind "0.0.0.0:${PORT:-8000}"
+        ;;
+    *)
+        echo "SERVER_MODE must be asgi or wsgi, not '$SERVER_MODE'" >&2
+        exit 1
+        ;;
+esac
@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _restore_search_indexes(using, **kwargs):
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .search import install_search_indexes
+
+    connection = connections[using]
+    # Only once migration 0005 has created them
+    if MigrationRecorder(connection).migration_qs.filter(app='users', name='0005_patient_search').exists():
+        install_search_indexes(connection)
 
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(_restore_search_indexes, sender=self)
@@ -0,0 +1,76 @@
+"""
+Stateless JWT authentication.
+
+CustomTokenObtainPairSerializer puts the user's role and patient_id in every
+token, which is all the permission classes look at, so request.user is built
+from the claims (see ClaimsUser) instead of loading the User row per request.
+
+Blocking or deleting a user can't invalidate tokens already issued, so tokens
+are checked against a small cached set of revoked user ids, refreshed every
+AUTH_REVOCATION_TTL_SECONDS and dropped immediately when an admin blocks or
+unblocks someone or a user is deleted. Deleted users are found through their
+unexpired refresh tokens, which outlive them with user set to NULL. A user
+deleted since the set was cached gets a 401 once anything reads their row.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.state import token_backend
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from .models import ClaimsUser, User
+
+REVOKED_CACHE_KEY = 'auth:revoked-user-ids'
+
+
+def _revoked_ids():
+    """Blocked users' ids, then deleted users' refresh tokens, in one query."""
+    inactive = User.objects.filter(is_active=False).order_by().values_list(Cast('id', TextField()), flat=True)
+    orphaned = OutstandingToken.objects.filter(
+        user__isnull=True, expires_at__gt=timezone.now()
+    ).order_by().values_list('token', flat=True)
+    for value in inactive.union(orphaned, all=True):
+        if '.' not in value:
+            yield str(User._meta.pk.to_python(value))
+            continue
+        try:
+            yield str(token_backend.decode(value, verify=False)[api_settings.USER_ID_CLAIM])
+        except (TokenBackendError, KeyError):
+            continue
+
+
+def revoked_user_ids():
+    ids = cache.get(REVOKED_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(_revoked_ids())
+        cache.set(REVOKED_CACHE_KEY, ids, settings.AUTH_REVOCATION_TTL_SECONDS)
+    return ids
+
+
+def invalidate_revocations():
+    cache.delete(REVOKED_CACHE_KEY)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if any(name not in validated_token for name in ClaimsUser.CLAIM_FIELDS):
+            # Issued before the claims were added — fall back to the database
+            return super().get_user(validated_token)
+        if str(user_id) in revoked_user_ids():
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        user = ClaimsUser.from_claims(
+            user_id, validated_token, using=router.db_for_read(ClaimsUser)
+        )
+        user.missing_error = AuthenticationFailed(_('User not found'), code='user_not_found')
+        return user
@@ -5,30 +5,73 @@ Sends HTML emails for key access control events.
 import logging
 from django.conf import settings
 from django.core.mail import send_mail
+from monitoring.metrics import outbound
 
 logger = logging.getLogger(__name__)
 
 
-def send_event_email(recipient_email: str, subject: str, plain_message: str, html_message: str) -> bool:
+def email_configured() -> bool:
+    return bool(settings.EMAIL_HOST_USER) and settings.EMAIL_HOST_USER != 'your_gmail@gmail.com'
+
+
+def send_event_email(recipient_email: str, subject: str, plain_message: str, html_message: str,
+                     connection=None) -> bool:
     """Send an HTML event email. Returns True on success."""
-    if not settings.EMAIL_HOST_USER or settings.EMAIL_HOST_USER == 'your_gmail@gmail.com':
+    if not email_configured():
         logger.warning('Email not configured — event email not sent to %s', recipient_email)
         return False
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            html_message=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient_email],
-            fail_silently=False,
-        )
+        with outbound('email'):
+            send_mail(
+                subject=subject,
+                message=plain_message,
+                html_message=html_message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[recipient_email],
+                fail_silently=False,
+                connection=connection,
+            )
         return True
     except Exception as exc:
         logger.exception('Failed to send event email to %s: %s', recipient_email, exc)
         return False
 
 
+def deliver_event_email(recipient_email: str, subject: str, plain_message: str, title: str,
+                        body_html: str, urgent: bool = False) -> bool:
+    """
+    Send an event email now, or queue it for the recipient's digest if they
+    chose digest delivery. Urgent events always go out immediately.
+    Returns True if the email was sent or queued.
+    """
+    return deliver_event_emails([recipient_email], subject, plain_message, title, body_html, urgent) == 1
+
+
+def deliver_event_emails(recipient_emails, subject: str, plain_message: str, title: str,
+                         body_html: str, urgent: bool = False) -> int:
+    """
+    deliver_event_email for several recipients, with one preference query
+    and one insert for those on digest delivery however many there are.
+    Returns how many were sent or queued.
+    """
+    digest_users = {}
+    if not urgent and recipient_emails:
+        from notifications.models import NotificationPreference, PendingEmail
+        digest_users = dict(NotificationPreference.objects.filter(
+            user__email__in=recipient_emails, email_delivery='DIGEST'
+        ).values_list('user__email', 'user_id'))
+        PendingEmail.objects.bulk_create(
+            PendingEmail(user_id=user_id, subject=subject, plain_message=plain_message,
+                         title=title, body_html=body_html)
+            for user_id in digest_users.values()
+        )
+    html = _wrap_html(title, body_html)
+    return len(digest_users) + sum(
+        send_event_email(email, subject, plain_message, html)
+        for email in recipient_emails if email not in digest_users
+    )
+
+
 def _wrap_html(title: str, body_html: str) -> str:
     """Wrap body content in a consistent MediVault email template."""
     return f"""
@@ -50,6 +93,23 @@ def _wrap_html(title: str, body_html: str) -> str:
     """
 
 
+def send_digest_email(recipient_email: str, items, connection=None) -> bool:
+    """Collapse queued event emails (PendingEmail rows) into one message."""
+    count = len(items)
+    subject = f'[MediVault] {count} update{"s" if count != 1 else ""} since your last digest'
+    plain = '\n\n'.join(
+        f'── {item.subject} ──\n{item.plain_message}' for item in items
+    )
+    sections = ''.join(
+        f'<div style="border-top:1px solid #e2e8f0;padding-top:16px;margin-top:16px;">'
+        f'<h3 style="color:#1e293b;font-size:15px;margin:0 0 8px;">{item.title}</h3>'
+        f'{item.body_html}</div>'
+        for item in items
+    )
+    html = _wrap_html(f'{count} MediVault update{"s" if count != 1 else ""}', sections)
+    return send_event_email(recipient_email, subject, plain, html, connection=connection)
+
+
 # ── Event-specific email senders ──────────────────────────────────────────────
 
 def email_access_requested(doctor_name: str, reason: str, patient_email: str, patient_name: str):
@@ -61,7 +121,7 @@ def email_access_requested(doctor_name: str, reason: str, patient_email: str, pa
         f'Please log in to MediVault to approve or reject this request.\n\n'
         f'— MediVault Team'
     )
-    html = _wrap_html(
+    title, body_html = (
         f'Access Request from Dr. {doctor_name}',
         f'<p style="color:#475569;">Hello <strong>{patient_name}</strong>,</p>'
         f'<p style="color:#475569;"><strong>Dr. {doctor_name}</strong> has requested access to your medical records.</p>'
@@ -75,7 +135,7 @@ def email_access_requested(doctor_name: str, reason: str, patient_email: str, pa
         f'          border-radius:8px;text-decoration:none;font-weight:600;margin-top:8px;">'
         f'  Review Request →</a>'
     )
-    send_event_email(patient_email, subject, plain, html)
+    deliver_event_email(patient_email, subject, plain, title, body_html)
 
 
 def email_access_approved(patient_name: str, duration_hours: int, doctor_email: str, doctor_name: str):
@@ -86,7 +146,7 @@ def email_access_approved(patient_name: str, duration_hours: int, doctor_email:
         f'Access is valid for {duration_hours} hours.\n\n'
         f'— MediVault Team'
     )
-    html = _wrap_html(
+    title, body_html = (
         'Access Request Approved ✅',
         f'<p style="color:#475569;">Hello <strong>Dr. {doctor_name}</strong>,</p>'
         f'<p style="color:#475569;">Patient <strong>{patient_name}</strong> has '
@@ -99,7 +159,7 @@ def email_access_approved(patient_name: str, duration_hours: int, doctor_email:
         f'          border-radius:8px;text-decoration:none;font-weight:600;margin-top:8px;">'
         f'  Go to Dashboard →</a>'
     )
-    send_event_email(doctor_email, subject, plain, html)
+    deliver_event_email(doctor_email, subject, plain, title, body_html)
 
 
 def email_access_rejected(patient_name: str, doctor_email: str, doctor_name: str):
@@ -109,14 +169,14 @@ def email_access_rejected(patient_name: str, doctor_email: str, doctor_name: str
         f'Patient {patient_name} has rejected your access request.\n\n'
         f'— MediVault Team'
     )
-    html = _wrap_html(
+    title, body_html = (
         'Access Request Rejected',
         f'<p style="color:#475569;">Hello <strong>Dr. {doctor_name}</strong>,</p>'
         f'<p style="color:#475569;">Patient <strong>{patient_name}</strong> has '
         f'<span style="color:#ef4444;font-weight:700;">rejected</span> your access request.</p>'
         f'<p style="color:#475569;">You may submit a new request with additional context if needed.</p>'
     )
-    send_event_email(doctor_email, subject, plain, html)
+    deliver_event_email(doctor_email, subject, plain, title, body_html)
 
 
 def email_access_revoked(patient_name: str, doctor_email: str, doctor_name: str):
@@ -126,13 +186,13 @@ def email_access_revoked(patient_name: str, doctor_email: str, doctor_name: str)
         f'Patient {patient_name} has revoked your access to their medical records.\n\n'
         f'— MediVault Team'
     )
-    html = _wrap_html(
+    title, body_html = (
         'Access Revoked',
         f'<p style="color:#475569;">Hello <strong>Dr. {doctor_name}</strong>,</p>'
         f'<p style="color:#475569;">Patient <strong>{patient_name}</strong> has '
         f'<span style="color:#f59e0b;font-weight:700;">revoked</span> your access to their records.</p>'
     )
-    send_event_email(doctor_email, subject, plain, html)
+    deliver_event_email(doctor_email, subject, plain, title, body_html)
 
 
 def email_emergency_access(doctor_name: str, reason_detail: str, patient_email: str, patient_name: str):
@@ -144,7 +204,7 @@ def email_emergency_access(doctor_name: str, reason_detail: str, patient_email:
         f'Access is valid for 1 hour. This event has been logged and flagged for admin review.\n\n'
         f'— MediVault Team'
     )
-    html = _wrap_html(
+    title, body_html = (
         '⚠️ Emergency Access Used',
         f'<div style="background:#fef2f2;border:1px solid #fecaca;border-radius:8px;padding:16px;margin-bottom:20px;">'
         f'  <strong style="color:#dc2626;">SECURITY ALERT</strong>'
@@ -159,11 +219,12 @@ def email_emergency_access(doctor_name: str, reason_detail: str, patient_email:
         f'<p style="color:#64748b;font-size:13px;">Access is limited to 1 hour and has been '
         f'logged for admin review. If you believe this was unauthorized, contact support.</p>'
     )
-    send_event_email(patient_email, subject, plain, html)
+    # Security alert for the patient — never held back for a digest
+    deliver_event_email(patient_email, subject, plain, title, body_html, urgent=True)
 
 
 def email_emergency_access_admin(doctor_name: str, patient_name: str, patient_id: str,
-                                  reason_detail: str, admin_email: str):
+                                  reason_detail: str, admin_emails):
     subject = f'[MediVault Admin] ⚠️ Emergency Access by Dr. {doctor_name}'
     plain = (
         f'Emergency access triggered.\n'
@@ -173,7 +234,7 @@ def email_emergency_access_admin(doctor_name: str, patient_name: str, patient_id
         f'Please review in the admin dashboard.\n\n'
         f'— MediVault System'
     )
-    html = _wrap_html(
+    title, body_html = (
         '⚠️ Emergency Access — Admin Review Required',
         f'<p style="color:#475569;">Emergency break-glass access was triggered:</p>'
         f'<table style="width:100%;border-collapse:collapse;font-size:14px;">'
@@ -189,4 +250,4 @@ def email_emergency_access_admin(doctor_name: str, patient_name: str, patient_id
         f'          border-radius:8px;text-decoration:none;font-weight:600;margin-top:16px;">'
         f'  Review in Admin Dashboard →</a>'
     )
-    send_event_email(admin_email, subject, plain, html)
+    deliver_event_emails(admin_emails, subject, plain, title, body_html)
@@ -0,0 +1,83 @@
+"""
+patient_id -> user primary key, cached.
+
+A patient_id never changes once assigned, so the mapping is cached for a
+long time (PATIENT_ID_CACHE_SECONDS), filled on first lookup and at
+registration (users.signals). Unknown IDs are cached too, briefly
+(PATIENT_ID_MISS_CACHE_SECONDS), so retyped or guessed IDs don't each cost a
+query; registering the ID overwrites the miss.
+
+Deleting a patient forgets their ID, but without a shared cache
+(SHARED_CACHE) only in the process that deleted them; other workers keep
+the pk. resolve_patient(), whose callers need the row itself, then checks
+a cached pk against the table.
+"""
+import re
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import ClaimsUser, User
+
+MISSING = ''
+PATIENT_ID_RE = re.compile(r'[A-Za-z0-9-]{1,20}\Z')
+
+
+def _key(patient_id):
+    return f'patient-pk:{patient_id}'
+
+
+def remember_patient(patient_id, pk):
+    cache.set(_key(patient_id), str(pk), settings.PATIENT_ID_CACHE_SECONDS)
+
+
+def remember_patients(pks_by_patient_id):
+    cache.set_many(
+        {_key(patient_id): str(pk) for patient_id, pk in pks_by_patient_id.items()},
+        settings.PATIENT_ID_CACHE_SECONDS,
+    )
+
+
+def forget_patient(patient_id):
+    cache.delete(_key(patient_id))
+
+
+def resolve_patient_pk(patient_id, verify=False):
+    """
+    Primary key of the patient with this patient_id, or None. With verify, a
+    pk cached by a per-process cache is only returned if the row still exists.
+    """
+    if not patient_id or not PATIENT_ID_RE.match(patient_id):
+        return None
+    cached = cache.get(_key(patient_id))
+    if cached is None:
+        pk = (
+            User.objects.filter(patient_id=patient_id, role='PATIENT')
+            .values_list('pk', flat=True).first()
+        )
+        # Only cache what's committed: inside a transaction this read may see
+        # (or miss) rows that are later rolled back
+        if pk is None:
+            transaction.on_commit(
+                lambda: cache.set(_key(patient_id), MISSING, settings.PATIENT_ID_MISS_CACHE_SECONDS)
+            )
+            return None
+        transaction.on_commit(lambda: remember_patient(patient_id, pk))
+        return pk
+    if cached == MISSING:
+        return None
+    pk = User._meta.pk.to_python(cached)
+    if verify and not settings.SHARED_CACHE and not User.objects.filter(pk=pk, role='PATIENT').exists():
+        forget_patient(patient_id)
+        return None
+    return pk
+
+
+def resolve_patient(patient_id):
+    """
+    The patient as a lazily loaded User (see ClaimsUser), or None. Nothing
+    is queried until a field other than pk/role/patient_id is read.
+    """
+    pk = resolve_patient_pk(patient_id, verify=True)
+    if pk is None:
+        return None
+    return ClaimsUser.from_claims(pk, {'role': 'PATIENT', 'patient_id': patient_id})
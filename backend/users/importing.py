@@ -0,0 +1,246 @@
+"""
+Bulk patient onboarding (manage.py import_patients).
+
+Rows are streamed from CSV or NDJSON and written in batches: each batch is
+validated up front, passwords are hashed in a process pool, and the users,
+profiles and group memberships are inserted with bulk_create in one short
+transaction. After every committed batch the row count is written to a
+checkpoint file, so a failed run resumes where it stopped. Rows that can't be
+imported are written, with their line number and reason, to an NDJSON error
+file instead of aborting the run; their passwords are masked there.
+"""
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from .identity import remember_patients
+from .models import PatientProfile, User, normalize_phone
+from .patient_ids import allocator
+
+PROFILE_FIELDS = [
+    'date_of_birth', 'gender', 'city', 'state', 'blood_group', 'allergies',
+    'chronic_conditions', 'current_medications', 'special_notes',
+    'emergency_contact_name', 'emergency_contact_relation', 'emergency_contact_phone',
+]
+# Masked in the error file, which is a plain file next to the input
+SECRET_COLUMNS = {'password'}
+BLOOD_GROUPS = {choice for choice, _ in PatientProfile.BLOOD_GROUP_CHOICES}
+PROFILE_MAX_LENGTHS = {
+    name: PatientProfile._meta.get_field(name).max_length for name in PROFILE_FIELDS
+}
+
+
+class RowError(Exception):
+    pass
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0  # already in the database (e.g. re-running a finished batch)
+    failed: int = 0
+    resumed_from: int = 0
+
+
+def read_rows(path, fmt=None):
+    """Yield (line number, dict) pairs without loading the whole file."""
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = {'_error': f'invalid JSON: {exc}'}
+            yield line_number, row if isinstance(row, dict) else {'_error': 'not a JSON object'}
+
+
+def _text(row, name, max_length=None):
+    value = str(row.get(name) or '').strip()
+    if max_length and len(value) > max_length:
+        raise RowError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def clean_row(row):
+    """Validated user/profile values for one input row. Raises RowError."""
+    if '_error' in row:
+        raise RowError(row['_error'])
+    email = User.objects.normalize_email(_text(row, 'email')).lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError('invalid email')
+    full_name = _text(row, 'full_name', 255)
+    if not full_name:
+        raise RowError('full_name is required')
+    phone = _text(row, 'phone', 15)
+
+    profile = {name: _text(row, name) for name in PROFILE_FIELDS if row.get(name) not in (None, '')}
+    if 'blood_group' in profile:
+        profile['blood_group'] = profile['blood_group'].upper()
+        if profile['blood_group'] not in BLOOD_GROUPS:
+            raise RowError(f"unknown blood_group {profile['blood_group']!r}")
+    if 'date_of_birth' in profile:
+        try:
+            profile['date_of_birth'] = date.fromisoformat(profile['date_of_birth'])
+        except ValueError:
+            raise RowError('date_of_birth must be YYYY-MM-DD')
+    for name, value in profile.items():
+        limit = PROFILE_MAX_LENGTHS.get(name)
+        if limit and len(value) > limit:
+            raise RowError(f'{name} is longer than {limit} characters')
+
+    return {
+        'email': email,
+        'full_name': full_name,
+        'phone': phone or None,
+        'password': str(row.get('password') or ''),
+        'profile': profile,
+    }
+
+
+def hash_passwords(passwords, pool):
+    """make_password for every non-empty password, fanned out over `pool` if given."""
+    to_hash = [p for p in passwords if p]
+    hashed = iter(pool.map(make_password, to_hash, chunksize=16) if pool else map(make_password, to_hash))
+    # No password: an unusable one (patients log in by OTP)
+    return [next(hashed) if p else make_password(None) for p in passwords]
+
+
+class PatientImporter:
+    def __init__(self, batch_size=500, hash_workers=None, error_file=None):
+        self.batch_size = batch_size
+        self.hash_workers = os.cpu_count() if hash_workers is None else hash_workers
+        self.error_file = error_file
+        self.result = ImportResult()
+        self._group_id = None
+        self._emails = set()  # imported by this run, to tell in-file duplicates from existing patients
+
+    def _fail(self, line_number, row, message):
+        self.result.failed += 1
+        if self.error_file:
+            row = {name: '***' if name in SECRET_COLUMNS and value else value for name, value in row.items()}
+            entry = {'line': line_number, 'error': message, 'row': row}
+            self.error_file.write(json.dumps(entry, default=str) + '\n')
+            self.error_file.flush()
+
+    @property
+    def group_id(self):
+        if self._group_id is None:
+            self._group_id = Group.objects.get_or_create(name='Patient')[0].pk
+        return self._group_id
+
+    def _build(self, cleaned, password_hash, patient_id):
+        user = User(
+            email=cleaned['email'], full_name=cleaned['full_name'], phone=cleaned['phone'],
+            phone_normalized=normalize_phone(cleaned['phone']), role='PATIENT',
+            password=password_hash, patient_id=patient_id,
+        )
+        return user, PatientProfile(user=user, **cleaned['profile'])
+
+    def _insert(self, users, profiles):
+        memberships = [User.groups.through(user_id=user.pk, group_id=self.group_id) for user in users]
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            PatientProfile.objects.bulk_create(profiles)
+            User.groups.through.objects.bulk_create(memberships, ignore_conflicts=True)
+        patient_ids = {user.patient_id: user.pk for user in users}
+        transaction.on_commit(lambda: remember_patients(patient_ids))
+
+    def import_batch(self, batch, pool=None):
+        """Import one list of (line number, row) pairs."""
+        cleaned, seen = [], set()
+        for line_number, row in batch:
+            try:
+                values = clean_row(row)
+            except RowError as exc:
+                self._fail(line_number, row, str(exc))
+                continue
+            if values['email'] in seen or values['email'] in self._emails:
+                self._fail(line_number, row, 'duplicate email in file')
+                continue
+            seen.add(values['email'])
+            cleaned.append((line_number, row, values))
+
+        existing = set(User.objects.filter(email__in=seen).values_list('email', flat=True))
+        if existing:
+            self.result.skipped += len(existing)
+            cleaned = [item for item in cleaned if item[2]['email'] not in existing]
+        if not cleaned:
+            return
+
+        hashes = hash_passwords([values.pop('password') for _, _, values in cleaned], pool)
+        patient_ids = allocator.next_ids(len(cleaned))
+        built = [self._build(values, h, pid) for (_, _, values), h, pid in zip(cleaned, hashes, patient_ids)]
+        try:
+            self._insert([user for user, _ in built], [profile for _, profile in built])
+            self.result.imported += len(built)
+            self._emails.update(user.email for user, _ in built)
+        except IntegrityError:
+            # Something raced us (e.g. the same email registered meanwhile):
+            # insert row by row so only the offending rows fail
+            for (line_number, row, _), (user, profile) in zip(cleaned, built):
+                try:
+                    self._insert([user], [profile])
+                    self.result.imported += 1
+                    self._emails.add(user.email)
+                except IntegrityError as exc:
+                    self._fail(line_number, row, f'database rejected row: {exc}')
+
+    def run(self, rows, checkpoint=None):
+        """
+        Import every (line number, row) pair. `checkpoint` is a path; rows
+        before the count stored there are skipped, and it is updated after
+        every batch.
+        """
+        done = read_checkpoint(checkpoint)
+        self.result.resumed_from = done
+        pool = ProcessPoolExecutor(self.hash_workers) if self.hash_workers > 1 else None
+        try:
+            batch, position = [], 0
+            for item in rows:
+                position += 1
+                if position <= done:
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch, pool)
+                    write_checkpoint(checkpoint, position)
+                    batch = []
+            if batch:
+                self.import_batch(batch, pool)
+                write_checkpoint(checkpoint, position)
+        finally:
+            if pool:
+                pool.shutdown()
+        return self.result
+
+
+def read_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f)['rows_done']
+
+
+def write_checkpoint(path, rows_done):
+    if not path:
+        return
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'rows_done': rows_done}, f)
+    os.replace(tmp, path)  # atomic, so a crash never leaves a half-written checkpoint
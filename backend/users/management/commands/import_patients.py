@@ -0,0 +1,51 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from users.importing import PatientImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Import patients from a CSV or NDJSON file (columns: email, full_name, phone, password '
+        'and any PatientProfile field). Resumable; failed rows go to an error file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--hash-workers', type=int, default=None,
+                            help='Processes used to hash passwords (default: CPU count; 1 hashes inline).')
+        parser.add_argument('--checkpoint', help='Progress file (default: <path>.checkpoint).')
+        parser.add_argument('--errors', help='Row-level error file (default: <path>.errors.ndjson).')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start from the first row.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        errors_path = options['errors'] or f'{path}.errors.ndjson'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        resuming = os.path.exists(checkpoint)
+
+        with open(errors_path, 'a' if resuming else 'w') as error_file:
+            importer = PatientImporter(
+                batch_size=options['batch_size'],
+                hash_workers=options['hash_workers'],
+                error_file=error_file,
+            )
+            result = importer.run(read_rows(path, options['format']), checkpoint=checkpoint)
+
+        if result.resumed_from:
+            self.stdout.write(f'Resumed after row {result.resumed_from}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.imported} patients; {result.skipped} already existed; {result.failed} failed.'
+        ))
+        if result.failed:
+            self.stdout.write(f'Failed rows written to {errors_path}')
+        elif not resuming:
+            os.remove(errors_path)
+        os.remove(checkpoint)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from users.tokens import prune_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete outstanding and blacklisted refresh tokens past their lifetime, in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted.')
+
+    def handle(self, *args, **options):
+        outstanding, blacklisted = prune_tokens(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {outstanding} expired tokens ({blacklisted} of them blacklisted).'
+        ))
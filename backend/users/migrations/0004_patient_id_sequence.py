@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_claims_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientIdSequence',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:30
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def normalize_phones(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    qs = User.objects.exclude(phone__isnull=True).exclude(phone='').order_by('pk')
+    last_pk = None
+    while True:
+        page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+        batch = list(page.only('pk', 'phone')[:BATCH_SIZE])
+        if not batch:
+            return
+        for user in batch:
+            user.phone_normalized = ''.join(ch for ch in user.phone if ch.isdigit())[-10:]
+        User.objects.bulk_update(batch, ['phone_normalized'])
+        last_pk = batch[-1].pk
+
+
+def install_search_indexes(apps, schema_editor):
+    from users.search import install_search_indexes
+    install_search_indexes(schema_editor.connection)
+
+
+def drop_search_indexes(apps, schema_editor):
+    from users.search import drop_search_indexes
+    drop_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_patient_id_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=10),
+        ),
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+        migrations.RunPython(install_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:39
+
+from django.db import migrations
+
+
+def reinstall_search_indexes(apps, schema_editor):
+    # 0005's SQLite index was keyed on users_user's rowid; replace it with the
+    # self-contained one (same trigger names, so drop first)
+    from users.search import drop_search_indexes, install_search_indexes
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_search_indexes(schema_editor.connection)
+    install_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_patient_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(reinstall_search_indexes, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,11 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseU
 from django.db import models
 
 
+def normalize_phone(value):
+    """Last 10 digits of a phone number, so '+91 98765-43210' and '9876543210' match."""
+    return ''.join(ch for ch in str(value or '') if ch.isdigit())[-10:]
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -31,6 +36,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True)
     full_name = models.CharField(max_length=255)
     phone = models.CharField(max_length=15, blank=True, null=True)
+    phone_normalized = models.CharField(max_length=10, blank=True, db_index=True, editable=False)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='PATIENT')
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -46,13 +52,82 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            # Blocked users only — read by users.authentication.revoked_user_ids
+            models.Index(fields=['id'], condition=models.Q(is_active=False), name='users_inactive_idx'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.role})"
 
     def save(self, *args, **kwargs):
+        if 'phone' not in self.get_deferred_fields():
+            self.phone_normalized = normalize_phone(self.phone)
+            if kwargs.get('update_fields') is not None and 'phone' in kwargs['update_fields']:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'phone_normalized'}
         if self.role == 'PATIENT' and not self.patient_id:
-            import random, string
-            self.patient_id = 'MV' + ''.join(random.choices(string.digits, k=8))
+            from .patient_ids import allocator
+            self.patient_id = allocator.next_id()
+        super().save(*args, **kwargs)
+
+
+class PatientIdSequence(models.Model):
+    """Next unreserved patient_id sequence number — see users.patient_ids"""
+    name = models.CharField(max_length=20, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class ClaimsUser(User):
+    """
+    A User built without a query from facts already known — access-token
+    claims (users.authentication) or a cached patient_id (users.identity).
+    Only those fields are set; touching any other field loads the rest of the
+    row in one query. If the row is gone by then, `missing_error` (when set)
+    is raised instead of DoesNotExist.
+    """
+    CLAIM_FIELDS = ('role', 'patient_id')
+    _claims = {}
+    missing_error = None
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims, using=None):
+        values = [cls._meta.pk.to_python(user_id)] + [claims[name] for name in cls.CLAIM_FIELDS]
+        user = cls.from_db(using, ['id', *cls.CLAIM_FIELDS], values)
+        user._claims = {name: claims[name] for name in cls.CLAIM_FIELDS}
+        return user
+
+    def _untouched_claims(self):
+        return {name for name, value in self._claims.items() if getattr(self, name) == value}
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            # Load the whole row (and re-read the claim copies) instead of one field per query
+            fields = [*deferred, *self._untouched_claims()]
+            self._claims = {}
+        try:
+            super().refresh_from_db(using, fields, from_queryset)
+        except self.DoesNotExist:
+            if self.missing_error is not None:
+                raise self.missing_error
+            raise
+
+    def save(self, *args, **kwargs):
+        deferred = self.get_deferred_fields()
+        if deferred and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Never write unchanged claim copies back — the row is the source of truth
+            skip = deferred | self._untouched_claims()
+            kwargs['update_fields'] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and (f.attname not in skip or f.name == 'updated_at')
+            ]
         super().save(*args, **kwargs)
 
 
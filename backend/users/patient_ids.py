@@ -0,0 +1,133 @@
+"""
+Collision-free patient_id allocation.
+
+IDs come from a database sequence (PatientIdSequence), run through a keyed
+Feistel permutation of the 8-digit space: distinct sequence numbers always
+give distinct IDs, but consecutive registrations get unrelated-looking IDs
+that can't be guessed without PATIENT_ID_KEY.
+
+Each process reserves PATIENT_ID_BLOCK_SIZE sequence numbers at a time, so
+the sequence row is only touched once per block. Numbers left in a block when
+a process exits are simply never used. Inside a transaction only one number is
+reserved, since a rollback would hand the rest of the block out again. IDs
+that already exist (issued by the old random scheme, or under a different
+key) are skipped.
+"""
+import hashlib
+import hmac
+import threading
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+PREFIX = 'MV'
+DIGITS = 8
+HALF = 10 ** (DIGITS // 2)
+SPACE = HALF * HALF
+ROUNDS = 4
+SEQUENCE_NAME = 'patient_id'
+
+
+class PatientIdsExhausted(Exception):
+    pass
+
+
+def _round(key, i, value):
+    digest = hmac.new(key, f'{i}:{value}'.encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big') % HALF
+
+
+def permute(n, key):
+    """Bijection on [0, 10**8): balanced Feistel network over two 4-digit halves."""
+    left, right = divmod(n, HALF)
+    for i in range(ROUNDS):
+        left, right = right, (left + _round(key, i, right)) % HALF
+    return left * HALF + right
+
+
+def unpermute(n, key):
+    left, right = divmod(n, HALF)
+    for i in reversed(range(ROUNDS)):
+        left, right = (right - _round(key, i, left)) % HALF, left
+    return left * HALF + right
+
+
+def format_patient_id(n):
+    return f'{PREFIX}{n:0{DIGITS}d}'
+
+
+def reserve_block(size):
+    """Reserve `size` sequence numbers. Returns the first one."""
+    from .models import PatientIdSequence
+
+    with transaction.atomic():
+        # Increment first so the row (or, on SQLite, the database) is
+        # write-locked before we read it back
+        updated = PatientIdSequence.objects.filter(name=SEQUENCE_NAME).update(
+            next_value=F('next_value') + size
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    PatientIdSequence.objects.create(name=SEQUENCE_NAME, next_value=size)
+                return 0
+            except IntegrityError:
+                PatientIdSequence.objects.filter(name=SEQUENCE_NAME).update(
+                    next_value=F('next_value') + size
+                )
+        end = PatientIdSequence.objects.get(name=SEQUENCE_NAME).next_value
+    if end > SPACE:
+        raise PatientIdsExhausted(f'All {SPACE} patient IDs have been allocated')
+    return end - size
+
+
+class PatientIdAllocator:
+    def __init__(self, block_size=None, key=None):
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._block_size = block_size
+        self._key = key
+
+    @property
+    def block_size(self):
+        return self._block_size or settings.PATIENT_ID_BLOCK_SIZE
+
+    @property
+    def key(self):
+        return self._key or settings.PATIENT_ID_KEY.encode()
+
+    def _next_number(self):
+        if transaction.get_connection().in_atomic_block:
+            # Don't cache numbers whose reservation might still be rolled back
+            return reserve_block(1)
+        with self._lock:
+            if self._next >= self._end:
+                self._next = reserve_block(self.block_size)
+                self._end = self._next + self.block_size
+            n = self._next
+            self._next += 1
+            return n
+
+    def next_id(self):
+        from .models import User
+
+        while True:
+            patient_id = format_patient_id(permute(self._next_number(), self.key))
+            if not User.objects.filter(patient_id=patient_id).exists():
+                return patient_id
+
+    def next_ids(self, count):
+        """`count` IDs from one fresh reservation (bulk imports), bypassing the cached block."""
+        from .models import User
+
+        ids = []
+        while len(ids) < count:
+            need = count - len(ids)
+            start = reserve_block(need)
+            candidates = [format_patient_id(permute(n, self.key)) for n in range(start, start + need)]
+            taken = set(User.objects.filter(patient_id__in=candidates).values_list('patient_id', flat=True))
+            ids += [patient_id for patient_id in candidates if patient_id not in taken]
+        return ids
+
+
+allocator = PatientIdAllocator()
@@ -0,0 +1,192 @@
+"""
+Patient search for the front desk: by patient_id prefix, phone and name.
+
+Every branch is an index lookup with a LIMIT, so latency doesn't grow with
+the number of patients:
+
+- patient_id: a range scan on the unique index ('MV123' <= id < 'MV124')
+  instead of a leading-wildcard LIKE;
+- phone: the same on `phone_normalized` (last 10 digits);
+- full_name: pg_trgm similarity on PostgreSQL, an FTS5 table on SQLite
+  (created by migrations 0005 and 0006), plain prefix matching elsewhere.
+
+Results are ranked: exact ID, ID prefix, exact phone, phone prefix, then
+names by relevance.
+"""
+from django.db import DatabaseError, connection
+from django.db.models import BooleanField, F, Func, Value
+from .models import User, normalize_phone
+
+FTS_TABLE = 'users_user_fts'
+FTS_KEYS = 'users_user_fts_keys'  # FTS rowid -> users_user.id
+MIN_NAME_LENGTH = 2
+TRIGRAM_MIN_LENGTH = 3  # shorter queries have too few trigrams to match on
+RANK_CANDIDATES = 1000
+
+
+def _prefix_range(field, prefix):
+    """Filter kwargs matching `prefix` as an index range, e.g. 'MV12' <= x < 'MV13'."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return {f'{field}__gte': prefix, f'{field}__lt': upper}
+
+
+def _patients():
+    return User.objects.filter(role='PATIENT', is_active=True)
+
+
+def _by_patient_id(query, limit):
+    digits = query[2:] if query[:2].upper() == 'MV' else query
+    if not digits.isdigit() or len(digits) > 8:
+        return []
+    prefix = 'MV' + digits
+    if len(digits) == 8:
+        return list(_patients().filter(patient_id=prefix)[:1])
+    return list(_patients().filter(**_prefix_range('patient_id', prefix)).order_by('patient_id')[:limit])
+
+
+def _by_phone(query, limit):
+    digits = normalize_phone(query)
+    if len(digits) < 4 or any(ch.isalpha() for ch in query):
+        return []
+    if len(digits) == 10:
+        return list(_patients().filter(phone_normalized=digits)[:limit])
+    return list(
+        _patients().filter(**_prefix_range('phone_normalized', digits)).order_by('phone_normalized')[:limit]
+    )
+
+
+def _fts_query(query):
+    # Quote each word so FTS5 operators in user input are taken literally
+    words = [word.replace('"', '""') for word in query.split()]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _sqlite_fts_ids(query, limit):
+    # bm25 has to score every match, so only rank the first RANK_CANDIDATES
+    # hits; common words ("priya") would otherwise score tens of thousands of rows
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT u.id FROM (SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT %s) f '
+                f'JOIN {FTS_KEYS} k ON k.id = f.rowid JOIN users_user u ON u.id = k.user_id '
+                f"WHERE u.role = 'PATIENT' AND u.is_active "
+                f'ORDER BY f.rank LIMIT %s',
+                [_fts_query(query), RANK_CANDIDATES, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    except DatabaseError:
+        # SQLite built without FTS5 — migration 0005 skipped the table
+        return None
+
+
+def _by_name(query, limit):
+    if len(query) < MIN_NAME_LENGTH or not any(ch.isalpha() for ch in query):
+        return []
+    if connection.vendor == 'sqlite':
+        ids = _sqlite_fts_ids(query, limit)
+        if ids is not None:
+            by_id = {user.id: user for user in _patients().filter(id__in=ids)}
+            return [by_id[pk] for pk in map(User._meta.pk.to_python, ids) if pk in by_id]
+    elif connection.vendor == 'postgresql' and len(query) >= TRIGRAM_MIN_LENGTH:
+        from django.contrib.postgres.search import TrigramSimilarity
+        # `full_name % query` is what the GIN trigram index can answer
+        similar = Func(F('full_name'), Value(query), template='%(expressions)s',
+                       arg_joiner=' %% ', output_field=BooleanField())
+        return list(
+            _patients().alias(similar=similar).filter(similar=True)
+            .annotate(rank=TrigramSimilarity('full_name', query)).order_by('-rank')[:limit]
+        )
+    return list(_patients().filter(full_name__istartswith=query).order_by('full_name')[:limit])
+
+
+def search_patients(query, limit=10):
+    query = ' '.join(query.split())
+    if not query:
+        return []
+    results, seen = [], set()
+    for branch in (_by_patient_id, _by_phone, _by_name):
+        for user in branch(query, limit):
+            if user.pk not in seen:
+                seen.add(user.pk)
+                results.append(user)
+        if len(results) >= limit:
+            break
+    return results[:limit]
+
+
+# ---- Index maintenance (migrations 0005/0006 and post_migrate) ----
+
+# users_user has a UUID primary key and no INTEGER PRIMARY KEY, so its rowids
+# aren't stable: VACUUM may renumber them and a table remake by a migration
+# does. The FTS table therefore keeps its own copy of the names, under rowids
+# that FTS_KEYS maps to user ids.
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': (
+        f'CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON users_user BEGIN '
+        f'INSERT INTO {FTS_KEYS}(user_id) VALUES (new.id); '
+        f'INSERT INTO {FTS_TABLE}(rowid, full_name) '
+        f'VALUES ((SELECT id FROM {FTS_KEYS} WHERE user_id = new.id), new.full_name); END'
+    ),
+    f'{FTS_TABLE}_ad': (
+        f'CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON users_user BEGIN '
+        f'DELETE FROM {FTS_TABLE} WHERE rowid = (SELECT id FROM {FTS_KEYS} WHERE user_id = old.id); '
+        f'DELETE FROM {FTS_KEYS} WHERE user_id = old.id; END'
+    ),
+    f'{FTS_TABLE}_au': (
+        f'CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF full_name ON users_user BEGIN '
+        f'UPDATE {FTS_TABLE} SET full_name = new.full_name '
+        f'WHERE rowid = (SELECT id FROM {FTS_KEYS} WHERE user_id = new.id); END'
+    ),
+}
+
+
+def install_search_indexes(connection):
+    """
+    Create the name index for this backend. Idempotent: on SQLite it also
+    restores the triggers (and rebuilds the index) after a migration has
+    remade users_user, which drops them.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS users_user_full_name_trgm '
+                'ON users_user USING gin (full_name gin_trgm_ops)'
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'users_user'")
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing >= set(SQLITE_TRIGGERS):
+                return
+            try:
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                    f"full_name, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+                )
+            except DatabaseError:
+                return  # no FTS5 in this SQLite build; search falls back to prefix matching
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {FTS_KEYS} '
+                f'(id INTEGER PRIMARY KEY, user_id char(32) NOT NULL UNIQUE)'
+            )
+            for name, sql in SQLITE_TRIGGERS.items():
+                if name not in existing:
+                    cursor.execute(sql)
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'DELETE FROM {FTS_KEYS}')
+            cursor.execute(f'INSERT INTO {FTS_KEYS}(user_id) SELECT id FROM users_user')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, full_name) '
+                f'SELECT k.id, u.full_name FROM {FTS_KEYS} k JOIN users_user u ON u.id = k.user_id'
+            )
+
+
+def drop_search_indexes(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS users_user_full_name_trgm')
+        elif connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_KEYS}')
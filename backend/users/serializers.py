@@ -1,22 +1,58 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import PatientProfile, DoctorProfile, OTPRecord
+from .tokens import FilteredRefreshToken
 import random
 
 User = get_user_model()
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = FilteredRefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        token['full_name'] = user.full_name
-        token['role'] = user.role
-        token['patient_id'] = user.patient_id
+        set_user_claims(token, user)
         return token
 
 
+def set_user_claims(token, user):
+    token['full_name'] = user.full_name
+    token['role'] = user.role
+    token['patient_id'] = user.patient_id
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-reads the user on every refresh: a deleted or blocked user gets a 401,
+    and the new tokens carry the current role and patient_id rather than
+    copies of the old claims.
+    """
+    token_class = FilteredRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.payload.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        set_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
+
 class PatientProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = PatientProfile
@@ -110,3 +146,11 @@ class AdminUserSerializer(serializers.ModelSerializer):
             'patient_id', 'is_active', 'is_approved', 'date_joined',
             'patient_profile', 'doctor_profile',
         ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Both profiles joined in; a missing one is cached as absent, so it costs no query either."""
+        return queryset.select_related('patient_profile', 'doctor_profile').only(
+            'id', 'email', 'full_name', 'phone', 'role', 'patient_id', 'is_active',
+            'is_approved', 'date_joined', 'patient_profile', 'doctor_profile',
+        )
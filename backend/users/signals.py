@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import invalidate_revocations
+from .identity import forget_patient, remember_patient
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def cache_new_patient_id(sender, instance, created, **kwargs):
+    """Prime the patient_id cache (and clear any cached miss) at registration."""
+    if created and instance.role == 'PATIENT' and instance.patient_id:
+        patient_id, pk = instance.patient_id, instance.pk
+        transaction.on_commit(lambda: remember_patient(patient_id, pk))
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_patient_id(sender, instance, **kwargs):
+    if instance.patient_id:
+        transaction.on_commit(lambda: forget_patient(instance.patient_id))
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_users_tokens(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_revocations)
@@ -1,3 +1,507 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import StatelessJWTAuthentication, revoked_user_ids
+from .models import ClaimsUser, DoctorProfile, PatientProfile, User
+from .identity import remember_patient, resolve_patient, resolve_patient_pk
+from .importing import PatientImporter, read_rows, write_checkpoint
+from .search import search_patients
+from .patient_ids import PatientIdAllocator, format_patient_id, permute, unpermute
+from .serializers import CustomTokenObtainPairSerializer
+from .tokens import BlacklistFilter, BloomFilter, FilteredRefreshToken, blacklist_filter
 
-# Create your tests here.
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='pat@example.com', password='x', full_name='Pat', role='PATIENT'
+        )
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='x', full_name='Admin', role='ADMIN'
+        )
+
+    def _token(self, user):
+        return str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+    def _authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return StatelessJWTAuthentication().authenticate(request)[0]
+
+    def test_user_is_built_from_claims_without_a_query(self):
+        token = self._token(self.user)
+        self._authenticate(token)  # warm the revocation cache
+        with self.assertNumQueries(0):
+            user = self._authenticate(token)
+            self.assertEqual((user.pk, user.role, user.patient_id), (self.user.pk, 'PATIENT', self.user.patient_id))
+        self.assertIsInstance(user, ClaimsUser)
+
+    def test_other_fields_load_in_one_query(self):
+        user = self._authenticate(self._token(self.user))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'pat@example.com')
+            self.assertEqual(user.full_name, 'Pat')
+            self.assertTrue(user.is_active)
+
+    def test_save_does_not_write_back_claims(self):
+        user = self._authenticate(self._token(self.user))
+        User.objects.filter(pk=self.user.pk).update(phone='123')
+        user.full_name = 'Patricia'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.full_name, self.user.phone), ('Patricia', '123'))
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        user = self._authenticate(str(AccessToken.for_user(self.user)))
+        self.assertNotIsInstance(user, ClaimsUser)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_blocking_a_user_rejects_their_tokens(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._token(self.user)}')
+        self.assertEqual(client.get('/api/notifications/unread/').status_code, 200)
+
+        admin = APIClient()
+        admin.credentials(HTTP_AUTHORIZATION=f'Bearer {self._token(self.admin)}')
+        response = admin.post(f'/api/auth/admin/users/{self.user.pk}/toggle/', {'action': 'block'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/api/notifications/unread/').status_code, 401)
+
+    def test_deleting_a_user_rejects_their_tokens(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.assertEqual(client.get('/api/auth/me/').status_code, 200)
+        user_id = str(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertIn(user_id, revoked_user_ids())
+        self.assertEqual(client.get('/api/auth/me/').status_code, 401)
+        self.assertEqual(client.post('/api/auth/token/refresh/', {'refresh': str(refresh)}).status_code, 401)
+
+    def test_user_deleted_since_the_revocations_were_cached_gets_401(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._token(self.user)}')
+        revoked_user_ids()
+        User.objects.filter(pk=self.user.pk).delete()  # elsewhere: this worker's cached set is stale
+        response = client.get('/api/auth/me/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'user_not_found')
+
+    def test_refresh_carries_the_current_role(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        User.objects.filter(pk=self.user.pk).update(role='DOCTOR')
+        response = APIClient().post('/api/auth/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['role'], 'DOCTOR')
+        self.assertEqual(FilteredRefreshToken(response.data['refresh'])['role'], 'DOCTOR')
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='doc@example.com', password='x', full_name='Doc', role='DOCTOR'
+        )
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_rotated_refresh_token_is_rejected(self):
+        refresh = str(CustomTokenObtainPairSerializer.get_token(self.user))
+        client = APIClient()
+        response = client.post('/api/auth/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.post('/api/auth/token/refresh/', {'refresh': refresh}).status_code, 401)
+        self.assertEqual(
+            client.post('/api/auth/token/refresh/', {'refresh': response.data['refresh']}).status_code, 200
+        )
+
+    @override_settings(SHARED_CACHE=True)
+    def test_filter_skips_the_blacklist_query(self):
+        raw = str(CustomTokenObtainPairSerializer.get_token(self.user))
+        blacklist_filter.sync(force=True)
+        with CaptureQueriesContext(connection) as queries:
+            FilteredRefreshToken(raw)
+        self.assertFalse([q for q in queries if 'blacklistedtoken' in q['sql']])
+
+    def test_without_a_shared_cache_misses_check_the_table(self):
+        # Blacklisted by another worker after this one's last sync: its cache marker isn't visible here
+        token = CustomTokenObtainPairSerializer.get_token(self.user)
+        blacklist_filter.sync(force=True)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        with self.assertRaises(TokenError):
+            FilteredRefreshToken(str(token))
+
+    def test_filter_is_built_from_tokens_blacklisted_elsewhere(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user)
+        outstanding = OutstandingToken.objects.get(jti=token['jti'])
+        BlacklistedToken.objects.create(token=outstanding)
+        self.assertTrue(BlacklistFilter().might_contain(token['jti']))
+
+    def test_prune_removes_only_expired_tokens(self):
+        live = CustomTokenObtainPairSerializer.get_token(self.user)
+        expired = CustomTokenObtainPairSerializer.get_token(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        out = StringIO()
+        call_command('prune_tokens', '--batch-size', '1', stdout=out)
+        self.assertIn('Removed 1 expired tokens (1 of them blacklisted)', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_otp_requests_are_limited_per_phone(self):
+        for _ in range(5):
+            self.assertNotEqual(self.client.post('/api/auth/otp/request/', {'phone': '9876543210'}).status_code, 429)
+        response = self.client.post('/api/auth/otp/request/', {'phone': '+91 98765 43210'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # Another number from the same address still gets through
+        self.assertNotEqual(self.client.post('/api/auth/otp/request/', {'phone': '9123456789'}).status_code, 429)
+
+    def test_throttled_requests_do_not_touch_the_database(self):
+        for _ in range(5):
+            self.client.post('/api/auth/otp/request/', {'phone': '9876543210'})
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/auth/otp/request/', {'phone': '9876543210'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_login_flood_from_one_address_does_not_block_others(self):
+        User.objects.create_user(email='doc@example.com', password='s3cret-pass', full_name='Doc', role='DOCTOR')
+        # Hold the clock: 30 password checks can take long enough for the window to slide
+        clock = mock.patch('users.throttling._now', return_value=1_800_000_030.0)
+        clock.start()
+        self.addCleanup(clock.stop)
+        for _ in range(30):
+            self.client.post('/api/auth/login/', {'email': f'x{_}@example.com', 'password': 'nope'},
+                             REMOTE_ADDR='10.0.0.66')
+        flooded = self.client.post('/api/auth/login/', {'email': 'doc@example.com', 'password': 's3cret-pass'},
+                                   REMOTE_ADDR='10.0.0.66')
+        self.assertEqual(flooded.status_code, 429)
+        response = self.client.post('/api/auth/login/', {'email': 'doc@example.com', 'password': 's3cret-pass'},
+                                    REMOTE_ADDR='10.0.0.7')
+        self.assertEqual(response.status_code, 200)
+
+    def request_otps(self, forwarded_for):
+        """21 OTP requests for different numbers, one over otp.ip; returns the last status."""
+        for n in range(21):
+            response = self.client.post('/api/auth/otp/request/', {'phone': f'98765{n:05}'},
+                                        HTTP_X_FORWARDED_FOR=forwarded_for(n), REMOTE_ADDR='10.0.0.1')
+        return response.status_code
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        self.assertEqual(self.request_otps(lambda n: f'203.0.113.{n}'), 429)
+
+    def test_spoofed_forwarded_for_prefix_keeps_the_proxy_address(self):
+        rest_framework = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            self.assertEqual(self.request_otps(lambda n: f'203.0.113.{n}, 10.0.0.66'), 429)
+            cache.clear()
+            self.assertNotEqual(self.request_otps(lambda n: f'10.0.0.{n}'), 429)
+
+
+class PatientIdTests(TestCase):
+    def test_permutation_is_a_bijection(self):
+        key = b'test-key'
+        sample = range(0, 10 ** 8, 7919)
+        self.assertEqual([unpermute(permute(n, key), key) for n in sample], list(sample))
+        self.assertEqual(len({permute(n, key) for n in range(50_000)}), 50_000)
+
+    def test_ids_keep_the_format_and_are_not_sequential(self):
+        ids = [User.objects.create_user(email=f'p{i}@example.com', password='x', full_name='P').patient_id
+               for i in range(5)]
+        self.assertTrue(all(len(pid) == 10 and pid.startswith('MV') and pid[2:].isdigit() for pid in ids))
+        numbers = [int(pid[2:]) for pid in ids]
+        self.assertNotIn(1, {b - a for a, b in zip(numbers, numbers[1:])})
+
+    def test_existing_ids_are_skipped(self):
+        allocator = PatientIdAllocator(block_size=10, key=b'k')
+        User.objects.create_user(email='legacy@example.com', password='x', full_name='Legacy',
+                                 patient_id=format_patient_id(permute(0, b'k')))
+        self.assertEqual(allocator.next_id(), format_patient_id(permute(1, b'k')))
+
+
+class PatientIdConcurrencyTests(TransactionTestCase):
+    def tearDown(self):
+        cache.clear()  # the flushed IDs will be allocated again by later tests
+
+    def test_parallel_registrations_get_unique_ids(self):
+        errors = []
+
+        def register(worker):
+            try:
+                for i in range(25):
+                    User.objects.create_user(email=f'w{worker}-{i}@example.com', password=None, full_name='P')
+            except Exception as exc:  # surfaced by the assertion below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        with self.settings(PATIENT_ID_BLOCK_SIZE=7):
+            threads = [threading.Thread(target=register, args=(w,)) for w in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        ids = list(User.objects.values_list('patient_id', flat=True))
+        self.assertEqual(len(ids), 200)
+        self.assertEqual(len(set(ids)), 200)
+
+
+class PatientSearchTests(TestCase):
+    def setUp(self):
+        def patient(name, phone, patient_id):
+            return User.objects.create_user(email=f'{patient_id}@example.com', password=None, full_name=name,
+                                            role='PATIENT', phone=phone, patient_id=patient_id)
+        self.asha = patient('Asha Verma', '+91 98765-43210', 'MV12345678')
+        self.ashok = patient('Ashok Kumar', '9123400000', 'MV12349999')
+        self.ravi = patient('Ravi Shah', '9000012345', 'MV55500000')
+        self.doctor = User.objects.create_user(email='doc@example.com', password=None, full_name='Asha Doc',
+                                               role='DOCTOR')
+
+    def test_patient_id_prefix(self):
+        self.assertEqual(search_patients('MV1234'), [self.asha, self.ashok])
+        self.assertEqual(search_patients('mv12345678'), [self.asha])
+
+    def test_phone_in_any_format(self):
+        self.assertEqual(search_patients('98765 43210'), [self.asha])
+        self.assertEqual(search_patients('+919876543210'), [self.asha])
+        self.assertEqual(search_patients('91234'), [self.ashok])
+
+    def test_name_words_and_prefixes(self):
+        self.assertEqual(set(search_patients('ash')), {self.asha, self.ashok})
+        self.assertEqual(search_patients('verma asha'), [self.asha])
+        self.assertEqual(search_patients('Ashok'), [self.ashok])
+        self.assertEqual(search_patients('sha'), [self.ravi])
+        self.assertEqual(search_patients('"OR'), [])
+
+    def test_renamed_patients_are_reindexed(self):
+        User.objects.filter(pk=self.ravi.pk).update(full_name='Ravindra Shah')
+        self.assertEqual(search_patients('ravindra'), [self.ravi])
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5 index')
+    def test_index_does_not_depend_on_user_rowids(self):
+        # VACUUM may renumber the rowids of a table without an INTEGER PRIMARY KEY
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE users_user SET rowid = rowid + 1000')
+            cursor.execute('UPDATE users_user SET rowid = 2000 - rowid')
+        self.assertEqual(search_patients('ravi'), [self.ravi])
+        self.assertEqual(search_patients('verma'), [self.asha])
+        self.ravi.delete()
+        self.assertEqual(search_patients('shah'), [])
+
+    def test_endpoint_is_for_doctors(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        response = client.get('/api/auth/patients/search/', {'q': 'MV1234'})
+        self.assertEqual([row['patient_id'] for row in response.data['results']], ['MV12345678', 'MV12349999'])
+        client.force_authenticate(self.asha)
+        self.assertEqual(client.get('/api/auth/patients/search/', {'q': 'MV1234'}).data['results'], [])
+
+
+class PatientIdentityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_registration_primes_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = User.objects.create_user(email='p@example.com', password=None, full_name='P')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_patient_pk(patient.patient_id), patient.pk)
+
+    def test_unknown_ids_are_cached_until_registered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(resolve_patient_pk('MV00000001'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_patient_pk('MV00000001'))
+            self.assertIsNone(resolve_patient_pk('not an id; --'))
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = User.objects.create_user(email='p@example.com', password=None, full_name='P',
+                                               patient_id='MV00000001')
+        self.assertEqual(resolve_patient_pk('MV00000001'), patient.pk)
+
+    def test_doctors_are_not_patients(self):
+        User.objects.create_user(email='d@example.com', password=None, full_name='D', role='DOCTOR',
+                                 patient_id='MV00000002')
+        self.assertIsNone(resolve_patient_pk('MV00000002'))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_resolved_patient_loads_lazily(self):
+        patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        with self.captureOnCommitCallbacks(execute=True):
+            resolve_patient_pk(patient.patient_id)
+        with self.assertNumQueries(1):
+            resolved = resolve_patient(patient.patient_id)
+            self.assertEqual((resolved.full_name, resolved.email), ('Pat', 'p@example.com'))
+
+    def test_patient_deleted_by_another_worker_is_not_resolved(self):
+        patient = User.objects.create_user(email='p@example.com', password=None, full_name='Pat')
+        patient_id, pk = patient.patient_id, patient.pk
+        patient.delete()
+        remember_patient(patient_id, pk)  # this process's copy, left behind without a shared cache
+        self.assertIsNone(resolve_patient(patient_id))
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_patient_pk(patient_id))  # the stale entry was dropped
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs PostgreSQL (DATABASE_URL) with pg_trgm')
+class PostgresPatientSearchTests(TestCase):
+    def setUp(self):
+        self.asha = User.objects.create_user(email='a@example.com', password=None, full_name='Asha Verma',
+                                             role='PATIENT')
+        self.ravi = User.objects.create_user(email='r@example.com', password=None, full_name='Ravi Shah',
+                                             role='PATIENT')
+
+    def test_trigram_index_exists(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'users_user_full_name_trgm'")
+            self.assertIsNotNone(cursor.fetchone())
+
+    def test_names_match_by_similarity(self):
+        self.assertEqual(search_patients('asha verma')[:1], [self.asha])
+        self.assertEqual(search_patients('ravi shaah')[:1], [self.ravi])  # misspelt
+        self.assertEqual(search_patients('as'), [self.asha])  # too short for trigrams: prefix
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PatientImportTests(TestCase):
+    CSV = (
+        'email,full_name,phone,password,blood_group,date_of_birth\n'
+        'a@example.com,Asha Rao,+91 98765 43210,secret-pass,o+,1990-01-31\n'
+        'not-an-email,Bad Row,,,,\n'
+        'b@example.com,Bala K,,,AB-,\n'
+        'c@example.com,Chitra,,,,31/01/1990\n'
+        'a@example.com,Asha Again,,,,\n'
+    )
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, 'patients.csv')
+        with open(self.path, 'w') as f:
+            f.write(self.CSV)
+
+    def _errors(self):
+        with open(f'{self.path}.errors.ndjson') as f:
+            return [json.loads(line) for line in f]
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        out = StringIO()
+        call_command('import_patients', self.path, '--batch-size', '2', '--hash-workers', '1', stdout=out)
+        self.assertIn('Imported 2 patients; 0 already existed; 3 failed.', out.getvalue())
+
+        asha = User.objects.get(email='a@example.com')
+        self.assertEqual((asha.role, asha.phone_normalized), ('PATIENT', '9876543210'))
+        self.assertTrue(asha.check_password('secret-pass'))
+        self.assertEqual(asha.patient_profile.blood_group, 'O+')
+        self.assertEqual(str(asha.patient_profile.date_of_birth), '1990-01-31')
+        self.assertTrue(asha.patient_id.startswith('MV'))
+        self.assertEqual(list(asha.groups.values_list('name', flat=True)), ['Patient'])
+        self.assertFalse(User.objects.get(email='b@example.com').has_usable_password())
+
+        errors = self._errors()
+        self.assertEqual([(e['line'], e['error']) for e in errors], [
+            (3, 'invalid email'),
+            (5, 'date_of_birth must be YYYY-MM-DD'),
+            (6, 'duplicate email in file'),
+        ])
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_resumes_after_the_checkpoint(self):
+        write_checkpoint(f'{self.path}.checkpoint', 2)
+        out = StringIO()
+        call_command('import_patients', self.path, '--hash-workers', '1', stdout=out)
+        self.assertIn('Resumed after row 2.', out.getvalue())
+        self.assertEqual(
+            set(User.objects.values_list('email', flat=True)), {'b@example.com', 'a@example.com'}
+        )
+        # Row 5 is a re-send of a@example.com; without the first two rows it's a new patient
+        self.assertEqual(User.objects.get(email='a@example.com').full_name, 'Asha Again')
+
+    def test_rerunning_a_finished_import_skips_existing_patients(self):
+        importer = PatientImporter(hash_workers=1)
+        importer.run(read_rows(self.path))
+        rerun = PatientImporter(hash_workers=1).run(read_rows(self.path))
+        self.assertEqual((rerun.imported, rerun.skipped), (0, 2))
+        self.assertEqual(User.objects.filter(role='PATIENT').count(), 2)
+
+    def test_batches_insert_in_bulk(self):
+        importer = PatientImporter(batch_size=100, hash_workers=1)
+        importer.group_id  # created once per run
+        rows = [(n, {'email': f'p{n}@example.com', 'full_name': f'Patient {n}'}) for n in range(50)]
+        with CaptureQueriesContext(connection) as ctx:
+            importer.run(rows)
+        self.assertEqual(importer.result.imported, 50)
+        self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_error_file_masks_passwords(self):
+        rows = [
+            (1, {'email': 'bad', 'full_name': 'Bad', 'password': 'hunter2-secret'}),
+            (2, {'email': 'd@example.com', 'full_name': 'D', 'password': 'first-secret'}),
+            (3, {'email': 'd@example.com', 'full_name': 'D', 'password': 'second-secret'}),
+            (4, {'email': 'e@example.com', 'full_name': 'E', 'password': ''}),
+            (5, {'email': 'e@example.com', 'full_name': 'E', 'password': ''}),
+        ]
+        errors = StringIO()
+        PatientImporter(hash_workers=1, error_file=errors).run(rows)
+        self.assertNotIn('secret', errors.getvalue())
+        entries = [json.loads(line) for line in errors.getvalue().splitlines()]
+        self.assertEqual([entry['row']['password'] for entry in entries], ['***', '***', ''])
+        self.assertEqual(entries[0]['row']['email'], 'bad')
+
+    def test_hashes_passwords_in_worker_processes(self):
+        rows = [(n, {'email': f'p{n}@example.com', 'full_name': 'P', 'password': f'pw-{n}'}) for n in range(20)]
+        result = PatientImporter(hash_workers=2).run(rows)
+        self.assertEqual(result.imported, 20)
+        self.assertTrue(User.objects.get(email='p7@example.com').check_password('pw-7'))
+
+
+class AdminUserListQueryTests(TestCase):
+    def test_profiles_are_joined_in(self):
+        admin = User.objects.create_user(email='a@example.com', password=None, full_name='Admin', role='ADMIN')
+        client = APIClient()
+        client.force_authenticate(admin)
+        for start, count in ((0, 1), (1, 24)):
+            for n in range(start, start + count):
+                user = User.objects.create_user(email=f'u{n}@example.com', password=None, full_name=f'U{n}',
+                                                role='DOCTOR' if n % 2 else 'PATIENT')
+                if n % 2:
+                    DoctorProfile.objects.create(user=user, specialization='ENT', license_number=f'L{n}')
+                else:
+                    PatientProfile.objects.create(user=user, blood_group='O+')
+            with self.assertNumQueries(2):
+                response = client.get('/api/auth/admin/users/')
+        self.assertEqual(response.data['count'], 26)
+        by_email = {row['email']: row for row in response.data['results']}
+        self.assertEqual(by_email['u23@example.com']['doctor_profile']['license_number'], 'L23')
+        self.assertEqual(by_email['u24@example.com']['patient_profile']['blood_group'], 'O+')
+        self.assertIsNone(by_email['u24@example.com']['doctor_profile'])
@@ -0,0 +1,101 @@
+"""
+Throttles for the unauthenticated login and OTP endpoints.
+
+State lives in Django's cache, Redis when REDIS_URL is set (render.yaml
+provisions it), so every worker sees the same counts. Without it each
+process counts on its own and the limits are multiplied by the number of
+workers: fine for runserver, not for a deployment. Each check is an atomic `cache.incr` on the current
+window's counter plus one read of the previous window's; the two are blended
+into a sliding-window estimate, which limits bursts at window boundaries the
+way a token bucket would without needing a read-modify-write.
+
+Views pick a `throttle_scope`; rates are looked up as '<scope>.<kind>' in
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], e.g. 'otp.phone'. A throttled
+request is rejected before the view runs, so it never touches the database.
+"""
+import math
+import time
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+from .models import normalize_phone
+
+_now = time.time  # patched by tests to hold the clock
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    kind = None
+    cache_format = 'throttle:{scope}:{ident}:{window}'
+
+    def get_ident_key(self, request):
+        """The value being limited, or None to let the request through."""
+        raise NotImplementedError
+
+    def get_rate(self, view):
+        scope = f'{getattr(view, "throttle_scope", None)}.{self.kind}'
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return scope, None, None
+        num, period = rate.split('/')
+        seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return scope, int(num), seconds
+
+    def _incr(self, key, timeout):
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # First hit in this window (or the key was evicted)
+            if cache.add(key, 1, timeout):
+                return 1
+            return cache.incr(key)
+
+    def allow_request(self, request, view):
+        scope, num, period = self.get_rate(view)
+        ident = self.get_ident_key(request)
+        if num is None or not ident:
+            return True
+
+        now = _now()
+        window, offset = divmod(now, period)
+        key = self.cache_format.format(scope=scope, ident=ident, window=int(window))
+        current = self._incr(key, 2 * period)
+        previous = cache.get(
+            self.cache_format.format(scope=scope, ident=ident, window=int(window) - 1)
+        ) or 0
+        elapsed = offset / period
+        if previous * (1 - elapsed) + current <= num:
+            return True
+
+        if current <= num:
+            # Wait for enough of the previous window to slide out
+            wait = (1 - (num - current - 1) / previous - elapsed) * period
+        else:
+            # This window alone is over the limit: wait for it to slide out too
+            wait = (1 - elapsed + 1 - num / current) * period
+        self.wait_seconds = max(math.ceil(wait), 1)
+        return False
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class IPThrottle(SlidingWindowThrottle):
+    kind = 'ip'
+
+    def get_ident_key(self, request):
+        # Honours REST_FRAMEWORK['NUM_PROXIES'] when deciding how far to trust X-Forwarded-For
+        return self.get_ident(request)
+
+
+class PhoneThrottle(SlidingWindowThrottle):
+    kind = 'phone'
+
+    def get_ident_key(self, request):
+        return normalize_phone(request.data.get('phone'))
+
+
+class EmailThrottle(SlidingWindowThrottle):
+    kind = 'email'
+
+    def get_ident_key(self, request):
+        return str(request.data.get('email', '')).strip().lower()
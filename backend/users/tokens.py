@@ -0,0 +1,148 @@
+"""
+Refresh-token blacklist helpers.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every refresh
+blacklists the old token, so simplejwt's "is this token blacklisted?" query
+runs on every refresh against an ever-growing table. `blacklist_filter` keeps
+a per-process Bloom filter of blacklisted jtis in front of that query: a jti
+that isn't in the filter can't be blacklisted, so only (rare) filter hits
+still go to the database.
+
+The filter is topped up from the table every TOKEN_BLACKLIST_SYNC_SECONDS.
+Tokens blacklisted by another worker in between are covered by a short-lived
+cache marker written when the token is blacklisted. Other workers only see
+that marker through a shared cache (SHARED_CACHE); without one, every filter
+miss still goes to the database, as simplejwt's own check does.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+MIN_FILTER_CAPACITY = 10_000
+
+
+def _recent_key(jti):
+    return f'auth:blacklisted:{jti}'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter: no false negatives, `error_rate` false positives at capacity."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class BlacklistFilter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._synced_at = None  # DB clock of the last sync
+        self._next_sync = 0.0  # time.monotonic() deadline
+
+    def _rebuild(self, now):
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            .values_list('token__jti', flat=True)
+        )
+        bloom = BloomFilter(max(2 * len(jtis), MIN_FILTER_CAPACITY))
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def sync(self, force=False):
+        if not force and time.monotonic() < self._next_sync:
+            return
+        interval = settings.TOKEN_BLACKLIST_SYNC_SECONDS
+        with self._lock:
+            if not force and time.monotonic() < self._next_sync:
+                return
+            now = timezone.now()
+            if self._bloom is None or self._bloom.count >= self._bloom.capacity:
+                # Start over when full; expired tokens drop out of the rebuilt filter
+                self._rebuild(now)
+            else:
+                # Overlap by one interval to catch rows committed late or stamped by a skewed clock
+                recent = BlacklistedToken.objects.filter(
+                    blacklisted_at__gte=self._synced_at - timedelta(seconds=interval)
+                ).values_list('token__jti', flat=True)
+                for jti in recent:
+                    self._bloom.add(jti)
+            self._synced_at = now
+            self._next_sync = time.monotonic() + interval
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+        cache.set(_recent_key(jti), 1, 3 * settings.TOKEN_BLACKLIST_SYNC_SECONDS)
+
+    def might_contain(self, jti):
+        self.sync()
+        if jti in self._bloom:
+            return True
+        if not settings.SHARED_CACHE:
+            return True  # another worker's marker wouldn't be visible here
+        return cache.get(_recent_key(jti)) is not None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken whose blacklist check is skipped when the Bloom filter rules it out."""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+
+def prune_tokens(batch_size=1000, pause=0.0, dry_run=False, now=None):
+    """
+    Delete outstanding tokens past their refresh lifetime, with their blacklist
+    rows, in short batches. Returns (outstanding, blacklisted) row counts.
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lte=now or timezone.now())
+    if dry_run:
+        return expired.count(), BlacklistedToken.objects.filter(token__in=expired).count()
+    outstanding = blacklisted = 0
+    while True:
+        ids = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return outstanding, blacklisted
+        with transaction.atomic():
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            outstanding += OutstandingToken.objects.filter(pk__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)  # Let logins and refreshes in between batches
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.conf import settings
 from django.core.mail import send_mail
@@ -6,9 +7,11 @@ from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from .authentication import invalidate_revocations
+from .search import search_patients
 from .models import PatientProfile, DoctorProfile, OTPRecord
+from .throttling import EmailThrottle, IPThrottle, PhoneThrottle
 from .serializers import (
     CustomTokenObtainPairSerializer, UserSerializer,
     PatientRegisterSerializer, DoctorRegisterSerializer,
@@ -16,6 +19,8 @@ from .serializers import (
     PatientSearchSerializer, AdminUserSerializer,
 )
 from audit.models import AuditLog
+from medivault.async_views import AsyncAPIView, blocking_io
+from monitoring.metrics import outbound
 import random
 import string
 import requests as http_requests
@@ -52,20 +57,22 @@ def send_sms_otp(phone: str, otp: str) -> bool:
         logger.warning('Fast2SMS API key not configured — SMS not sent.')
         return False
     try:
-        response = http_requests.post(
-            'https://www.fast2sms.com/dev/bulkV2',
-            headers={'authorization': api_key},
-            json={
-                'route': 'otp',
-                'variables_values': otp,
-                'numbers': phone,
-            },
-            timeout=10,
-        )
-        data = response.json()
-        if not data.get('return', False):
-            logger.error('Fast2SMS error: %s', data)
-            return False
+        with outbound('sms') as call:
+            response = http_requests.post(
+                settings.FAST2SMS_URL,
+                headers={'authorization': api_key},
+                json={
+                    'route': 'otp',
+                    'variables_values': otp,
+                    'numbers': phone,
+                },
+                timeout=10,
+            )
+            data = response.json()
+            if not data.get('return', False):
+                call['outcome'] = 'error'
+                logger.error('Fast2SMS error: %s', data)
+                return False
         return True
     except Exception as exc:
         logger.exception('Failed to send SMS OTP: %s', exc)
@@ -78,29 +85,30 @@ def send_email_otp(email: str, otp: str) -> bool:
         logger.warning('Gmail credentials not configured — email not sent.')
         return False
     try:
-        send_mail(
-            subject='MediVault – Verify your email',
-            message=(
-                f'Hello,\n\n'
-                f'Your MediVault email verification OTP is:\n\n'
-                f'  {otp}\n\n'
-                f'This code is valid for 10 minutes. Do not share it with anyone.\n\n'
-                f'– The MediVault Team'
-            ),
-            html_message=(
-                f'<div style="font-family:sans-serif;max-width:480px;margin:auto;padding:32px;'
-                f'border:1px solid #e2e8f0;border-radius:12px;">'
-                f'<h2 style="color:#1e293b;margin-bottom:8px;">Verify your email</h2>'
-                f'<p style="color:#64748b;font-size:14px;">Enter the code below in MediVault to complete registration:</p>'
-                f'<div style="font-size:36px;font-weight:800;letter-spacing:10px;color:#2563eb;'
-                f'text-align:center;padding:20px 0;">{otp}</div>'
-                f'<p style="color:#94a3b8;font-size:12px;">Valid for 10 minutes. Do not share this code.</p>'
-                f'</div>'
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
+        with outbound('email'):
+            send_mail(
+                subject='MediVault – Verify your email',
+                message=(
+                    f'Hello,\n\n'
+                    f'Your MediVault email verification OTP is:\n\n'
+                    f'  {otp}\n\n'
+                    f'This code is valid for 10 minutes. Do not share it with anyone.\n\n'
+                    f'– The MediVault Team'
+                ),
+                html_message=(
+                    f'<div style="font-family:sans-serif;max-width:480px;margin:auto;padding:32px;'
+                    f'border:1px solid #e2e8f0;border-radius:12px;">'
+                    f'<h2 style="color:#1e293b;margin-bottom:8px;">Verify your email</h2>'
+                    f'<p style="color:#64748b;font-size:14px;">Enter the code below in MediVault to complete registration:</p>'
+                    f'<div style="font-size:36px;font-weight:800;letter-spacing:10px;color:#2563eb;'
+                    f'text-align:center;padding:20px 0;">{otp}</div>'
+                    f'<p style="color:#94a3b8;font-size:12px;">Valid for 10 minutes. Do not share this code.</p>'
+                    f'</div>'
+                ),
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[email],
+                fail_silently=False,
+            )
         return True
     except Exception as exc:
         logger.exception('Failed to send email OTP: %s', exc)
@@ -120,17 +128,21 @@ def get_client_ip(request):
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
+    throttle_classes = [IPThrottle, EmailThrottle]
+    query_budget = 4
 
 
 class PatientRegisterView(generics.CreateAPIView):
     serializer_class = PatientRegisterSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 16
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         # Ensure profile exists
         PatientProfile.objects.get_or_create(user=user)
         # Assign Django auth Group
@@ -145,12 +157,13 @@ class PatientRegisterView(generics.CreateAPIView):
 class DoctorRegisterView(generics.CreateAPIView):
     serializer_class = DoctorRegisterSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 10
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         # Assign Django auth Group
         assign_group(user)
         return Response({
@@ -164,15 +177,22 @@ def generate_otp():
     return ''.join(random.choices(string.digits, k=6))
 
 
-class OTPRequestView(APIView):
+# The OTP views are async so that, under ASGI, a request waiting on the SMS or
+# email provider doesn't tie up the worker. The providers' clients still
+# block, so the sends run on the blocking_io pool.
+
+class OTPRequestView(AsyncAPIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'otp'
+    throttle_classes = [IPThrottle, PhoneThrottle]
+    query_budget = 3
 
-    def post(self, request):
+    async def post(self, request):
         serializer = OTPRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        result = serializer.save()
+        result = await sync_to_async(serializer.save)()
 
-        sms_sent = send_sms_otp(result['phone'], result['otp'])
+        sms_sent = await blocking_io(send_sms_otp)(result['phone'], result['otp'])
 
         response_data = {'message': 'OTP sent to your mobile number', 'phone': result['phone']}
         if settings.DEBUG:
@@ -190,23 +210,23 @@ class OTPRequestView(APIView):
 
 # ── Email OTP for Registration ────────────────────────────────────────────────
 
-class EmailOTPRequestView(APIView):
+class EmailOTPRequestView(AsyncAPIView):
     """Request an OTP sent to email address (for registration verification)"""
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'email_otp'
+    throttle_classes = [IPThrottle, EmailThrottle]
+    query_budget = 4
 
-    def post(self, request):
+    async def post(self, request):
         email = request.data.get('email', '').strip().lower()
         if not email:
             return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if email already registered
-        if User.objects.filter(email=email).exists():
+        otp = await sync_to_async(self.create_otp)(email)
+        if otp is None:
             return Response({'error': 'This email is already registered. Please login instead.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        otp = generate_otp()
-        OTPRecord.objects.create(phone='email_' + email[:30], email=email, otp=otp)
-
-        email_sent = send_email_otp(email, otp)
+        email_sent = await blocking_io(send_email_otp)(email, otp)
 
         response_data = {'message': f'OTP sent to {email}', 'email': email}
         if settings.DEBUG:
@@ -221,18 +241,31 @@ class EmailOTPRequestView(APIView):
 
         return Response(response_data)
 
+    def create_otp(self, email):
+        """A new OTP for `email`, or None if it's already registered."""
+        if User.objects.filter(email=email).exists():
+            return None
+        otp = generate_otp()
+        OTPRecord.objects.create(phone='email_' + email[:30], email=email, otp=otp)
+        return otp
+
 
-class EmailOTPVerifyView(APIView):
+class EmailOTPVerifyView(AsyncAPIView):
     """Verify email OTP for registration flow"""
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'otp_verify'
+    throttle_classes = [IPThrottle, EmailThrottle]
+    query_budget = 4
 
-    def post(self, request):
+    async def post(self, request):
         email = request.data.get('email', '').strip().lower()
         otp = request.data.get('otp', '').strip()
 
         if not email or not otp:
             return Response({'error': 'Email and OTP are required'}, status=status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(self.verify)(email, otp)
 
+    def verify(self, email, otp):
         record = OTPRecord.objects.filter(
             phone='email_' + email[:30], otp=otp, is_used=False
         ).order_by('-created_at').first()
@@ -246,17 +279,22 @@ class EmailOTPVerifyView(APIView):
         return Response({'verified': True, 'email': email})
 
 
-class PhoneOTPVerifyForRegistrationView(APIView):
+class PhoneOTPVerifyForRegistrationView(AsyncAPIView):
     """Verify phone OTP without creating account (for registration step)"""
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'otp_verify'
+    throttle_classes = [IPThrottle, PhoneThrottle]
+    query_budget = 3
 
-    def post(self, request):
+    async def post(self, request):
         phone = request.data.get('phone', '').strip()
         otp = request.data.get('otp', '').strip()
 
         if not phone or not otp:
             return Response({'error': 'Phone and OTP are required'}, status=status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(self.verify)(phone, otp)
 
+    def verify(self, phone, otp):
         record = OTPRecord.objects.filter(
             phone=phone, otp=otp, is_used=False
         ).order_by('-created_at').first()
@@ -270,15 +308,18 @@ class PhoneOTPVerifyForRegistrationView(APIView):
         return Response({'verified': True, 'phone': phone})
 
 
-class OTPVerifyView(APIView):
+class OTPVerifyView(AsyncAPIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'otp_verify'
+    throttle_classes = [IPThrottle, PhoneThrottle]
+    query_budget = 22
 
-    def post(self, request):
+    async def post(self, request):
         serializer = OTPVerifySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        phone = serializer.validated_data['phone']
-        otp = serializer.validated_data['otp']
+        return await sync_to_async(self.login)(request, **serializer.validated_data)
 
+    def login(self, request, phone, otp):
         record = OTPRecord.objects.filter(
             phone=phone, otp=otp, is_used=False
         ).order_by('-created_at').first()
@@ -304,7 +345,7 @@ class OTPVerifyView(APIView):
             user.save()
             PatientProfile.objects.get_or_create(user=user)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         AuditLog.objects.create(
             actor=user, action='LOGIN', ip_address=get_client_ip(request)
         )
@@ -318,6 +359,7 @@ class OTPVerifyView(APIView):
 class MeView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 9
 
     def get_object(self):
         return self.request.user
@@ -348,15 +390,16 @@ class MeView(generics.RetrieveUpdateAPIView):
 
 
 class PatientSearchView(generics.ListAPIView):
-    """Doctors search for patients by patient_id"""
+    """Doctors search for patients by patient_id prefix, phone or name"""
     serializer_class = PatientSearchSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
 
     def get_queryset(self):
         query = self.request.query_params.get('q', '')
         if self.request.user.role not in ['DOCTOR', 'ADMIN']:
             return User.objects.none()
-        return User.objects.filter(role='PATIENT', patient_id__icontains=query)[:10]
+        return search_patients(query, limit=10)
 
 
 # ---- Admin Views ----
@@ -369,17 +412,19 @@ class IsAdmin(permissions.BasePermission):
 class AdminUserListView(generics.ListAPIView):
     serializer_class = AdminUserSerializer
     permission_classes = [IsAdmin]
+    query_budget = 5
 
     def get_queryset(self):
         role = self.request.query_params.get('role')
         qs = User.objects.all().order_by('-date_joined')
         if role:
             qs = qs.filter(role=role.upper())
-        return qs
+        return AdminUserSerializer.setup_eager_loading(qs)
 
 
 class AdminUserToggleView(APIView):
     permission_classes = [IsAdmin]
+    query_budget = 7
 
     def post(self, request, pk):
         try:
@@ -398,11 +443,14 @@ class AdminUserToggleView(APIView):
             return Response({'error': 'Invalid action'}, status=400)
 
         user.save()
+        if action in ('block', 'unblock'):
+            invalidate_revocations()
         return Response({'status': 'success', 'user': AdminUserSerializer(user).data})
 
 
 class AdminStatsView(APIView):
     permission_classes = [IsAdmin]
+    query_budget = 9
 
     def get(self, request):
         from documents.models import Document
@@ -34,9 +34,43 @@ export default function Topbar({ title }: { title?: string }) {
                 setUnread(cnt.unread_count);
             } catch { /* not logged in or error */ }
         };
+
+        let source: EventSource | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let pollTimer: ReturnType<typeof setInterval> | undefined;
+
+        // Live updates over SSE; fall back to polling every 30s if unavailable
+        const connect = () => {
+            const token = localStorage.getItem('access_token');
+            if (!token || typeof EventSource === 'undefined') {
+                pollTimer = setInterval(fetchNotifs, 30000);
+                return;
+            }
+            source = new EventSource(notificationsApi.streamUrl(token));
+            source.addEventListener('notification', (e) => {
+                const n: Notification = JSON.parse((e as MessageEvent).data);
+                setNotifications(prev => [n, ...prev.filter(p => p.id !== n.id)]);
+            });
+            source.addEventListener('unread', (e) => {
+                setUnread(JSON.parse((e as MessageEvent).data).unread_count);
+            });
+            source.onerror = () => {
+                // The browser reconnects by itself unless the server refused us
+                // (e.g. expired token). Refresh through the API client, then retry.
+                if (source?.readyState === EventSource.CLOSED) {
+                    source = null;
+                    fetchNotifs().finally(() => { retryTimer = setTimeout(connect, 30000); });
+                }
+            };
+        };
+
         fetchNotifs();
-        const interval = setInterval(fetchNotifs, 30000); // poll every 30s
-        return () => clearInterval(interval);
+        connect();
+        return () => {
+            source?.close();
+            clearTimeout(retryTimer);
+            clearInterval(pollTimer);
+        };
     }, []);
 
     // Close on outside click
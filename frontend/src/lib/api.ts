@@ -127,6 +127,9 @@ export const notificationsApi = {
     unreadCount: () => api.get('/notifications/unread/'),
     markRead: (ids?: string[]) =>
         api.post('/notifications/mark-read/', ids ? { ids } : {}),
+    // EventSource can't send headers, so the access token goes in the query string
+    streamUrl: (token: string) =>
+        `${API_URL}/notifications/stream/?token=${encodeURIComponent(token)}`,
 };
 
 export default api;